@@ -32,8 +32,17 @@ All the classes and methods below have docstrings, so help(item) should
 work for further documentation
 
 Classes
+* keepaliveTransport
+  HTTPS transport that keeps its HTTP/1.1 connection open between calls
 * proxiedTransport
   The core proxied transport class for accessing an RHN server over an HTTP proxy
+* rhnCallProxy
+  stands in for the XMLRPC server object as rhnSession.session, routing every
+  API call through the session
+* rhnBatch, rhnFuture
+  queue API calls and send them to the server in system.multicall batches
+* rhnCallStats, statsdSink
+  aggregate, or send to statsd, the per-call records rhnSession produces
 * rhnSession
   The main class, handles authentication and session for RHN
   This class is then used as a parameter to practically all of
@@ -52,6 +61,10 @@ Non-class Methods:
   read in credentials from an ini-style config file
 * saveCreds(configfile, servername)
   save credentials to an ini-style config file, without trashing existing files.
+* fetchSessionKey(cachefile, servername, login)
+  read a cached, still-valid session key from a private session key cache file
+* saveSessionKey(cachefile, servername, login, key)
+  save (or with key=None, remove) a session key in a private session key cache file
 
 TODO
 * better handling of XMLRPC errors - at the moment we just print out the error message.
@@ -64,25 +77,37 @@ __author__ = "Stuart Sears"
 __all__ =     [
             'activationkey',
             'api',
+            'bench',
+            'cache',
+            'cassette',
             'channel',
             'configchannel',
             'distchannel',
             'errata',
             'kickstart',
+            'mockserver',
             'org',
             'packages',
+            'parallel',
+            'pkglist',
             'preferences',
             'proxy',
             'satellite',
             'schedule',
             'system',
             'systemgroup',
+            'unmarshal',
             'user',
             'utils',
             ]
 
 import xmlrpclib
 import httplib
+import socket
+import errno
+import urllib
+import base64
+import zlib
 import sys
 import re
 import os
@@ -90,6 +115,7 @@ from ConfigParser import SafeConfigParser, NoOptionError, NoSectionError
 import time
 import logging
 import ssl
+import threading
 from os.path import isfile, isdir
 
 # these methods could all be part of the main class, but don't need to be:
@@ -278,41 +304,713 @@ def saveCreds(filename, servername, logger = None, login = None, password = None
             logger.log(logging.ERROR, "Failed to save configuration information", exc_info = 1)
         return False
     
+# how long (in seconds) a cached session key is trusted for.
+# The satellite expires sessions after an hour by default.
+KEYCACHE_MAXAGE = 3300
+
+def fetchSessionKey(filename, servername, login, logger = None, maxage = KEYCACHE_MAXAGE):
+    """
+    usage:
+    fetchSessionKey(filename, servername, login, logger=None, maxage=KEYCACHE_MAXAGE)
+
+    description:
+    looks up a session key saved by saveSessionKey for the given server and login.
+    The cache file is ignored if anyone other than its owner can read or write it.
+
+    returns:
+    str (session key), or None if there isn't a usable one
+
+    parameters:
+    filename(str)           - session key cache file path (e.g. ~/.rhnsession)
+    servername(str)         - RHN hostname
+    login(str)              - RHN login name
+    logger(logging.Logger)  - logger for output messages
+    maxage(int)             - ignore keys saved more than this many seconds ago
+    """
+    srcfile = os.path.expanduser(filename)
+    if not os.path.isfile(srcfile):
+        return None
+    if os.stat(srcfile).st_mode & 077:
+        if logger:
+            logger.warn("ignoring session key cache %s: it is accessible by other users", srcfile)
+        return None
+
+    section = '%s:%s' % (servername, login)
+    confparse = SafeConfigParser()
+    try:
+        confparse.read(srcfile)
+        key = confparse.get(section, 'key')
+        saved = confparse.getfloat(section, 'saved')
+    except Exception:
+        return None
+
+    if time.time() - saved > maxage:
+        if logger:
+            logger.debug("cached session key for %s is too old, ignoring it", section)
+        return None
+    if logger:
+        logger.debug("using cached session key for %s from %s", section, srcfile)
+    return key
+
+# ---------------------------------------------------------------------------- #
+
+def saveSessionKey(filename, servername, login, key, logger = None):
+    """
+    usage:
+    saveSessionKey(filename, servername, login, key, logger=None)
+
+    description:
+    saves a session key for the given server and login in an ini-style cache file,
+    which is created readable by its owner only:
+    [servername:login]
+    key = SESSIONKEY
+    saved = TIMESTAMP
+
+    if key is None, removes any saved key instead.
+    The file is replaced atomically, so concurrent scripts never see a partial file.
+
+    returns:
+    Bool
+
+    parameters:
+    filename(str)           - session key cache file path (e.g. ~/.rhnsession)
+    servername(str)         - RHN hostname
+    login(str)              - RHN login name
+    key(str)                - session key to save, or None to remove the saved one
+    logger(logging.Logger)  - logger instance for error messages etc
+    """
+    dstfile = os.path.expanduser(filename)
+    section = '%s:%s' % (servername, login)
+
+    confparse = SafeConfigParser()
+    if os.path.isfile(dstfile):
+        try:
+            confparse.read(dstfile)
+        except Exception:
+            # a damaged cache is simply replaced
+            confparse = SafeConfigParser()
+
+    if key is None:
+        confparse.remove_section(section)
+    else:
+        if not confparse.has_section(section):
+            confparse.add_section(section)
+        confparse.set(section, 'key', str(key))
+        confparse.set(section, 'saved', '%.0f' % time.time())
+
+    tmpfile = '%s.%d' % (dstfile, os.getpid())
+    try:
+        fd = os.fdopen(os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'w')
+        try:
+            confparse.write(fd)
+        finally:
+            fd.close()
+        os.rename(tmpfile, dstfile)
+        if logger:
+            logger.debug("updated session key cache %s", dstfile)
+        return True
+    except (IOError, OSError):
+        if logger:
+            logger.warn("unable to update session key cache %s", dstfile)
+        if os.path.exists(tmpfile):
+            os.unlink(tmpfile)
+        return False
+
 # -------------------------- Class Definitions     --------------------------- #
 
-class proxiedTransport(xmlrpclib.SafeTransport):
+class keepaliveTransport(xmlrpclib.SafeTransport):
+    """
+    An HTTPS transport that holds its HTTP/1.1 connection open between requests
+    and reuses it, so a session pays for the TCP and TLS handshakes once rather
+    than per API call.
+
+    If the server has dropped an idle connection in the meantime, the request
+    is re-sent once over a fresh connection.
+
+    Responses are requested gzip-compressed and decompressed as they are read,
+    so large responses are never held in memory in compressed form as well.
+    Request bodies larger than encode_threshold bytes are sent gzip-compressed
+    (None, the default, disables this).
+
+    counters:
+    connections_opened  - new connections established
+    connections_reused  - requests sent over an already-open connection
+    reconnects          - requests re-sent after the server dropped a connection
+    requests            - requests sent (i.e. round trips, including re-sends)
+    bytes_sent          - request body bytes sent, after any compression
+    bytes_received      - response body bytes received, before decompression
+
+    and for the most recent request only:
+    last_sent           - request body bytes
+    last_received       - response body bytes
+    last_parse_time     - seconds spent decoding the response
+    """
+    # socket errors meaning 'the server closed the connection under us'
+    dropped_errors = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+    # callable(use_datetime) returning a (parser, unmarshaller) pair for responses,
+    # e.g. rhnapi.unmarshal.getparser. xmlrpclib's own is used if None.
+    parserfactory = None
+    # bytes to read from a response at a time
+    read_size = 65536
+    # callable(request_body, response_body), given every request and (decompressed) response
+    # that decodes successfully or as a fault, e.g. rhnapi.cassette.cassette.record
+    recorder = None
+
+    def __init__(self, use_datetime=0, context=None):
+        xmlrpclib.SafeTransport.__init__(self, use_datetime=use_datetime, context=context)
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.reconnects = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.last_sent = 0
+        self.last_received = 0
+        self.last_parse_time = 0.0
+    # ---------------------------------------------------------------------------- #
+
+    def new_connection(self, host):
+        """
+        returns a new (unconnected) httplib connection object for the given host
+        """
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        return httplib.HTTPSConnection(chost, None, context=self.context, **(x509 or {}))
+    # ---------------------------------------------------------------------------- #
+
+    def is_open(self, host):
+        """
+        do we have a live connection to the given host?
+        httplib drops the socket when a response says 'Connection: close'
+        """
+        chost, conn = self._connection
+        return conn is not None and chost == host and conn.sock is not None
+    # ---------------------------------------------------------------------------- #
+
+    def make_connection(self, host):
+        """
+        returns the cached connection if it is still open, otherwise a new one.
+        """
+        if self.is_open(host):
+            self.connections_reused += 1
+            return self._connection[1]
+        self.close()
+        self._connection = host, self.new_connection(host)
+        self.connections_opened += 1
+        return self._connection[1]
+    # ---------------------------------------------------------------------------- #
+
+    def request(self, host, handler, request_body, verbose=0):
+        """
+        sends a request, retrying once on a new connection if a reused one
+        turns out to have been closed by the server.
+        """
+        for attempt in (0, 1):
+            reused = self.is_open(host)
+            try:
+                return self.single_request(host, handler, request_body, verbose)
+            except socket.error, E:
+                if attempt or not reused or E.errno not in self.dropped_errors:
+                    raise
+            except httplib.BadStatusLine:
+                if attempt or not reused:
+                    raise
+            self.close()
+            self.reconnects += 1
+    # ---------------------------------------------------------------------------- #
+
+    def send_content(self, connection, request_body):
+        """
+        sends the request body (gzip-compressed if it is over encode_threshold bytes)
+        """
+        connection.putheader("Content-Type", "text/xml")
+        self._request_body = request_body
+        if self.encode_threshold is not None and self.encode_threshold < len(request_body):
+            connection.putheader("Content-Encoding", "gzip")
+            request_body = xmlrpclib.gzip_encode(request_body)
+        connection.putheader("Content-Length", str(len(request_body)))
+        self.requests += 1
+        self.bytes_sent += len(request_body)
+        self.last_sent = len(request_body)
+        self.last_received = 0
+        self.last_parse_time = 0.0
+        connection.endheaders(request_body)
+    # ---------------------------------------------------------------------------- #
+
+    def getparser(self):
+        """
+        returns the (parser, unmarshaller) pair used to decode a response
+        """
+        if self.parserfactory is not None:
+            return self.parserfactory(self._use_datetime)
+        return xmlrpclib.SafeTransport.getparser(self)
+    # ---------------------------------------------------------------------------- #
+
+    def parse_response(self, response):
+        """
+        reads and parses a response, decompressing gzip-encoded responses on the fly
+        """
+        decoder = None
+        if hasattr(response, 'getheader') and response.getheader('Content-Encoding', '') == 'gzip':
+            # 16 + MAX_WBITS: expect a gzip header and trailer
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        p, u = self.getparser()
+        parsetime = 0.0
+        # the decompressed response, if we are passing it to a recorder
+        tee = None
+        if self.recorder is not None:
+            tee = []
+        while True:
+            data = response.read(self.read_size)
+            if not data:
+                break
+            self.bytes_received += len(data)
+            self.last_received += len(data)
+            if decoder is not None:
+                data = decoder.decompress(data)
+            if self.verbose:
+                print "body:", repr(data)
+            if data:
+                if tee is not None:
+                    tee.append(data)
+                start = time.time()
+                p.feed(data)
+                parsetime += time.time() - start
+        start = time.time()
+        try:
+            try:
+                if decoder is not None:
+                    data = decoder.flush()
+                    if data:
+                        if tee is not None:
+                            tee.append(data)
+                        p.feed(data)
+                p.close()
+                result = u.close()
+            except xmlrpclib.Fault:
+                if tee is not None:
+                    self.recorder(self._request_body, ''.join(tee))
+                raise
+        finally:
+            self.last_parse_time = parsetime + time.time() - start
+        if tee is not None:
+            self.recorder(self._request_body, ''.join(tee))
+        return result
+    # ---------------------------------------------------------------------------- #
+
+    def stats(self):
+        """
+        returns the connection counters as a dict
+        """
+        return { 'opened' : self.connections_opened,
+                 'reused' : self.connections_reused,
+                 'reconnects' : self.reconnects,
+                 'requests' : self.requests,
+                 'bytes_sent' : self.bytes_sent,
+                 'bytes_received' : self.bytes_received }
+
+# ---------------------------------------------------------------------------- #
+
+class proxiedTransport(keepaliveTransport):
     """
-    A class representing a custom transport for XMLPRC transactions via a proxy
-    totally stolen from the python 2.7 docs at http://docs.python.org/library/xmlrpclib.html
-    Adapted to use HTTPS...
+    A class representing a custom transport for XMLPRC transactions via a proxy.
+
+    Rather than sending absolute-URI POSTs to the proxy, this opens an HTTP CONNECT
+    tunnel through it and runs TLS end-to-end to the RHN server inside that tunnel.
+    The tunnel is an ordinary keep-alive connection (see keepaliveTransport), so it
+    is set up once and reused for subsequent calls.
     """
+    proxy = None
+
     def set_proxy(self, proxy):
+        """
+        proxy(str)  - proxy server as host[:port], optionally 'user:password@host[:port]'
+                      the port defaults to 80 if omitted.
+        """
         self.proxy = proxy
     # ---------------------------------------------------------------------------- #
 
-    def make_connection(self, host):
+    def new_connection(self, host):
+        """
+        returns a connection to the proxy, set up to tunnel through to the given host
+        """
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        auth, proxyhost = urllib.splituser(self.proxy)
+        proxyhost, proxyport = urllib.splitport(proxyhost)
+        conn = httplib.HTTPSConnection(proxyhost, int(proxyport or 80),
+                                       context=self.context, **(x509 or {}))
+        tunnel_headers = {}
+        if auth:
+            tunnel_headers['Proxy-Authorization'] = 'Basic %s' % base64.b64encode(urllib.unquote(auth))
+        conn.set_tunnel(chost, headers=tunnel_headers)
+        return conn
+
+# ---------------------------------------------------------------------------- #
+
+class rhnCallProxy(object):
+    """
+    Stands in for an xmlrpclib.Server object as rhnSession.session.
+
+    Attribute access builds up the dotted API method name, exactly as with
+    xmlrpclib, so rhn.session.system.getDetails(rhn.key, id) still works.
+    The call itself is handed to the session's dispatch method rather than
+    being sent directly, so the session can decide how to deliver it.
+    """
+    def __init__(self, dispatch, name=None):
+        self._dispatch = dispatch
+        self._name = name
+    # ---------------------------------------------------------------------------- #
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._name is not None:
+            name = '%s.%s' % (self._name, name)
+        return rhnCallProxy(self._dispatch, name)
+    # ---------------------------------------------------------------------------- #
+
+    def __call__(self, *args):
+        return self._dispatch(self._name, args)
+
+    def __repr__(self):
+        return '<rhnCallProxy for %s>' % self._name
+
+# ---------------------------------------------------------------------------- #
+
+class rhnFuture(object):
+    """
+    Placeholder for the result of an API call that has not completed yet, either
+    because it is queued in an rhnBatch or because it is running on another thread
+    (see rhnapi.parallel.AsyncRhnSession).
+
+    result() waits for the value (sending the call's batch first if need be), or raises
+    the xmlrpclib.Fault (or other exception) that the call produced.
+    Functions registered with add_done_callback are called with the future on completion.
+    """
+    def __init__(self, batch, methodname):
+        self._batch = batch
+        self.methodname = methodname
+        self._done = False
+        self._value = None
+        self._error = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+    # ---------------------------------------------------------------------------- #
+
+    def done(self):
+        """
+        has the call been sent and its result received?
+        """
+        return self._done
+
+    def set_result(self, value):
+        self._value = value
+        self._finish()
+
+    def set_error(self, exptn):
+        self._error = exptn
+        self._finish()
+
+    def _finish(self):
+        self._lock.acquire()
+        try:
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._lock.release()
+        self._event.set()
+        for fn in callbacks:
+            fn(self)
+    # ---------------------------------------------------------------------------- #
+
+    def add_done_callback(self, fn):
+        """
+        arrange for fn(future) to be called once the result is available
+        (immediately, if it already is)
+        """
+        self._lock.acquire()
+        try:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._lock.release()
+        fn(self)
+    # ---------------------------------------------------------------------------- #
+
+    def result(self, timeout=None):
         """
-        used to use httplib.HTTPS, but the proxy is a plain HTTP connection, I think.
+        returns the result of the call, flushing its batch if it has not been sent yet.
+
+        parameters:
+        *timeout(float)     - seconds to wait for a call running elsewhere [wait forever]
+        """
+        if not self._done and self._batch is not None:
+            self._batch.flush()
+        if not self._event.wait(timeout):
+            raise rhnException('timed out waiting for the result of %s' % self.methodname)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __repr__(self):
+        if self._done:
+            return '<rhnFuture %s (done)>' % self.methodname
+        return '<rhnFuture %s (pending)>' % self.methodname
+
+# ---------------------------------------------------------------------------- #
+
+class rhnBatch(object):
+    """
+    Queues API calls made through rhnSession.session and sends them to the server
+    as system.multicall requests of (at most) 'size' calls each.
+
+    Use it as a context manager via rhnSession.batch:
+
+    with rhn.batch(200):
+        details = [ rhn.session.system.getDetails(rhn.key, x) for x in serverids ]
+    print details[0].result()
+
+    Inside the 'with' block each call returns an rhnFuture immediately; anything still
+    queued is sent when the block exits. Wrappers from the other rhnapi modules can be
+    used too, as long as they return the raw API result rather than inspecting it.
+    """
+    # these always go straight to the server
+    unbatched = ('auth.login', 'auth.logout', 'system.multicall')
+
+    def __init__(self, rhn, size=100):
+        self.rhn = rhn
+        self.size = size
+        self._pending = []
+        self._previous = None
+        # counters
+        self.calls = 0
+        self.roundtrips = 0
+    # ---------------------------------------------------------------------------- #
+
+    def add(self, methodname, params):
         """
-        self.realhost = host
-        h = httplib.HTTP(self.proxy)
-        return h
+        queue a call and return an rhnFuture for its result.
+        """
+        future = rhnFuture(self, methodname)
+        self._pending.append((methodname, params, future))
+        self.calls += 1
+        if len(self._pending) >= self.size:
+            self.flush()
+        return future
     # ---------------------------------------------------------------------------- #
 
-    def send_request(self, connection, handler, request_body):
+    def flush(self):
+        """
+        send all queued calls in a single system.multicall request and hand
+        each result (or fault) to its rhnFuture.
         """
-        replaced the original 'http' with https for RHN.
-        I wonder if there's an official 'protocol placeholder
-        for the 'connection' type ?
+        pending, self._pending = self._pending, []
+        renewals = 0
+        while len(pending) != 0:
+            calls = [ { 'methodName' : m, 'params' : list(p) } for m, p, f in pending ]
+            try:
+                results = self.rhn.sendCall('system.multicall', (calls,))
+            except Exception, E:
+                for m, p, f in pending:
+                    f.set_error(E)
+                raise
+            self.roundtrips += 1
+            # calls that failed because the session key expired are replayed
+            # (once the session has been renewed) rather than failed.
+            expired = []
+            for (m, p, f), res in zip(pending, results):
+                if isinstance(res, dict):
+                    if renewals < self.rhn.max_renewals and self.rhn._isExpired(res.get('faultCode'), res.get('faultString'), p):
+                        expired.append((m, p, f))
+                    else:
+                        f.set_error(xmlrpclib.Fault(res.get('faultCode'), res.get('faultString')))
+                else:
+                    f.set_result(res[0])
+            pending = []
+            if len(expired) != 0:
+                renewals += 1
+                self.rhn._renewExpired(expired[0][1][0])
+                pending = [ (m, self.rhn._replaceKey(p), f) for m, p, f in expired ]
+    # ---------------------------------------------------------------------------- #
+
+    def __enter__(self):
+        self._previous = self.rhn._batch
+        self.rhn._batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.rhn._batch = self._previous
+        if exc_type is None:
+            self.flush()
+        return False
+
+# ---------------------------------------------------------------------------- #
+
+class rhnCallStats(object):
+    """
+    Aggregates the per-call records an rhnSession produces (see rhnSession.addCallHook)
+    into totals and a latency histogram for each API method.
+
+    Each record is a dict:
+    {
+        'method'            - API method name, e.g. 'system.getDetails'
+        'request_bytes'     - request body bytes on the wire
+        'response_bytes'    - response body bytes on the wire
+        'serialise_time'    - seconds spent encoding the request and decoding the response
+        'network_time'      - seconds spent sending the request and waiting for/reading the response
+        'fault'             - None, the XMLRPC faultCode, or the exception class name for other errors
+        'batched'           - number of calls that shared the round trip (1 unless sent via a
+                              system.multicall batch, whose bytes and times are split evenly)
+    }
+    """
+    # upper bounds of the latency histogram buckets, in seconds.
+    # The final bucket counts anything slower than the last bound.
+    buckets = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
 
-        realhost: hostname (URL?) of remote XMLRPC server
-        handler: /rpc/api in this case
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods = {}
+    # ---------------------------------------------------------------------------- #
+
+    def _newEntry(self):
+        return { 'calls' : 0, 'faults' : {}, 'request_bytes' : 0, 'response_bytes' : 0,
+                 'serialise_time' : 0.0, 'network_time' : 0.0, 'max_time' : 0.0,
+                 'histogram' : [ 0 ] * (len(self.buckets) + 1) }
+
+    def _bucket(self, elapsed):
+        for idx, bound in enumerate(self.buckets):
+            if elapsed <= bound:
+                return idx
+        return len(self.buckets)
+
+    def add(self, record):
+        """
+        adds a single call record
         """
-        connection.putrequest("POST", 'https://%s%s' % (self.realhost, handler))
+        elapsed = record['serialise_time'] + record['network_time']
+        bucket = self._bucket(elapsed)
+        self._lock.acquire()
+        try:
+            entry = self.methods.get(record['method'])
+            if entry is None:
+                entry = self.methods[record['method']] = self._newEntry()
+            entry['calls'] += 1
+            if record['fault'] is not None:
+                entry['faults'][record['fault']] = entry['faults'].get(record['fault'], 0) + 1
+            entry['request_bytes'] += record['request_bytes']
+            entry['response_bytes'] += record['response_bytes']
+            entry['serialise_time'] += record['serialise_time']
+            entry['network_time'] += record['network_time']
+            entry['max_time'] = max(entry['max_time'], elapsed)
+            entry['histogram'][bucket] += 1
+        finally:
+            self._lock.release()
+
+    __call__ = add
     # ---------------------------------------------------------------------------- #
 
-    def send_host(self, connection, host):
-        connection.putheader('Host', self.realhost)
+    def summary(self, namespaces=False):
+        """
+        returns:
+        dict { method (or namespace) : totals }, where totals is a dict
+        {
+            'calls', 'request_bytes', 'response_bytes', 'serialise_time', 'network_time', 'max_time'
+            'faults'        - dict { fault : count }
+            'histogram'     - list of call counts, one per latency bucket (see self.buckets)
+        }
+
+        parameters:
+        *namespaces(bool)   - aggregate by API namespace ('system', 'channel.software')
+                              rather than by method [False]
+        """
+        result = {}
+        self._lock.acquire()
+        try:
+            for method, entry in self.methods.iteritems():
+                if namespaces:
+                    name = method.rsplit('.', 1)[0]
+                else:
+                    name = method
+                total = result.get(name)
+                if total is None:
+                    total = result[name] = self._newEntry()
+                for k in ('calls', 'request_bytes', 'response_bytes', 'serialise_time', 'network_time'):
+                    total[k] += entry[k]
+                total['max_time'] = max(total['max_time'], entry['max_time'])
+                for fault, count in entry['faults'].iteritems():
+                    total['faults'][fault] = total['faults'].get(fault, 0) + count
+                total['histogram'] = [ x + y for x, y in zip(total['histogram'], entry['histogram']) ]
+        finally:
+            self._lock.release()
+        return result
+
+    def report(self, namespaces=False):
+        """
+        returns the summary as a list of text lines, busiest (by total time) first
+        """
+        summary = self.summary(namespaces)
+        lines = [ "%-45s %7s %6s %10s %10s %9s %9s %9s" % ('method', 'calls', 'faults', 'sent(KB)',
+                  'recv(KB)', 'serial(s)', 'net(s)', 'max(s)') ]
+        byTime = lambda x: summary[x]['serialise_time'] + summary[x]['network_time']
+        for name in sorted(summary, key=byTime, reverse=True):
+            entry = summary[name]
+            lines.append("%-45s %7d %6d %10.1f %10.1f %9.3f %9.3f %9.3f" % (name, entry['calls'],
+                         sum(entry['faults'].values()), entry['request_bytes'] / 1024.0,
+                         entry['response_bytes'] / 1024.0, entry['serialise_time'],
+                         entry['network_time'], entry['max_time']))
+        return lines
+
+    def reset(self):
+        """
+        discards everything recorded so far
+        """
+        self._lock.acquire()
+        try:
+            self.methods = {}
+        finally:
+            self._lock.release()
+
+# ---------------------------------------------------------------------------- #
+
+class statsdSink(object):
+    """
+    A call hook (see rhnSession.addCallHook) that sends each call record to a
+    statsd-style collector over UDP, as:
+
+    <prefix>.<method>.calls:1|c
+    <prefix>.<method>.serialise:<ms>|ms
+    <prefix>.<method>.network:<ms>|ms
+    <prefix>.<method>.request_bytes:<n>|c
+    <prefix>.<method>.response_bytes:<n>|c
+    <prefix>.<method>.fault.<code>:1|c     (failed calls only)
+
+    Sending is fire-and-forget: network errors are ignored rather than
+    failing the API call.
+    """
+    def __init__(self, host='localhost', port=8125, prefix='rhnapi'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(0)
+
+    def __call__(self, record):
+        name = '%s.%s' % (self.prefix, record['method'])
+        metrics = [ '%s.calls:1|c' % name,
+                    '%s.serialise:%.3f|ms' % (name, record['serialise_time'] * 1000),
+                    '%s.network:%.3f|ms' % (name, record['network_time'] * 1000),
+                    '%s.request_bytes:%d|c' % (name, record['request_bytes']),
+                    '%s.response_bytes:%d|c' % (name, record['response_bytes']) ]
+        if record['fault'] is not None:
+            metrics.append('%s.fault.%s:1|c' % (name, record['fault']))
+        try:
+            self._sock.sendto('\n'.join(metrics), self.address)
+        except socket.error:
+            pass
+
+    def close(self):
+        self._sock.close()
 
 # ---------------------------------------------------------------------------- #
 
@@ -325,19 +1023,25 @@ class rhnSession(object):
     def __init__(self, url='rhn.redhat.com', rhnlogin = None, rhnpassword = None,
                  proxyserver = None, config = None, savecreds=False, debug = False,
                  logenable = True, logfile = None, loglevel = 20, logname = 'RHN API',
-                 verify=True):
+                 verify=True, max_renewals=1, keycache=None, unmarshaller=None,
+                 compress_threshold=None, transport=None, cassette=None, cache=None,
+                 pkgcache=None):
         """
         Initialize a connection to RHN (or a satellite) using the provided information.
         proxy server should be local https proxy, if available. IPaddress/Hostname:port.
         No protocol required for the proxy definition.
 
+        Nothing is sent to the server here: login happens the first time self.key is used,
+        and sat_version, api_version and org_number are looked up when first accessed.
+
         returns rhnSession object
 
         parameters: (* = optional)
         url(str)            - hostname or ip address of the RHN server
         rhnlogin(str)       - username (prompted if omitted)
         rhnpassword(str)    - password (prompted if omitted)
-        *proxyserver(str)   - HTTP proxy betweeen you and the satellite (IP or hostname only)
+        *proxyserver(str)   - HTTP proxy betweeen you and the satellite, as host[:port]
+                              (optionally user:password@host[:port]). Calls are tunnelled via CONNECT
         *config(str)        - local configuration file, in .ini format for username and password
         *savecreds(bool)    - should we save username and passwords to our ~/.rhninfo file?
         *debug(bool)        - print out lots of horribly (and possibly insecure) information for testing.
@@ -350,15 +1054,62 @@ class rhnSession(object):
                               (for example, your script name)
         *verify(bool|str)   - set to a CA bundle file or directory for SSL verification, or to False
                               to disable it
+        *max_renewals(int)  - how many times a call that fails because the session has expired
+                              will be retried after logging in again [1]. 0 disables this.
+        *keycache(str)      - file in which to cache the session key (e.g. '~/.rhnsession'), so that
+                              later sessions for the same server and login can skip auth.login.
+                              logout() then leaves the session open unless called with expire=True.
+                              Not used if None [None]
+        *unmarshaller       - response parser factory, as xmlrpclib.getparser, for example
+                              rhnapi.unmarshal.getparser for faster decoding of large responses.
+                              xmlrpclib's own is used if None [None]
+        *compress_threshold(int) - gzip-compress request bodies larger than this many bytes, e.g. for
+                              channel.software.addPackages with thousands of IDs. Only use this if
+                              your server accepts gzip-encoded requests. None disables it [None]
+                              (responses are always requested gzip-compressed)
+        *transport          - callable returning a new xmlrpclib transport instance, called once per
+                              thread. Replaces the default (and proxied) HTTPS transports, for example
+                              to talk to an rhnapi.mockserver instance [None]
+        *cassette           - an rhnapi.cassette.cassette. In record mode every request and response
+                              is saved to it; in replay mode responses come from it and nothing is sent
+                              to the server. Disables keycache, so that auth.login is always recorded [None]
+        *cache              - an rhnapi.cache.responseCache, to answer repeated read-only calls from
+                              memory. Not used if None [None]
+        *pkgcache           - an rhnapi.cache.packageCache, a persistent store of package metadata that
+                              rhnapi.packages consults before the satellite [None]
         """
         # for config passing we require the hostname, let's clean up whatever we've been given:
         self.hostname = getHostname(url)
         self.rhnurl = rhnifyURL(url)
+        # (host, handler) that requests are sent to, as xmlrpclib.ServerProxy works them out
+        self._host, self._handler = urllib.splithost(urllib.splittype(self.rhnurl)[1])
         self.login = rhnlogin
         # passwords are private variables. Cached, but not exposed
         self._password = rhnpassword
 
         self.debug = debug
+        # each thread gets its own transport (see _getTransport)
+        self._local = threading.local()
+        self._transports = []
+        self._translock = threading.Lock()
+        # the worker threads shared by rhnapi.parallel calls, started when first needed
+        self._workerpool = None
+        # set up in the session initialisation below
+        self.transport = None
+        self.proxyserver = proxyserver
+        self.unmarshaller = unmarshaller
+        self.compress_threshold = compress_threshold
+        self.transportfactory = transport
+        self.cassette = cassette
+        self.cache = cache
+        self.pkgcache = pkgcache
+        if cassette is not None:
+            keycache = None
+        self._ssl_context = None
+        # per-call instrumentation: every call record goes to callstats and then
+        # to each of the callhooks (see addCallHook)
+        self.callstats = rhnCallStats()
+        self.callhooks = []
         # in case we need it:
         self.configfile = config
         # logdestination
@@ -408,44 +1159,113 @@ class rhnSession(object):
                 ssl_context = ssl.create_default_context(capath=verify)
             else:
                 self.logWarn("failed to load cafile or capath - using default system CA")
+                ssl_context = ssl.create_default_context()
         else:
             ssl_context = ssl.create_default_context()
 
-        try:
-            if proxyserver is not None:
-                P = proxiedTransport()
-                P.set_proxy(proxyserver)
+        # basic session initialisation
+        # API calls made via self.session are routed through self._dispatch
+        self._ssl_context = ssl_context
+        self.transport = self._getTransport()
+        self.session = rhnCallProxy(self._dispatch)
+
+        # nothing is sent to the server yet: we login the first time self.key is needed,
+        # and the version and org info below are fetched (and cached) on first use.
+        self.savecreds = savecreds
+        self._key = None
+        self._prevkey = None
+        self._loginlock = threading.Lock()
+        self.max_renewals = max_renewals
+        self.keycache = keycache
+        self._sat_version = None
+        self._api_version = None
+        self._org_number = None
 
-                # basic session initialisation
-                self.session = xmlrpclib.Server(self.rhnurl, verbose=0, transport=P, context=ssl_context)
-            else:
-                self.session = xmlrpclib.Server(self.rhnurl, verbose=0, context=ssl_context)
-
-            # now we login
-            self.key = self.session.auth.login(self.login, self._password)
-            if isinstance(self.key, str):
-                self.logDebug("initialised RHN Session, key: %s" % self.key)
-
-            # set some version info for debug, really.
-            self.sat_version = self.session.api.systemVersion()
-            self.api_version = self.session.api.getVersion()
-            # org ID for the currently logged-in user
-            self.org_number = self.session.user.getDetails(self.key, self.login).get('org_id', None)
-
-            if savecreds:
-                if self.configfile is not None:
-                    res = saveCreds(self.configfile, self.hostname, self.logger, self.login, self._password)
-                    if res:
-                        self.logDebug("saved credentials to %s" % self.configfile)
-                    else:
-                        self.logWarn("failed to save credentials to %s" % self.configfile)
-
-            
+# ---------------------------------------------------------------------------- #
 
+    def _login(self, usecache=True):
+        """
+        logs in to the RHN server and returns the new session key.
+        Saves credentials afterwards, if requested at init time.
 
+        If a session key cache is configured, a cached key is returned instead
+        (unless usecache is False), and new keys are saved to it.
+        """
+        if self.keycache is not None and usecache:
+            key = fetchSessionKey(self.keycache, self.hostname, self.login, self.logger)
+            if key is not None:
+                return key
+        try:
+            key = self.sendCall('auth.login', (self.login, self._password))
         except xmlrpclib.Fault, E:
             self.fail(E, 'login to RHN server %s' % self.rhnurl )
             raise
+        if isinstance(key, str):
+            self.logDebug("initialised RHN Session, key: %s" % key)
+        if self.keycache is not None:
+            saveSessionKey(self.keycache, self.hostname, self.login, key, self.logger)
+
+        if self.savecreds:
+            self.savecreds = False
+            if self.configfile is not None:
+                res = saveCreds(self.configfile, self.hostname, self.logger, self.login, self._password)
+                if res:
+                    self.logDebug("saved credentials to %s" % self.configfile)
+                else:
+                    self.logWarn("failed to save credentials to %s" % self.configfile)
+        return key
+
+    def _forgetKey(self):
+        """
+        drops the (now invalid) session key, removing it from the key cache too
+        """
+        self._key = None
+        if self.keycache is not None:
+            saveSessionKey(self.keycache, self.hostname, self.login, None, self.logger)
+
+    def _getKey(self):
+        if self._key is None:
+            # only one thread should login
+            self._loginlock.acquire()
+            try:
+                if self._key is None:
+                    self._key = self._login()
+            finally:
+                self._loginlock.release()
+        return self._key
+
+    def _setKey(self, key):
+        self._key = key
+
+    # the session key. Logs in on first access.
+    key = property(_getKey, _setKey)
+
+    @property
+    def sat_version(self):
+        """
+        satellite version (api.systemVersion), fetched on first use
+        """
+        if self._sat_version is None:
+            self._sat_version = self.sendCall('api.systemVersion', ())
+        return self._sat_version
+
+    @property
+    def api_version(self):
+        """
+        API version (api.getVersion), fetched on first use
+        """
+        if self._api_version is None:
+            self._api_version = self.sendCall('api.getVersion', ())
+        return self._api_version
+
+    @property
+    def org_number(self):
+        """
+        org ID for the currently logged-in user, fetched on first use
+        """
+        if self._org_number is None:
+            self._org_number = self.sendCall('user.getDetails', (self.key, self.login)).get('org_id', None)
+        return self._org_number
 
 # ---------------------------------------------------------------------------- #
 
@@ -628,12 +1448,33 @@ class rhnSession(object):
         # raise
         return False
 
-    def close(self):
+    def _stopWorkers(self):
         """
-        close an opened RHN session. Arguably not required, but still...
+        stops the worker threads rhnapi.parallel has started for this session, if any
         """
+        if self._workerpool is not None:
+            from rhnapi import parallel
+            parallel.stopSessionPool(self)
+
+    def close(self, expire=False):
+        """
+        close an opened RHN session. Arguably not required, but still...
+
+        With a session key cache (see keycache) the session is left open on the server,
+        and its key in the cache, for other sessions to use, unless expire is True.
+        """
+        self._stopWorkers()
+        if self.pkgcache is not None:
+            self.pkgcache.flush()
+        # never logged in, so nothing to close
+        if self._key is None:
+            return
+        if self.keycache is not None and not expire:
+            self.logDebug("leaving session open, its key is cached in %s" % self.keycache)
+            return
         try:
             self.session.auth.logout(self.key)
+            self._forgetKey()
         except Exception, E:
             self.fail(E, 'logout user %s' % self.login)
 
@@ -641,7 +1482,314 @@ class rhnSession(object):
         """
         return the satellite version in use.
         """
-        return self.session.api.systemVersion()
+        return self.sat_version
+
+    def _newTransport(self):
+        """
+        returns a new transport for this session: from the transport factory given at
+        init time if there was one, otherwise a keep-alive (or proxied) HTTPS transport.
+        With a cassette, the transport records to it, or is replaced by one replaying from it.
+        """
+        if self.transportfactory is not None:
+            transport = self.transportfactory()
+        elif self.proxyserver is not None:
+            transport = proxiedTransport(context=self._ssl_context)
+            transport.set_proxy(self.proxyserver)
+        else:
+            transport = keepaliveTransport(context=self._ssl_context)
+        if self.cassette is not None:
+            transport = self.cassette.wrap(transport)
+        if self.unmarshaller is not None:
+            transport.parserfactory = self.unmarshaller
+        transport.encode_threshold = self.compress_threshold
+        return transport
+
+    def _getTransport(self):
+        """
+        returns the transport for the calling thread, creating it (and so its own
+        connection) on first use. xmlrpclib transports are not thread-safe, so
+        threads never share them.
+        """
+        transport = getattr(self._local, 'transport', None)
+        if transport is None:
+            transport = self._local.transport = self._newTransport()
+            self._translock.acquire()
+            try:
+                self._transports.append(transport)
+            finally:
+                self._translock.release()
+        return transport
+
+    def _getBatch(self):
+        return getattr(self._local, 'batch', None)
+
+    def _setBatch(self, batch):
+        self._local.batch = batch
+
+    # the active rhnBatch for the calling thread, if any (see self.batch)
+    _batch = property(_getBatch, _setBatch)
+
+    def _dispatch(self, methodname, params):
+        """
+        Delivers an API call made via self.session: from the response cache if
+        there is one and it has the answer, otherwise via _deliver.
+        """
+        if self.cache is None or self.cache.ignored(methodname):
+            return self._deliver(methodname, params)
+
+        if not self.cache.readonly(methodname):
+            # a write call: anything it may change is stale now, and again
+            # once it has completed, in case other threads re-cached it meanwhile
+            self.cache.invalidate(methodname)
+            result = self._deliver(methodname, params)
+            if isinstance(result, rhnFuture):
+                result.add_done_callback(lambda f: self.cache.invalidate(methodname))
+            else:
+                self.cache.invalidate(methodname)
+            return result
+
+        if self.cache.lifetime(methodname) <= 0:
+            # read-only, but configured not to be cached
+            return self._deliver(methodname, params)
+
+        # the session key is not part of the cache key, so renewals don't empty the cache
+        args = params
+        if len(params) != 0 and params[0] is not None and params[0] in (self._key, self._prevkey):
+            args = params[1:]
+        found, value = self.cache.get(methodname, args)
+        if found:
+            if self._batch is not None:
+                future = rhnFuture(None, methodname)
+                future.set_result(value)
+                return future
+            return value
+        result = self._deliver(methodname, params)
+        if isinstance(result, rhnFuture):
+            def store(future):
+                if future._error is None:
+                    self.cache.put(methodname, args, future._value)
+            result.add_done_callback(store)
+        else:
+            self.cache.put(methodname, args, result)
+        return result
+
+    def _deliver(self, methodname, params):
+        """
+        Queues an API call for later if a batch is active, otherwise sends it immediately.
+        """
+        if self._batch is not None and methodname not in self._batch.unbatched:
+            return self._batch.add(methodname, params)
+        return self.sendCall(methodname, params)
+
+    def sendCall(self, methodname, params):
+        """
+        sends a single API call to the server and returns the result.
+
+        If the call fails because the session key has expired, this logs in again
+        and replays the call with the new key, up to self.max_renewals times.
+
+        parameters:
+        methodname(str)     - full API method name, e.g. 'system.getDetails'
+        params(tuple)       - the method parameters
+        """
+        renewals = 0
+        while True:
+            try:
+                return self._send(methodname, params)
+            except xmlrpclib.Fault, E:
+                if renewals >= self.max_renewals or not self._isExpired(E.faultCode, E.faultString, params):
+                    raise
+            renewals += 1
+            self._renewExpired(params[0])
+            params = self._replaceKey(params)
+
+    def _send(self, methodname, params):
+        """
+        encodes a call and sends it over this thread's transport, as xmlrpclib's server
+        object would, timing each stage for the call records (see addCallHook).
+        """
+        transport = self._getTransport()
+        transport.last_sent = transport.last_received = 0
+        transport.last_parse_time = 0.0
+        fault = None
+        result = None
+        start = time.time()
+        request = xmlrpclib.dumps(tuple(params), methodname)
+        encoded = time.time()
+        try:
+            try:
+                result = transport.request(self._host, self._handler, request)
+                if len(result) == 1:
+                    result = result[0]
+            except xmlrpclib.Fault, E:
+                fault = E.faultCode
+                raise
+            except Exception, E:
+                fault = E.__class__.__name__
+                raise
+        finally:
+            self._recordCall(methodname, params, result, fault, transport,
+                             encoded - start, time.time() - encoded, len(request))
+        return result
+
+    def _recordCall(self, methodname, params, result, fault, transport, encodetime, requesttime, requestsize):
+        """
+        builds the call record(s) for a request and hands them to callstats and the call hooks.
+        A system.multicall produces one record per call in it.
+        """
+        parsetime = getattr(transport, 'last_parse_time', 0.0)
+        record = { 'method' : methodname,
+                   'request_bytes' : getattr(transport, 'last_sent', 0) or requestsize,
+                   'response_bytes' : getattr(transport, 'last_received', 0),
+                   'serialise_time' : encodetime + parsetime,
+                   'network_time' : requesttime - parsetime,
+                   'fault' : fault,
+                   'batched' : 1 }
+        records = [ record ]
+        if methodname == 'system.multicall' and len(params) != 0 and len(params[0]) != 0:
+            count = len(params[0])
+            records = []
+            for idx, call in enumerate(params[0]):
+                share = dict(record)
+                share.update({ 'method' : call.get('methodName'),
+                               'request_bytes' : record['request_bytes'] / count,
+                               'response_bytes' : record['response_bytes'] / count,
+                               'serialise_time' : record['serialise_time'] / count,
+                               'network_time' : record['network_time'] / count,
+                               'batched' : count })
+                if fault is None and isinstance(result[idx], dict):
+                    share['fault'] = result[idx].get('faultCode')
+                records.append(share)
+        for rec in records:
+            self.callstats.add(rec)
+            for hook in self.callhooks:
+                try:
+                    hook(rec)
+                except Exception, E:
+                    self.logDebug("call hook %s failed: %s" % (hook, E))
+
+    def addCallHook(self, hook):
+        """
+        registers hook(record) to be called after every API call sent by this session,
+        from whichever thread made the call. See rhnCallStats for the record contents.
+        Exceptions raised by a hook are logged (at DEBUG) and ignored.
+
+        returns:
+        the hook, for use with removeCallHook
+        """
+        self.callhooks.append(hook)
+        return hook
+
+    def removeCallHook(self, hook):
+        """
+        unregisters a hook added with addCallHook
+        """
+        if hook in self.callhooks:
+            self.callhooks.remove(hook)
+
+    def stats(self, namespaces=False):
+        """
+        returns the per-method totals and latency histograms for every API call this
+        session has made (see rhnCallStats.summary)
+
+        parameters:
+        *namespaces(bool)   - aggregate by API namespace rather than by method [False]
+        """
+        return self.callstats.summary(namespaces)
+
+    def resetStats(self):
+        """
+        zero the call statistics returned by self.stats
+        """
+        self.callstats.reset()
+
+    def logStats(self, namespaces=False, loglevel=logging.INFO):
+        """
+        writes the call statistics table (see rhnCallStats.report) to the session logger
+        """
+        for line in self.callstats.report(namespaces):
+            self.logMessage(loglevel, line)
+
+    def logCalls(self, loglevel=logging.DEBUG):
+        """
+        logs a line for every API call made from now on, via a call hook.
+
+        returns:
+        the hook, for use with removeCallHook
+        """
+        def logCall(record):
+            self.logMessage(loglevel, "%(method)s: sent %(request_bytes)d bytes, received %(response_bytes)d, "
+                            "serialise %(serialise_time).4fs, network %(network_time).4fs, fault %(fault)s" % record)
+        return self.addCallHook(logCall)
+
+    def sendStats(self, host='localhost', port=8125, prefix='rhnapi'):
+        """
+        sends a record for every API call made from now on to a statsd-style UDP
+        collector (see statsdSink).
+
+        returns:
+        the statsdSink hook, for use with removeCallHook
+        """
+        return self.addCallHook(statsdSink(host, port, prefix))
+
+    def _isExpired(self, faultcode, faultstring, params):
+        """
+        did a call with these parameters fail because our session key expired?
+        (the fault code alone won't do: -1 also covers unknown methods, bad parameters etc)
+        """
+        if faultcode not in rhnException.expiry_faults:
+            return False
+        message = str(faultstring).lower()
+        if not [ x for x in rhnException.expiry_messages if x in message ]:
+            return False
+        return (len(params) != 0 and params[0] is not None and params[0] in (self._key, self._prevkey))
+
+    def _renewExpired(self, oldkey):
+        """
+        logs in again after oldkey has expired, unless another thread has already done so.
+        """
+        self._loginlock.acquire()
+        try:
+            if self._key == oldkey:
+                self.logInfo("session key expired, logging in again")
+                self._prevkey = oldkey
+                self._key = self._login(usecache=False)
+        finally:
+            self._loginlock.release()
+
+    def _replaceKey(self, params):
+        """
+        returns the call parameters with an expired session key replaced by the current one
+        """
+        if len(params) != 0 and params[0] == self._prevkey:
+            return (self._key,) + tuple(params[1:])
+        return params
+
+    def batch(self, size=100):
+        """
+        returns an rhnBatch context manager. API calls made via self.session inside
+        the 'with' block are queued and sent as system.multicall requests of up to 'size'
+        calls, each returning an rhnFuture.
+
+        parameters:
+        size(int)           - maximum number of calls per multicall request [100]
+        """
+        return rhnBatch(self, size)
+
+    def connectionStats(self):
+        """
+        returns the connection counters for this session, summed over the transports
+        used by all threads:
+        { 'opened' : int, 'reused' : int, 'reconnects' : int,
+          'requests' : int, 'bytes_sent' : int, 'bytes_received' : int }
+        """
+        totals = { 'opened' : 0, 'reused' : 0, 'reconnects' : 0,
+                   'requests' : 0, 'bytes_sent' : 0, 'bytes_received' : 0 }
+        for transport in self._transports:
+            if hasattr(transport, 'stats'):
+                for k, v in transport.stats().iteritems():
+                    totals[k] = totals.get(k, 0) + v
+        return totals
 
     def getRHNUser(self):
         """
@@ -653,7 +1801,7 @@ class rhnSession(object):
         """
         return the RHN API version in use.
         """
-        return self.session.api.getVersion()
+        return self.api_version
 
     def enableDebug(self):
         """
@@ -693,15 +1841,31 @@ class rhnSession(object):
         """
         Renews an expired session
         """
-        self.key = self.session.auth.login(self.login, self._password)
+        self.key = self._login(usecache=False)
 
-    def logout(self):
+    def logout(self, expire=False):
         """
         logout of the session (expires the session key)
-        """
+
+        With a session key cache (see keycache) the session is shared with other
+        scripts, so by default it is left open on the server and its key stays
+        in the cache. Pass expire=True to end it (and remove the cached key) anyway.
+
+        parameters:
+        *expire(bool)       - end the session even if its key is cached [False]
+        """
+        self._stopWorkers()
+        if self.pkgcache is not None:
+            self.pkgcache.flush()
+        if self._key is None:
+            return True
+        if self.keycache is not None and not expire:
+            self.logDebug("leaving session open, its key is cached in %s" % self.keycache)
+            return True
         try:
             res = self.session.auth.logout(self.key)
             if res == 1:
+                self._forgetKey()
                 return True
         except Exception, E:
             return self.fail(E, '%s logout failed!' % self.login)
@@ -741,6 +1905,13 @@ class rhnException(Exception):
     -210: channel does not exist
     2905: username/password fail
     """
+    # fault codes meaning the session key is no longer valid
+    # (rhnSession renews the session and replays calls that fail with these)
+    expiry_faults = (-1,)
+    # ...and only when the fault string (lowercased) contains one of these, as the
+    # same codes are used for unknown methods, invalid parameters and so on
+    expiry_messages = ('could not find session', 'session has expired', 'session expired',
+                       'invalid session')
 
     def __init__(self, value, *args, **kwargs):
         """
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing a benchmark harness for the wrapper modules
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.bench
+
+Times representative rhnapi workloads against a synthetic fleet served by
+rhnapi.mockserver, reporting for each:
+- wall time
+- round trips (HTTP requests) and API calls (calls inside a multicall count separately)
+- request and response bytes on the wire
+- peak resident memory of this process, and how much the workload raised it
+
+Run it as:
+python -m rhnapi.bench [options] [workload ...]
+
+By default the mock server runs in this process, so the memory figures include
+the server's data. For client-only memory figures, start the server separately
+(python -m rhnapi.mockserver --systems 10000 ...) and pass --server host:port.
+
+Workloads:
+"""
+
+__author__ = "Stuart Sears"
+
+import sys
+import time
+import resource
+from StringIO import StringIO
+from optparse import OptionParser
+
+import rhnapi
+from rhnapi import mockserver, channel, errata, system, utils, parallel, unmarshal
+
+# --------------------------------------------------------------------------------- #
+
+def peakMemory():
+    """
+    peak resident set size of this process so far, in KB (linux reports ru_maxrss in KB)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# --------------------------------------------------------------------------------- #
+# the workloads. Each takes (rhn, opts) and returns a short description of its result
+
+def benchChannelUsage(rhn, opts):
+    """
+    utils.showChannelUsage: base channel subscription counts for every system
+    """
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        utils.showChannelUsage(rhn)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    return output.strip().splitlines()[-1]
+
+def benchBaseChannels(rhn, opts):
+    """
+    channel.listBaseChannels: base channel labels
+    """
+    return '%d base channels' % len(channel.listBaseChannels(rhn))
+
+def benchErrataClone(rhn, opts):
+    """
+    errata.clone: clone --errata errata into a new channel in one call
+    """
+    advisories = []
+    for label in channel.listBaseChannels(rhn):
+        advisories.extend([ x['advisory'] for x in rhn.session.channel.software.listErrata(rhn.key, label) ])
+    advisories = sorted(advisories)[:opts.errata]
+    target = 'bench-errata-%d' % int(time.time() * 1000)
+    rhn.session.channel.software.create(rhn.key, target, target, target, 'channel-x86_64', '')
+    try:
+        return '%d errata cloned' % len(errata.clone(rhn, target, advisories))
+    finally:
+        rhn.session.channel.software.delete(rhn.key, target)
+
+def _systemIds(rhn):
+    return [ x['id'] for x in system.listSystems(rhn) ]
+
+def benchSystemPackages(rhn, opts):
+    """
+    system.listPackages for every system, one call at a time
+    """
+    total = 0
+    for sysid in _systemIds(rhn):
+        total += len(system.listPackages(rhn, sysid))
+    return '%d packages' % total
+
+def benchSystemPackagesBatch(rhn, opts):
+    """
+    system.listPackages for every system, sent in system.multicall batches
+    """
+    sysids = _systemIds(rhn)
+    with rhn.batch(opts.batch_size):
+        futures = [ rhn.session.system.listPackages(rhn.key, x) for x in sysids ]
+    return '%d packages' % sum([ len(x.result()) for x in futures ])
+
+def benchSystemPackagesParallel(rhn, opts):
+    """
+    system.listPackages for every system, over --workers threads
+    """
+    results, faults = parallel.map_servers(rhn, system.listPackages, _systemIds(rhn), opts.workers)
+    return '%d packages, %d faults' % (sum([ len(x) for x in results if x ]), len(faults))
+
+# name, function, in the order they are run
+WORKLOADS = [
+    ('channel_usage', benchChannelUsage),
+    ('base_channels', benchBaseChannels),
+    ('errata_clone', benchErrataClone),
+    ('system_packages', benchSystemPackages),
+    ('system_packages_batch', benchSystemPackagesBatch),
+    ('system_packages_parallel', benchSystemPackagesParallel),
+]
+
+__doc__ += '\n'.join([ '%-26s %s' % (name, fn.__doc__.strip()) for name, fn in WORKLOADS ]) + '\n'
+
+# --------------------------------------------------------------------------------- #
+
+def measure(rhn, fn, opts, server=None):
+    """
+    usage:
+    measure(rhn, fn, opts, server=None)
+
+    description:
+    runs a single workload and records what it cost. The channel tree cached on the
+    session (see channel.channelTree) is dropped first, so no workload is charged
+    for, or benefits from, the one before it.
+
+    returns:
+    dict
+    {
+        'result'            - the workload's own summary of what it did
+        'wall'              - wall time, seconds
+        'round_trips'       - HTTP requests sent
+        'calls'             - API calls served (only known for an in-process server, else None)
+        'bytes_sent'        - request bytes on the wire
+        'bytes_received'    - response bytes on the wire
+        'peak_rss'          - peak RSS of this process afterwards, KB
+        'rss_growth'        - how far the workload raised the peak RSS, KB
+    }
+
+    parameters:
+    rhn                     - an rhnSession
+    fn(function)            - workload, called as fn(rhn, opts)
+    opts                    - options object passed to the workload
+    *server                 - in-process mockServer instance, for counting API calls
+    """
+    channel.forgetChannelTree(rhn)
+    before = rhn.connectionStats()
+    if server is not None:
+        server.resetCounters()
+    startmem = peakMemory()
+    start = time.time()
+    result = fn(rhn, opts)
+    wall = time.time() - start
+    after = rhn.connectionStats()
+    calls = None
+    if server is not None:
+        calls = sum(server.satellite.calls.values())
+    return { 'result' : result,
+             'wall' : wall,
+             'round_trips' : after['requests'] - before['requests'],
+             'calls' : calls,
+             'bytes_sent' : after['bytes_sent'] - before['bytes_sent'],
+             'bytes_received' : after['bytes_received'] - before['bytes_received'],
+             'peak_rss' : peakMemory(),
+             'rss_growth' : peakMemory() - startmem }
+
+# --------------------------------------------------------------------------------- #
+
+def report(results, out=sys.stdout):
+    """
+    prints a table of (name, measure() result) pairs
+    """
+    fmt = "%-26s %9s %8s %8s %10s %10s %9s %9s"
+    print >> out, fmt % ('workload', 'wall(s)', 'trips', 'calls', 'sent(KB)', 'recv(KB)', 'peak(MB)', 'grew(MB)')
+    print >> out, fmt % tuple([ '=' * x for x in (26, 9, 8, 8, 10, 10, 9, 9) ])
+    for name, res in results:
+        print >> out, "%-26s %9.2f %8d %8s %10.1f %10.1f %9.1f %9.1f" % (name, res['wall'], res['round_trips'],
+            res['calls'] is None and '-' or str(res['calls']),
+            res['bytes_sent'] / 1024.0, res['bytes_received'] / 1024.0,
+            res['peak_rss'] / 1024.0, res['rss_growth'] / 1024.0)
+    print >> out
+    for name, res in results:
+        print >> out, "%-26s %s" % (name, res['result'])
+
+# --------------------------------------------------------------------------------- #
+
+def main(argv):
+    names = [ x[0] for x in WORKLOADS ]
+    parser = OptionParser(usage='%prog [options] [workload ...]',
+        description='time rhnapi workloads against a mock satellite. workloads: %s (default: all)' % ', '.join(names))
+    parser.add_option('--systems', type='int', default=10000, help='systems in the synthetic fleet [%default]')
+    parser.add_option('--packages-per-system', type='int', default=100, help='installed packages per system [%default]')
+    parser.add_option('--base-channels', type='int', default=8, help='base channels [%default]')
+    parser.add_option('--child-channels', type='int', default=5, help='child channels per base channel [%default]')
+    parser.add_option('--errata', type='int', default=500, help='errata to clone [%default]')
+    parser.add_option('--latency', type='float', default=0.001,
+        help='simulated network latency per round trip, seconds [%default]')
+    parser.add_option('--call-latency', type='float', default=0.0,
+        help='simulated server-side work per API call, seconds [%default]')
+    parser.add_option('--workers', type='int', default=parallel.DEFAULT_WORKERS,
+        help='threads for the parallel workloads [%default]')
+    parser.add_option('--batch-size', type='int', default=100, help='calls per multicall for the batch workloads [%default]')
+    parser.add_option('--fast-unmarshal', action='store_true', default=False,
+        help='decode responses with rhnapi.unmarshal instead of xmlrpclib')
+    parser.add_option('--compress', type='int', default=None, metavar='BYTES',
+        help='gzip requests larger than this many bytes')
+    parser.add_option('--server', default=None, metavar='HOST:PORT',
+        help='use an already-running rhnapi.mockserver instead of starting one in-process. '
+             'The fleet and latency options are then those of that server')
+    opts, args = parser.parse_args(argv)
+
+    for name in args:
+        if name not in names:
+            parser.error('unknown workload %s' % name)
+    selected = [ x for x in WORKLOADS if len(args) == 0 or x[0] in args ]
+
+    server = None
+    if opts.server is not None:
+        host, port = opts.server.rsplit(':', 1)
+        address = (host, int(port))
+        transport = lambda: mockserver.mockTransport(address)
+    else:
+        print "generating %d systems..." % opts.systems
+        server = mockserver.start(systems=opts.systems, packages_per_system=opts.packages_per_system,
+                                  base_channels=opts.base_channels, child_channels=opts.child_channels,
+                                  errata=max(opts.errata, 1), latency=opts.latency,
+                                  call_latency=opts.call_latency)
+        transport = server.transport
+
+    rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=transport, logenable=False,
+                            unmarshaller=opts.fast_unmarshal and unmarshal.getparser or None,
+                            compress_threshold=opts.compress)
+    results = []
+    try:
+        # log in first, so the first workload isn't charged for it
+        rhn.key
+        for name, fn in selected:
+            print "running %s..." % name
+            results.append((name, measure(rhn, fn, opts, server)))
+    finally:
+        rhn.logout()
+        if server is not None:
+            server.stop()
+    print
+    report(results)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
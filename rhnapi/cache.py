@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing caches for API responses
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.cache
+
+Caches for API responses, so that scripts which ask the same questions
+over and over only pay for the answer once.
+
+responseCache
+An in-memory cache of read-only API calls (list*, get* and so on), with a TTL per
+method or namespace and least-recently-used eviction. Any other call through the
+session (create, delete, clone, set...) invalidates the cached results for its
+namespace and for related namespaces, e.g. channel.software.create clears cached
+channel listings. To use it:
+
+rhn = rhnapi.rhnSession(server, login, password, cache=cache.responseCache())
+
+Each caller gets its own (deep) copy of a cached result, so the wrappers that
+modify the lists and dicts they receive cannot alter what later callers see.
+
+packageCache
+A persistent (sqlite) cache of package metadata, which never changes once a package
+has been uploaded: packages.getDetails, listFiles, listDependencies and listChangelog,
+keyed by package ID. Entries are keyed by satellite hostname too, so one cache file
+can serve several satellites. The rhnapi.packages wrappers consult it before going
+to the network:
+
+rhn = rhnapi.rhnSession(server, login, password, pkgcache=cache.packageCache('~/.rhnapi-packages.db'))
+"""
+
+__author__ = "Stuart Sears"
+
+import os
+import time
+import atexit
+import copy
+import zlib
+import threading
+import xmlrpclib
+from collections import OrderedDict
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# default lifetime of a cached response, in seconds
+DEFAULT_TTL = 300
+
+# lifetimes for particular methods or namespaces (the most specific match wins).
+# 0 means 'never cache'
+TTLS = {
+    'api' : 3600,
+    'org.listOrgs' : 3600,
+    'channel.listSoftwareChannels' : 600,
+    'channel.listAllChannels' : 600,
+    'channel.listMyChannels' : 600,
+    'systemgroup.listAllGroups' : 600,
+    'kickstart.listKickstarts' : 600,
+    'user.listUsers' : 600,
+    'system.listSystems' : 60,
+    'system.listUserSystems' : 60,
+    'system.listActiveSystems' : 60,
+    'system.listInactiveSystems' : 60,
+    'schedule' : 30,
+    'system.listSystemEvents' : 30,
+}
+
+# method name prefixes (after the namespace) that never change anything on the server
+READONLY_PREFIXES = ('list', 'get', 'is', 'find', 'search', 'lookup', 'has', 'compare', 'download')
+# further read-only methods and namespaces (again, the most specific match wins)
+READONLY = ('api', 'system.search', 'packages.search', 'errata.applicableToChannels',
+            'errata.bugzillaFixes', 'satellite.listEntitlements')
+# calls that neither use nor invalidate the cache
+IGNORED = ('auth', 'system.multicall')
+
+# a write to a top-level namespace also invalidates these ones
+RELATED = {
+    'channel' : ('errata', 'packages', 'system'),
+    'errata' : ('channel', 'packages', 'system'),
+    'packages' : ('channel', 'errata', 'system'),
+    'system' : ('systemgroup', 'channel', 'errata', 'schedule'),
+    'systemgroup' : ('system',),
+    'activationkey' : ('kickstart',),
+    'kickstart' : ('activationkey',),
+    'org' : ('user', 'channel'),
+    'user' : ('org', 'systemgroup'),
+    'configchannel' : ('system',),
+}
+
+# --------------------------------------------------------------------------------- #
+
+def _lookup(table, methodname):
+    """
+    finds the entry for the most specific match of methodname in a dict or sequence of
+    method and namespace names. returns (True, value) or (False, None)
+    """
+    parts = methodname.split('.')
+    for idx in range(len(parts), 0, -1):
+        name = '.'.join(parts[:idx])
+        if name in table:
+            if isinstance(table, dict):
+                return True, table[name]
+            return True, None
+    return False, None
+
+def freeze(value):
+    """
+    returns a hashable equivalent of an XMLRPC value, for use in cache keys
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple([ freeze(x) for x in value ])
+    if isinstance(value, dict):
+        return tuple(sorted([ (k, freeze(v)) for k, v in value.iteritems() ]))
+    if isinstance(value, xmlrpclib.DateTime):
+        return ('DateTime', value.value)
+    if isinstance(value, xmlrpclib.Binary):
+        return ('Binary', value.data)
+    return value
+
+# --------------------------------------------------------------------------------- #
+
+class responseCache(object):
+    """
+    In-memory TTL/LRU cache of read-only API responses. See the module documentation.
+
+    counters:
+    hits, misses    - lookups answered from / not found in the cache
+    evictions       - entries dropped because the cache was full
+    invalidations   - entries dropped because of a write call
+    """
+    def __init__(self, maxsize=1000, ttl=DEFAULT_TTL, ttls=None):
+        """
+        parameters:
+        *maxsize(int)       - maximum number of cached responses [1000]
+        *ttl(int)           - default lifetime of a cached response, seconds [300]
+        *ttls(dict)         - { method or namespace : lifetime } overriding the defaults
+                              in rhnapi.cache.TTLS. 0 means never cache.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self._lock = threading.Lock()
+        # (method, frozen params) -> (expiry time, value), least recently used first
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    # ---------------------------------------------------------------------------- #
+
+    def ignored(self, methodname):
+        """
+        does this call bypass the cache altogether?
+        """
+        return _lookup(IGNORED, methodname)[0]
+
+    def readonly(self, methodname):
+        """
+        is methodname a read-only call? Anything else is treated as a write, and
+        invalidates the cached responses it may have made stale.
+        """
+        verb = methodname.rsplit('.', 1)[-1]
+        return verb.startswith(READONLY_PREFIXES) or _lookup(READONLY, methodname)[0]
+
+    def lifetime(self, methodname):
+        """
+        returns how long to cache the result of methodname, in seconds.
+        0 if it should not be cached, i.e. it is not read-only or is configured off.
+        """
+        if not self.readonly(methodname):
+            return 0
+        found, ttl = _lookup(self.ttls, methodname)
+        if found:
+            return ttl
+        return self.ttl
+    # ---------------------------------------------------------------------------- #
+
+    def get(self, methodname, params):
+        """
+        returns:
+        tuple (found(bool), value). value is a (deep) copy of the cached response
+        """
+        key = (methodname, freeze(params))
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return False, None
+            # re-insert as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+        finally:
+            self._lock.release()
+        return True, copy.deepcopy(entry[1])
+
+    def put(self, methodname, params, value):
+        """
+        caches (a deep copy of) a response, if methodname is cacheable
+        """
+        ttl = self.lifetime(methodname)
+        if ttl <= 0:
+            return
+        key = (methodname, freeze(params))
+        value = copy.deepcopy(value)
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        finally:
+            self._lock.release()
+    # ---------------------------------------------------------------------------- #
+
+    def invalidate(self, methodname):
+        """
+        drops cached responses that a (write) call to methodname may have made stale:
+        everything in its top-level namespace, and in the namespaces related to it.
+        """
+        top = methodname.split('.', 1)[0]
+        namespaces = set((top,) + RELATED.get(top, ()))
+        self._lock.acquire()
+        try:
+            stale = [ k for k in self._entries if k[0].split('.', 1)[0] in namespaces ]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        empties the cache
+        """
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """
+        returns the cache counters and current size as a dict
+        """
+        return { 'size' : len(self._entries), 'hits' : self.hits, 'misses' : self.misses,
+                 'evictions' : self.evictions, 'invalidations' : self.invalidations }
+
+# --------------------------------------------------------------------------------- #
+
+# calls whose results packageCache may keep forever, as they are keyed on an
+# object that is never modified once created.
+# (not errata.listPackages: errata are edited, and published to more channels,
+# by other tools and the web UI too)
+IMMUTABLE = ('packages.getDetails', 'packages.listFiles', 'packages.listDependencies',
+             'packages.listChangelog')
+
+class packageCache(object):
+    """
+    Persistent cache of immutable package metadata. See the module documentation.
+
+    Values are stored as zlib-compressed XMLRPC, so they come back exactly as the
+    server sent them (DateTime values included).
+
+    counters:
+    hits, misses    - lookups answered from / not found in the cache
+    """
+    def __init__(self, filename, commit_every=500, commit_interval=5.0):
+        """
+        parameters:
+        filename(str)           - sqlite database file, created if need be. '~' is expanded.
+        *commit_every(int)      - new entries are committed to disk in groups of this size [500]
+        *commit_interval(float) - and at most this many seconds after being added, by a timer
+                                  thread if no further entries arrive meanwhile [5.0]
+
+        Anything still uncommitted is also written by flush(), which rhnSession.logout and
+        rhnSession.close call, by close(), and when the interpreter exits.
+        Once closed, the cache stores nothing and every lookup is a miss.
+        """
+        from rhnapi import rhnException
+        if sqlite3 is None:
+            raise rhnException('packageCache requires the sqlite3 module')
+        self.filename = os.path.expanduser(filename)
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._lock = threading.Lock()
+        self._pending = 0
+        # commits pending entries commit_interval seconds after the first of them
+        self._timer = None
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses (host TEXT, method TEXT, objid TEXT, '
+                         'value BLOB, PRIMARY KEY (host, method, objid))')
+        self._db.commit()
+        atexit.register(self.close)
+    # ---------------------------------------------------------------------------- #
+
+    def _commit(self):
+        """
+        commits outstanding entries. Call with self._lock held.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._db is not None and self._pending != 0:
+            self._db.commit()
+        self._pending = 0
+
+    def _startTimer(self):
+        """
+        arranges for pending entries to be committed in commit_interval seconds.
+        Call with self._lock held.
+        """
+        if self._timer is None and self.commit_interval is not None:
+            self._timer = threading.Timer(self.commit_interval, self.flush)
+            self._timer.setDaemon(True)
+            self._timer.start()
+
+    def flush(self):
+        """
+        commits any outstanding entries to disk
+        """
+        self._lock.acquire()
+        try:
+            self._commit()
+        finally:
+            self._lock.release()
+
+    def get(self, hostname, methodname, objid):
+        """
+        returns:
+        tuple (found(bool), value)
+        """
+        self._lock.acquire()
+        try:
+            if self._db is None:
+                self.misses += 1
+                return False, None
+            row = self._db.execute('SELECT value FROM responses WHERE host = ? AND method = ? AND objid = ?',
+                                   (hostname, methodname, str(objid))).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        finally:
+            self._lock.release()
+        from rhnapi.unmarshal import parse
+        return True, parse(zlib.decompress(str(row[0])))[0]
+
+    def put(self, hostname, methodname, objid, value):
+        """
+        stores a response
+        """
+        data = zlib.compress(xmlrpclib.dumps((value,), methodresponse=True, allow_none=True))
+        self._lock.acquire()
+        try:
+            if self._db is None:
+                return
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                             (hostname, methodname, str(objid), sqlite3.Binary(data)))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._commit()
+            else:
+                self._startTimer()
+        finally:
+            self._lock.release()
+
+    def forget(self, hostname, objid=None):
+        """
+        drops the cached entries for one package ID (e.g. once it has been
+        deleted from the satellite), or for everything from hostname if objid is None.
+        """
+        self._lock.acquire()
+        try:
+            if self._db is None:
+                return
+            if objid is None:
+                self._db.execute('DELETE FROM responses WHERE host = ?', (hostname,))
+            else:
+                self._db.execute('DELETE FROM responses WHERE host = ? AND objid = ?', (hostname, str(objid)))
+            self._pending += 1
+            self._commit()
+        finally:
+            self._lock.release()
+    # ---------------------------------------------------------------------------- #
+
+    def call(self, rhn, methodname, objid):
+        """
+        usage:
+        call(rhn, methodname, objid)
+
+        description:
+        returns the result of the API call methodname(rhn.key, objid) from the cache,
+        or from the satellite (caching it) if it has not been seen before.
+        Inside an rhn.batch block this returns an rhnFuture, as usual.
+
+        parameters:
+        rhn                     - an authenticated RHN session
+        methodname(str)         - one of IMMUTABLE
+        objid(int)              - package ID
+        """
+        found, value = self.get(rhn.hostname, methodname, objid)
+        if found:
+            if rhn._batch is not None:
+                from rhnapi import rhnFuture
+                future = rhnFuture(None, methodname)
+                future.set_result(value)
+                return future
+            return value
+        result = _sessionMethod(rhn, methodname)(rhn.key, objid)
+        if hasattr(result, 'add_done_callback'):
+            def store(future):
+                if future._error is None:
+                    self.put(rhn.hostname, methodname, objid, future._value)
+            result.add_done_callback(store)
+        else:
+            self.put(rhn.hostname, methodname, objid, result)
+        return result
+
+    def stats(self):
+        """
+        returns the cache counters and number of stored responses as a dict
+        """
+        self._lock.acquire()
+        try:
+            size = 0
+            if self._db is not None:
+                size = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        finally:
+            self._lock.release()
+        return { 'size' : size, 'hits' : self.hits, 'misses' : self.misses }
+
+    def close(self):
+        """
+        commits any outstanding entries and closes the database
+        """
+        self._lock.acquire()
+        try:
+            self._commit()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        finally:
+            self._lock.release()
+
+# --------------------------------------------------------------------------------- #
+
+def _sessionMethod(rhn, methodname):
+    """
+    returns rhn.session.<methodname>, so calls go through the session like any other
+    (batching, the response cache, session renewal, call records and so on)
+    """
+    method = rhn.session
+    for name in methodname.split('.'):
+        method = getattr(method, name)
+    return method
+
+def packageCall(rhn, methodname, objid):
+    """
+    usage:
+    packageCall(rhn, methodname, objid)
+
+    description:
+    makes the API call methodname(rhn.key, objid) through the session's packageCache
+    (rhn.pkgcache) if it has one, or straight to the satellite otherwise.
+    Used by the rhnapi.packages wrappers.
+    """
+    store = getattr(rhn, 'pkgcache', None)
+    if store is None:
+        return _sessionMethod(rhn, methodname)(rhn.key, objid)
+    return store.call(rhn, methodname, objid)
+
+def forgetPackageData(rhn, objid):
+    """
+    drops anything the session's packageCache holds for a package ID
+    that is being changed or deleted. Does nothing if there is no packageCache.
+    """
+    store = getattr(rhn, 'pkgcache', None)
+    if store is not None:
+        store.forget(rhn.hostname, objid)
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing record/replay of rhnSession traffic
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.cassette
+
+Records the API traffic of an rhnSession to an on-disk 'cassette', and replays it
+later with no network access at all. Useful for profiling reporting scripts
+repeatedly against real-shaped data without touching a production satellite.
+
+Record:
+cas = cassette.cassette('listsystems.rhnc', 'record')
+rhn = rhnapi.rhnSession(server, login, password, cassette=cas)
+... run the script ...
+cas.close()
+
+Replay (the same calls, in the same order, get the same responses):
+cas = cassette.cassette('listsystems.rhnc')
+rhn = rhnapi.rhnSession(server, login, 'anything', cassette=cas)
+
+Calls are matched on method name and parameters, ignoring the session key.
+auth.login is matched on the login alone: passwords are never written to the cassette.
+If the same call was recorded more than once, replays return the recorded
+responses in turn, and then keep returning the last one.
+
+Format:
+The cassette file is a stream of records, each one
+  header  - struct '!4s20sHI': magic 'RHNC', SHA1 of the normalised call,
+            length of the method name, length of the response
+  method  - API method name
+  response- zlib-compressed XMLRPC response body
+so it can be appended to, and read, sequentially. Alongside it, <cassette>.idx holds
+one line per record ('digest offset length method'), so opening a multi-gigabyte
+cassette for replay only reads the (small) index; responses are read on demand.
+A missing or out-of-date index is rebuilt by skipping through the record headers.
+
+Running this module summarises a cassette:
+python -m rhnapi.cassette listsystems.rhnc
+"""
+
+__author__ = "Stuart Sears"
+
+import os
+import re
+import sys
+import time
+import zlib
+import struct
+import threading
+import xmlrpclib
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from rhnapi import keepaliveTransport, rhnException
+
+MAGIC = 'RHNC'
+HEADER = struct.Struct('!4s20sHI')
+# what session keys look like, so they can be left out when matching calls
+SESSIONKEY = re.compile(r'^\d+x[0-9a-f]{16,}$')
+# stands in for the session key in normalised calls
+KEY_PLACEHOLDER = '<session key>'
+
+# --------------------------------------------------------------------------------- #
+
+def normalise(methodname, params):
+    """
+    usage:
+    normalise(methodname, params)
+
+    description:
+    strips the parts of a call that legitimately differ between recording and replay:
+    the session key (leading parameter), and for auth.login everything but the login.
+    system.multicall is normalised call by call.
+
+    returns:
+    tuple of parameters
+    """
+    params = tuple(params)
+    if methodname == 'auth.login':
+        return params[:1]
+    if methodname == 'system.multicall' and len(params) == 1:
+        return ([ { 'methodName' : x.get('methodName'),
+                    'params' : list(normalise(x.get('methodName'), x.get('params', []))) }
+                  for x in params[0] ],)
+    if len(params) != 0 and isinstance(params[0], basestring) and SESSIONKEY.match(params[0]):
+        return (KEY_PLACEHOLDER,) + params[1:]
+    return params
+
+def callDigest(request_body):
+    """
+    returns (SHA1 digest, method name) identifying an encoded XMLRPC request
+    """
+    params, methodname = xmlrpclib.loads(request_body)
+    normalised = xmlrpclib.dumps(normalise(methodname, params), methodname, allow_none=True)
+    return sha1(normalised).digest(), methodname
+
+# --------------------------------------------------------------------------------- #
+
+class cassette(object):
+    """
+    A recorded stream of API responses. See the module documentation.
+
+    counters:
+    recorded    - responses written in this session
+    replayed    - responses served
+    """
+    def __init__(self, filename, mode='replay', compresslevel=6):
+        """
+        parameters:
+        filename(str)       - the cassette file. The index is filename + '.idx'
+        *mode(str)          - 'replay' (read only), 'record' (start a new cassette)
+                              or 'append' (add to an existing one) ['replay']
+        *compresslevel(int) - zlib compression level for recorded responses [6]
+        """
+        if mode not in ('replay', 'record', 'append'):
+            raise rhnException('invalid cassette mode %s' % mode)
+        self.filename = filename
+        self.indexfile = filename + '.idx'
+        self.mode = mode
+        self.compresslevel = compresslevel
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        # digest -> [ (offset, length, method) ], in recording order
+        self._index = {}
+        # digest -> index of the next recording to replay
+        self._cursor = {}
+
+        if mode == 'record':
+            self._data = open(filename, 'wb')
+            self._idx = open(self.indexfile, 'w')
+        else:
+            if not os.path.exists(filename):
+                if mode == 'replay':
+                    raise rhnException('no such cassette: %s' % filename)
+                open(filename, 'wb').close()
+            self._loadIndex()
+            if mode == 'append':
+                self._data = open(filename, 'ab')
+                self._idx = open(self.indexfile, 'a')
+            else:
+                self._data = open(filename, 'rb')
+                self._idx = None
+    # ---------------------------------------------------------------------------- #
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def _addEntry(self, digest, offset, length, method):
+        self._index.setdefault(digest, []).append((offset, length, method))
+
+    def _loadIndex(self):
+        """
+        reads the index, or rebuilds it from the cassette if it is missing or stale
+        """
+        size = os.path.getsize(self.filename)
+        end = 0
+        if os.path.exists(self.indexfile):
+            for line in open(self.indexfile):
+                digest, offset, length, method = line.split()
+                offset, length = int(offset), int(length)
+                self._addEntry(digest.decode('hex'), offset, length, method)
+                end = max(end, offset + length)
+        if end != size:
+            self._index = {}
+            self._rebuildIndex()
+
+    def _rebuildIndex(self):
+        """
+        skips through the cassette's record headers, rebuilding the index file
+        """
+        data = open(self.filename, 'rb')
+        idx = open(self.indexfile, 'w')
+        try:
+            while True:
+                header = data.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                magic, digest, methodlen, length = HEADER.unpack(header)
+                if magic != MAGIC:
+                    raise rhnException('%s is not a cassette, or is corrupt' % self.filename)
+                method = data.read(methodlen)
+                offset = data.tell()
+                if offset + length > os.fstat(data.fileno()).st_size:
+                    # truncated final record, e.g. an interrupted recording
+                    break
+                data.seek(length, 1)
+                self._addEntry(digest, offset, length, method)
+                idx.write('%s %d %d %s\n' % (digest.encode('hex'), offset, length, method))
+        finally:
+            data.close()
+            idx.close()
+    # ---------------------------------------------------------------------------- #
+
+    def record(self, request_body, response_body):
+        """
+        appends a response to the cassette (the transport recorder callback)
+        """
+        digest, method = callDigest(request_body)
+        payload = zlib.compress(response_body, self.compresslevel)
+        self._lock.acquire()
+        try:
+            self._data.write(HEADER.pack(MAGIC, digest, len(method), len(payload)))
+            self._data.write(method)
+            offset = self._data.tell()
+            self._data.write(payload)
+            self._data.flush()
+            self._idx.write('%s %d %d %s\n' % (digest.encode('hex'), offset, len(payload), method))
+            self._idx.flush()
+            self._addEntry(digest, offset, len(payload), method)
+            self.recorded += 1
+        finally:
+            self._lock.release()
+
+    def fetch(self, request_body):
+        """
+        returns the recorded response body for an encoded request.
+        raises rhnException if the call was never recorded.
+        """
+        digest, method = callDigest(request_body)
+        self._lock.acquire()
+        try:
+            entries = self._index.get(digest)
+            if not entries:
+                raise rhnException('call to %s not found in cassette %s' % (method, self.filename))
+            pos = self._cursor.get(digest, 0)
+            self._cursor[digest] = min(pos + 1, len(entries) - 1)
+            offset, length, method = entries[pos]
+            self._data.seek(offset)
+            payload = self._data.read(length)
+            self.replayed += 1
+        finally:
+            self._lock.release()
+        return zlib.decompress(payload)
+
+    def rewind(self):
+        """
+        replay from the first recording of every call again
+        """
+        self._cursor = {}
+    # ---------------------------------------------------------------------------- #
+
+    def wrap(self, transport):
+        """
+        called by rhnSession for each transport it creates.
+
+        returns:
+        in replay mode, a replayTransport (the original transport is never used)
+        otherwise the original transport, recording to this cassette
+        """
+        if self.replaying:
+            return replayTransport(self)
+        if not isinstance(transport, keepaliveTransport):
+            raise rhnException('cannot record from a %s transport' % transport.__class__.__name__)
+        transport.recorder = self.record
+        return transport
+
+    def transport(self):
+        """
+        returns a new replayTransport for this cassette (usable as an rhnSession transport factory)
+        """
+        return replayTransport(self)
+
+    def summary(self):
+        """
+        returns:
+        dict { method : number of recorded responses }
+        """
+        counts = {}
+        for entries in self._index.values():
+            for offset, length, method in entries:
+                counts[method] = counts.get(method, 0) + 1
+        return counts
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+            if self._idx is not None:
+                self._idx.close()
+                self._idx = None
+        finally:
+            self._lock.release()
+
+# --------------------------------------------------------------------------------- #
+
+class replayTransport(keepaliveTransport):
+    """
+    A transport that serves every request from a cassette and never touches the network.
+    Counters, the response parser and stats() work as for keepaliveTransport.
+    """
+    def __init__(self, cassette, use_datetime=0):
+        keepaliveTransport.__init__(self, use_datetime=use_datetime)
+        self.cassette = cassette
+
+    def request(self, host, handler, request_body, verbose=0):
+        self.requests += 1
+        self.bytes_sent += len(request_body)
+        self.last_sent = len(request_body)
+        response = self.cassette.fetch(request_body)
+        self.bytes_received += len(response)
+        self.last_received = len(response)
+        start = time.time()
+        try:
+            p, u = self.getparser()
+            p.feed(response)
+            p.close()
+            return u.close()
+        finally:
+            self.last_parse_time = time.time() - start
+
+    def close(self):
+        pass
+
+# --------------------------------------------------------------------------------- #
+
+def main(argv):
+    if len(argv) != 1:
+        print "usage: python -m rhnapi.cassette CASSETTE"
+        return 1
+    cas = cassette(argv[0])
+    counts = cas.summary()
+    for method in sorted(counts):
+        print "%7d %s" % (counts[method], method)
+    print "%7d responses, %d bytes (compressed)" % (sum(counts.values()), os.path.getsize(argv[0]))
+    cas.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -39,8 +39,17 @@ __author__ = "Stuart Sears"
 # Additional stdlib modules
 import time
 import re
+import xmlrpclib
 from operator import itemgetter
 
+from rhnapi import parallel, rhnException
+from rhnapi.pkglist import compact as compactPackages
+
+# how long (seconds) the ChannelTree cached on an rhnSession is trusted for (see channelTree)
+CHANNELTREE_MAXAGE = 600
+# getDetails calls per system.multicall request when building a ChannelTree
+CHANNELTREE_BATCH = 200
+
 # possible architectures according to the RHN satellite channel creation page:
 # the mapping allows me to use the shorter names
 
@@ -496,6 +505,7 @@ def create(rhn, chanlabel, channame, summary, arch, parent='', checksum=None, gp
 
     If gpgkey is provided, checksum is also required. Sorry, but that's just how it is.
     """
+    forgetChannelTree(rhn)
     try:
         if gpgkey is not None and checksum is not None:
             return rhn.session.channel.software.create(rhn.key, chanlabel, channame, summary,
@@ -546,6 +556,7 @@ def createChannel(rhn, label, name, summary, arch, parent=None, **kwargs):
         parentLabel = ''
     else:
         parentLabel = parent
+    forgetChannelTree(rhn)
     try:
         return rhn.session.channel.software.create(rhn.key, label, name, summary, archLabel, parentLabel, **kwargs) == 1
     except Exception, E:
@@ -592,6 +603,7 @@ def clone(rhn, source_channel, name, label, summary, parent_label=None, arch_lab
     for k in clone_details.keys():
         if clone_details[k] is None:
             del clone_details[k]
+    forgetChannelTree(rhn)
     try:
         # well, it returns an integer if the channel cloned successfully, so let's test that
         return isinstance(rhn.session.channel.software.clone(rhn.key, source_channel, clone_details, no_errata), int)
@@ -635,6 +647,7 @@ def cloneChannel(rhn, sourcelabel, noerrata = False, **kwargs):
     *gpg_fingerprint(str)   - GPG fingerprint
     *description(str)       - cloned channel description
     """
+    forgetChannelTree(rhn)
     try:
         res = rhn.session.channel.software.clone(rhn.key, sourcelabel, kwargs, noerrata)
     # SH : For 5.4 just cloning via channel.software.clone is not enough apparently, see :
@@ -681,6 +694,7 @@ def delete(rhn, chanlabel):
     rhn                     - an authenticated RHN session.
     chanlabel (str)     - the channel to delete.
     """
+    forgetChannelTree(rhn)
     try:
         return rhn.session.channel.software.delete(rhn.key, chanlabel) == 1
     except Exception, E:
@@ -891,13 +905,13 @@ def setUserSubscribable(rhn, chanlabel, username):
 
 # --------------------------------------------------------------------------------- #
 
-def listAllPackages(rhn, chanlabel, start_date=None, end_date=None):
+def listAllPackages(rhn, chanlabel, start_date=None, end_date=None, compact=False):
     """
     API:
     channel.software.listAllPackages
 
     usage:
-    listPackages(rhn, chanlabel, start_date='', end_date='')
+    listPackages(rhn, chanlabel, start_date='', end_date='', compact=False)
     
     description:
     Lists all packages in a channel, regardless of modification date/time.
@@ -905,23 +919,28 @@ def listAllPackages(rhn, chanlabel, start_date=None, end_date=None):
 
     returns:
     list of dict, one per package  [ {..}, {..} ]
+    or with compact=True, an rhnapi.pkglist.packageList (a far smaller, read-only equivalent)
 
     parameters:
     rhn                     - an authenticated RHN session.
     chanlabel(str)          - channel label
     *start_date(str)        - start date. Optional.
     *end_date(str)          - end date. Optional. If no start_date, end_date is ignored.
+    *compact(bool)          - return a packageList instead of a list of dict [False]
 
     Date formats are string representations of iso8601:
     format is '%Y-%m-%d %H:%M:%S' e.g. '2009-01-23 14:05:43'
     """
     try:
         if start_date is None:
-            return rhn.session.channel.software.listAllPackages(rhn.key, chanlabel)
+            pkgs = rhn.session.channel.software.listAllPackages(rhn.key, chanlabel)
         elif end_date is None:
-            return rhn.session.channel.software.listAllPackages(rhn.key, chanlabel, start_date)
+            pkgs = rhn.session.channel.software.listAllPackages(rhn.key, chanlabel, start_date)
         else:
-            return rhn.session.channel.software.listAllPackages(rhn.key, chanlabel, start_date, end_date)
+            pkgs = rhn.session.channel.software.listAllPackages(rhn.key, chanlabel, start_date, end_date)
+        if compact:
+            return compactPackages(pkgs)
+        return pkgs
     except Exception, E:
         return rhn.fail(E, 'list packages in channel %s' % ( chanlabel ) )
 
@@ -1339,6 +1358,206 @@ def setContactDetails(rhn, chanlabel, name, email, phone, policy):
 
 # --------------------------------------------------------------------------------- #
 
+def _fetchChannelDetails(rhn, channels):
+    """
+    returns { label : channel.software.getDetails output } for a list of channels
+    (as returned by listAllChannels), fetched in system.multicall batches, or with
+    parallel calls if the server does not support system.multicall.
+    Channels whose details cannot be retrieved are left out.
+    """
+    details = {}
+    try:
+        with rhn.batch(CHANNELTREE_BATCH):
+            futures = [ (x['label'], rhn.session.channel.software.getDetails(rhn.key, x['id'])) for x in channels ]
+    except xmlrpclib.Fault, E:
+        rhn.logDebug("system.multicall failed (%s), fetching channel details in parallel" % E)
+        # detailsByID logs (and returns False for) any failures
+        results, faults = parallel.pmap(rhn, detailsByID, [ x['id'] for x in channels ])
+        for chan, res in zip(channels, results):
+            if res:
+                details[chan['label']] = res
+        return details
+    for label, future in futures:
+        try:
+            details[label] = future.result()
+        except xmlrpclib.Fault, E:
+            rhn.logWarn("unable to get details for channel %s: %s" % (label, E))
+    return details
+
+class ChannelTree(object):
+    """
+    The channel hierarchy of a satellite, held locally for fast queries.
+
+    Built once from channel.listAllChannels plus channel.software.getDetails for
+    every channel (sent in system.multicall batches), after which lookups of a
+    channel's details, parent, children and arch, or whether it exists at all,
+    are dictionary lookups by channel label or ID with no further API calls.
+
+    Build one with ChannelTree.fromSatellite(rhn), or use channelTree(rhn) to share
+    one (cached on the session) with listBaseChannels, channelsByArch, channelExists etc.
+
+    e.g.
+    tree = channelTree(rhn)
+    missing = tree.missing(labels_to_check)
+    for base in tree.baseChannels():
+        print base, tree.children(base)
+    """
+    def __init__(self, details):
+        """
+        parameters:
+        details(dict)           - { label : channel.software.getDetails output }
+        """
+        self.channels = details
+        self.ids = dict([ (v['id'], k) for k, v in details.iteritems() ])
+        self._children = dict([ (k, []) for k in details ])
+        for label, chan in details.iteritems():
+            parent = chan['parent_channel_label']
+            if len(parent) != 0:
+                self._children.setdefault(parent, []).append(label)
+        for kids in self._children.itervalues():
+            kids.sort()
+        self._bases = sorted([ k for k, v in details.iteritems() if len(v['parent_channel_label']) == 0 ])
+        self.created = time.time()
+    # ---------------------------------------------------------------------------- #
+
+    @classmethod
+    def fromSatellite(cls, rhn):
+        """
+        builds a ChannelTree from the satellite rhn is connected to
+        """
+        return cls(_fetchChannelDetails(rhn, rhn.session.channel.listAllChannels(rhn.key)))
+    # ---------------------------------------------------------------------------- #
+
+    def label(self, chanspec):
+        """
+        returns the label for a channel label or ID, or None if there is no such channel
+        """
+        if chanspec in self.channels:
+            return chanspec
+        return self.ids.get(chanspec)
+
+    def exists(self, chanspec):
+        """
+        is there a channel with this label or ID?
+        """
+        return self.label(chanspec) is not None
+
+    __contains__ = exists
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(sorted(self.channels))
+
+    def details(self, chanspec):
+        """
+        returns the channel.software.getDetails dict for a channel label or ID.
+        raises KeyError if there is no such channel
+        """
+        label = self.label(chanspec)
+        if label is None:
+            raise KeyError(chanspec)
+        return self.channels[label]
+    # ---------------------------------------------------------------------------- #
+
+    def parent(self, chanspec):
+        """
+        returns the label of a channel's parent ('' for a base channel)
+        """
+        return self.details(chanspec)['parent_channel_label']
+
+    def isBase(self, chanspec):
+        """
+        is this a base channel?
+        """
+        return len(self.parent(chanspec)) == 0
+
+    def children(self, chanspec):
+        """
+        returns a (sorted) list of the labels of a channel's children
+        """
+        return list(self._children[self.details(chanspec)['label']])
+
+    def hasChildren(self, chanspec):
+        """
+        does this channel have child channels?
+        """
+        return len(self._children[self.details(chanspec)['label']]) != 0
+
+    def arch(self, chanspec):
+        """
+        returns a channel's architecture name, e.g. 'x86_64'
+        """
+        return self.details(chanspec)['arch_name']
+    # ---------------------------------------------------------------------------- #
+
+    def baseChannels(self, regex=None):
+        """
+        returns the (sorted) labels of all base channels, optionally only those matching
+        a regular expression
+        """
+        if regex is not None:
+            pattern = re.compile(r'%s' % str(regex))
+            return [ x for x in self._bases if pattern.search(x) ]
+        return list(self._bases)
+
+    def byArch(self, archlabel):
+        """
+        returns the (sorted) labels of all channels with the given architecture,
+        given as a name ('x86_64') or a label ('channel-x86_64')
+        """
+        return sorted([ k for k, v in self.channels.iteritems() if archlabel in (v['arch_name'], v['arch_label']) ])
+
+    def missing(self, chanspecs):
+        """
+        returns those of a list of channel labels or IDs that do not exist
+        """
+        return [ x for x in chanspecs if not self.exists(x) ]
+
+def channelTree(rhn, refresh=False):
+    """
+    API:
+    none, custom method
+
+    usage:
+    channelTree(rhn, refresh=False)
+
+    description:
+    Returns a ChannelTree for your satellite, holding the whole channel hierarchy.
+    (listSoftwareChannels would be quicker but misses channels shared via multi-org trusts,
+    BZ655056, and listAllChannels doesn't return parent labels, BZ500690)
+
+    The tree is cached on the rhn session for CHANNELTREE_MAXAGE seconds, and dropped
+    when channels are created, cloned or deleted via this module. listBaseChannels,
+    channelsByArch and channelExists all use it. (listChildChannels and hasChildren
+    always ask the satellite, as they are usually called just before changing things)
+
+    returns:
+    ChannelTree
+
+    parameters:
+    rhn                     - an authenticated RHN session.
+    *refresh(bool)          - ignore any cached tree and build a new one [False]
+    """
+    tree = getattr(rhn, '_channeltree', None)
+    if not refresh and tree is not None and time.time() - tree.created < CHANNELTREE_MAXAGE:
+        return tree
+    try:
+        tree = ChannelTree.fromSatellite(rhn)
+    except Exception, E:
+        return rhn.fail(E, 'resolve the channel hierarchy on your satellite')
+    rhn._channeltree = tree
+    return tree
+
+def forgetChannelTree(rhn):
+    """
+    drops the ChannelTree cached on the rhn session, if any (see channelTree)
+    """
+    rhn._channeltree = None
+
+# --------------------------------------------------------------------------------- #
+
 def listChildChannels(rhn, chanlabel):
     """
     API:
@@ -1360,7 +1579,7 @@ def listChildChannels(rhn, chanlabel):
     try:
         return sorted([ x['label'] for x in rhn.session.channel.software.listChildren(rhn.key, chanlabel)])
     except Exception, E:
-        return rhn.fail(E, 'list children of channel %s' % ( channel_label ) )
+        return rhn.fail(E, 'list children of channel %s' % ( chanlabel ) )
     
 # --------------------------------------------------------------------------------- #
 
@@ -1373,7 +1592,7 @@ def listBaseChannels(rhn, regex=None):
     listBaseChannels(rhn)
 
     description:
-    List the base channels on your satellite
+    List the base channels on your satellite, from the channel tree (see channelTree)
 
     returns:
     list of channel labels
@@ -1382,22 +1601,11 @@ def listBaseChannels(rhn, regex=None):
     rhn                     - an authenticated RHN session.
     regex(str)              - optional regular expression to match against labels
     """
+    tree = channelTree(rhn)
+    if tree is False:
+        return False
     try:
-        # Note we cannot use listSoftwareChannels here or it wont see channels shared by 
-        # multi-org-trusts, ref unresolved BZ655056, therefore it's neccesary to get all 
-        # Channels, then see if they have a parent_label via channel.software.getDetails()
-        # because, stupidly listAllChannels doesn't return parent_label, ref BZ500690
-        allchannels = sorted(rhn.session.channel.listAllChannels(rhn.key), key=itemgetter('label'))
-        basechannels = list()
-        for channel in allchannels:
-            chdetails = rhn.session.channel.software.getDetails(rhn.key, channel['id'])
-            if len(chdetails['parent_channel_label']) == 0:
-                basechannels.append(channel['label'])
-        if regex is not None:
-            pattern = re.compile(r'%s' % str(regex))
-            return [ x for x in basechannels if pattern.search(x) ]
-        else:
-            return basechannels
+        return tree.baseChannels(regex)
     except Exception, E:
         return rhn.fail(E, 'list base channels on your satellite')
     
@@ -1410,7 +1618,7 @@ def channelsByArch(rhn, archlabel):
     channelsByArch(rhn, archlabel)
 
     description:
-    lists all channels of a given architecture. 
+    lists all channels of a given architecture, from the channel tree (see channelTree)
 
 
     returns:
@@ -1418,13 +1626,40 @@ def channelsByArch(rhn, archlabel):
 
     parameters:
     rhn                     - an authenticated RHN session
-    archlabel(str)          - the channel architecture to list.
+    archlabel(str)          - the channel architecture to list, either as a name ('x86_64')
+                              or a label ('channel-x86_64')
     """
+    tree = channelTree(rhn)
+    if tree is False:
+        return False
     try:
-        chanlist = rhn.session.channel.listSoftwareChannels(rhn.key)
-        return [ x['label'] for x in chanlist if x['arch'] == archlabel ]
+        return tree.byArch(archlabel)
     except Exception, E:
-        return rhn.fail(E, "find channels with arch %s" % (arch))
+        return rhn.fail(E, "find channels with arch %s" % (archlabel))
+
+# --------------------------------------------------------------------------------- #
+
+class channelResults(list):
+    """
+    The per-channel results of deleteRecursive and cloneRecursive: a list of dict,
+    which is only true if every channel succeeded, so callers can still just do
+    if deleteRecursive(rhn, label):
+    """
+    # 'status' values that count as success
+    succeeded = ('deleted', 'cloned', 'skipped', 'planned')
+
+    @property
+    def ok(self):
+        return len([ x for x in self if x['status'] not in self.succeeded ]) == 0
+
+    def __nonzero__(self):
+        return self.ok
+
+    def failures(self):
+        """
+        returns the results for channels that did not succeed
+        """
+        return [ x for x in self if x['status'] not in self.succeeded ]
 
 # --------------------------------------------------------------------------------- #
 # Methods under here are not technically part of the API, just utility functions I added
@@ -1451,85 +1686,248 @@ def hasChildren(rhn, chanlabel):
     try:
         return len(rhn.session.channel.software.listChildren(rhn.key, chanlabel)) != 0
     except Exception, E:
-        return rhn.fail(E, 'check for children of channel %s' % channel_label)
+        return rhn.fail(E, 'check for children of channel %s' % chanlabel)
 
-def deleteRecursive(rhn, chanlabel):
+def deleteRecursive(rhn, chanlabels, dryrun=False, workers=parallel.DEFAULT_WORKERS):
     """
     API:
     none, custom method
-    
+
     usage:
-    deleteRecursive(rhn, chanlabel)
+    deleteRecursive(rhn, chanlabels, dryrun=False, workers=4)
 
     description:
-    deletes all children of a given custom channel, then the channel itself.
+    deletes all children of one or more custom channels, then the channels themselves.
     This could cause utter mayhem, be careful.
 
-    returns:
-    Bool, or throws Exception
+    All the child channels are deleted concurrently over a pool of worker threads,
+    then each parent whose children are all gone is deleted (also concurrently).
+    Failures are recorded rather than aborting the run, so one undeletable channel
+    does not leave the rest half-done. A parent with a child that could not be
+    deleted is itself left alone ('not attempted').
 
-    params:
-    rhn                 - authenticated rhnapi.rhnSession 
-    chanlabel(str)  - label of parent channel
-    """
-    # I could call my other utility methods in here, but for portability, 
-    # I'm using the API directly
-    try:
-        if hasChildren(rhn, chanlabel):
-            for child in rhn.session.channel.software.listChildren(rhn.key, chanlabel):
-                rhn.session.channel.software.delete(rhn.key, child['label'])
-        # handily, this will fail if any of the child channels could not be deleted:
-        return rhn.session.channel.software.delete(rhn.key, chanlabel) == 1
-    except Exception, E:
-        return rhn.fail(E, 'recursively delete channel %s and all its child channels' % channel_label)
+    With dryrun=True nothing is deleted: the results show what would be.
+
+    returns:
+    channelResults: list of dict, one per channel, children before their parents.
+    (this used to be a Bool; the list is still only true if every channel was
+    deleted, or for a dry run, would be, so 'if deleteRecursive(...)' keeps working)
+    {
+        'label'     - channel label
+        'parent'    - parent channel label ('' for the channels you asked to delete)
+        'status'    - 'deleted', 'failed', 'not attempted', 'missing' (no such channel)
+                      or 'planned' (dryrun=True)
+        'error'     - error message, for failures
+    }
 
-def cloneRecursive(rhn, chanlabel, prefix=None, suffix=None):
+    params: ( * = optional )
+    rhn                 - authenticated rhnapi.rhnSession
+    chanlabels(str)     - label of parent channel, or a list of them
+    *dryrun(bool)       - only report what would be deleted [False]
+    *workers(int)       - threads used to delete channels [4]
+    """
+    if isinstance(chanlabels, basestring):
+        chanlabels = [ chanlabels ]
+    tree = channelTree(rhn, refresh=True)
+    # (an empty tree is a valid answer, just a falsy one)
+    if tree is False:
+        return False
+
+    parents = []
+    children = []
+    missing = []
+    results = {}
+    for label in chanlabels:
+        if label in results:
+            continue
+        if label not in tree:
+            results[label] = { 'label' : label, 'parent' : '', 'status' : 'missing' }
+            missing.append(label)
+            continue
+        parents.append(label)
+        results[label] = { 'label' : label, 'parent' : '', 'status' : 'planned' }
+        for child in tree.children(label):
+            children.append(child)
+            results[child] = { 'label' : child, 'parent' : label, 'status' : 'planned' }
+    # a channel listed alongside its own parent is deleted as one of the parent's children
+    parents = [ x for x in parents if results[x]['parent'] == '' ]
+    order = children + parents + missing
+
+    if not dryrun and len(order) != 0:
+        forgetChannelTree(rhn)
+        def deleteOne(rhn, label):
+            return rhn.session.channel.software.delete(rhn.key, label)
+
+        def run(labels):
+            done, faults = parallel.pmap(rhn, deleteOne, labels, workers)
+            for idx, label in enumerate(labels):
+                if idx in faults:
+                    rhn.logError('unable to delete channel %s: %s' % (label, faults[idx]))
+                    results[label].update({ 'status' : 'failed', 'error' : str(faults[idx]) })
+                elif done[idx] != 1:
+                    rhn.logError('unable to delete channel %s: satellite returned %r' % (label, done[idx]))
+                    results[label].update({ 'status' : 'failed',
+                                            'error' : 'channel.software.delete returned %r' % done[idx] })
+                else:
+                    rhn.logInfo('deleted channel %s' % label)
+                    results[label]['status'] = 'deleted'
+
+        run(children)
+        ready = []
+        for label in parents:
+            if [ x for x in tree.children(label) if results[x]['status'] != 'deleted' ]:
+                results[label]['status'] = 'not attempted'
+            else:
+                ready.append(label)
+        run(ready)
+
+    return channelResults([ results[x] for x in order ])
+
+def _relabel(label, prefix=None, suffix=None):
+    """
+    adds a prefix and/or suffix to a channel label or name
+    """
+    return '%s%s%s' % (prefix or '', label, suffix or '')
+
+def _cloneOne(rhn, details, label, name, parent_label, noerrata):
+    """
+    clones a single channel (given its getDetails output) for cloneRecursive.
+    Raises any exceptions, so that parallel.pmap can collect them.
+    """
+    clone_details = { 'label' : label, 'name' : name, 'summary' : details.get('summary') or name }
+    if parent_label:
+        clone_details['parent_label'] = parent_label
+    return rhn.session.channel.software.clone(rhn.key, details['label'], clone_details, noerrata)
+
+def cloneRecursive(rhn, chanlabel, prefix=None, suffix=None, noerrata=False, resume=False,
+                   workers=parallel.DEFAULT_WORKERS):
     """
     API:
     none, custom method
 
-    CUSTOM METHOD
-    A placeholder for a custom method to recursively clone channels,
-    adding either a prefix or suffix (or both) to their existing labels
-    Mostly I envision this being a date (for example) or something like 'prod' or 'test'
-
     usage:
-    cloneRecursive(rhn, parent_label, target_label, prefix=None, suffix=None)
+    cloneRecursive(rhn, chanlabel, prefix=None, suffix=None, noerrata=False, resume=False, workers=4)
+
+    description:
+    Clones a channel and all of its child channels, adding a prefix and/or suffix to
+    their labels and names (mostly I envision this being a date, or something like
+    'prod' or 'test'). The parent is cloned first, then its children are cloned
+    concurrently over a pool of worker threads.
+
+    A failure to clone one child does not stop the others; if the parent cannot be
+    cloned, no children are attempted. With resume=True, channels whose target labels
+    already exist are skipped rather than failing, so an interrupted run can simply
+    be repeated.
 
     returns:
-    list of dict, one per newly cloned channel. Or possibly just a bool. Who knows?
+    channelResults: list of dict, one per channel (the parent first, then its children
+    in label order), which is only true if every channel was cloned (or skipped)
+    {
+        'source'    - label of the original channel
+        'label'     - label of the clone
+        'status'    - 'cloned', 'skipped' (resume=True and it already exists),
+                      'failed', or 'not attempted' (the parent failed)
+        'error'     - error message, for failures
+    }
 
     params: ( * = optional )
     rhn                         - authenticated rhn session object
-    chanlabel(str)              - the (parent) channel label to clone  
-    *prefix(str)                - prefix (prepended to destination channel labels)
-    *suffix(str)                - suffix (appended to destination channel labels)
+    chanlabel(str)              - the (parent) channel label to clone
+    *prefix(str)                - prefix (prepended to destination channel labels and names)
+    *suffix(str)                - suffix (appended to destination channel labels and names)
+    *noerrata(bool)             - clone the channels in their original state, without errata [False]
+    *resume(bool)               - skip channels whose clones already exist [False]
+    *workers(int)               - threads used to clone child channels [4]
 
     You really MUST provide one of prefix or suffix, as otherwise the cloning will fail,
     because source and target labels will be identical.
     """
-    return 'Not Implemented Yet'
+    if not prefix and not suffix:
+        return rhn.fail(rhnException('one of prefix or suffix is required'),
+                        'recursively clone channel %s' % chanlabel)
+    tree = channelTree(rhn, refresh=True)
+    # (an empty tree is a valid answer, just a falsy one)
+    if tree is False:
+        return False
+    if chanlabel not in tree:
+        return rhn.fail(rhnException('no such channel'), 'recursively clone channel %s' % chanlabel)
+
+    def outcome(source, status, error=None):
+        res = { 'source' : source, 'label' : _relabel(source, prefix, suffix), 'status' : status }
+        if error is not None:
+            res['error'] = str(error)
+        return res
+
+    newparent = _relabel(chanlabel, prefix, suffix)
+    children = tree.children(chanlabel)
+
+    def cloneAs(rhn, source, parent_label):
+        details = tree.details(source)
+        return _cloneOne(rhn, details, _relabel(source, prefix, suffix),
+                         _relabel(details['name'], prefix, suffix), parent_label, noerrata)
+
+    try:
+        if resume and newparent in tree:
+            results = [ outcome(chanlabel, 'skipped') ]
+        else:
+            try:
+                cloneAs(rhn, chanlabel, tree.parent(chanlabel))
+                results = [ outcome(chanlabel, 'cloned') ]
+            except Exception, E:
+                rhn.logError('unable to clone channel %s as %s: %s' % (chanlabel, newparent, E))
+                return channelResults([ outcome(chanlabel, 'failed', E) ] +
+                                      [ outcome(x, 'not attempted') for x in children ])
+
+        todo = []
+        for child in children:
+            if resume and _relabel(child, prefix, suffix) in tree:
+                results.append(outcome(child, 'skipped'))
+            else:
+                todo.append(child)
+
+        if len(todo) != 0:
+            done, faults = parallel.pmap(rhn, cloneAs, todo, workers, newparent)
+            for idx, child in enumerate(todo):
+                if idx in faults:
+                    rhn.logError('unable to clone channel %s: %s' % (child, faults[idx]))
+                    results.append(outcome(child, 'failed', faults[idx]))
+                else:
+                    rhn.logInfo('cloned channel %s as %s' % (child, _relabel(child, prefix, suffix)))
+                    results.append(outcome(child, 'cloned'))
+        results[1:] = sorted(results[1:], key = lambda x: x['source'])
+        return channelResults(results)
+    finally:
+        forgetChannelTree(rhn)
     
 # --------------------------------------------------------------------------------- #
-def channelExists(rhn, channel_label):
+def channelExists(rhn, channel_label, refresh=False):
     """
     CUSTOM METHOD
     Custom RHN API method to confirm the existence of a channel label on your satellite.
 
+    By default this is answered from the cached channel tree (see channelTree), so checking
+    many labels costs no more API calls than checking one. Channels created or deleted
+    via this module are seen straight away, but those changed elsewhere (by other scripts,
+    or via rhn.session directly) may not be for up to CHANNELTREE_MAXAGE seconds.
+    Pass refresh=True to ask the satellite afresh (a single listSoftwareChannels call).
+
     returns: bool
 
     params:
     rhn                 - authenticated rhnapi.rhnSession object
-    channel_label(str)  - label of channel to look for
-    """
-    try:
-        chanlist = [ x['label'] for x in listSoftwareChannels(rhn) ]
-        if channel_label in chanlist:
-            return True
-        else:
-            return False
-    except Exception, E:
-        return rhn.fail(E, 'check channel existence')
+    channel_label(str)  - label of channel to look for (or its ID, unless refresh is True)
+    *refresh(bool)      - check the satellite's list of software channels rather than
+                          the cached channel tree [False]
+    """
+    if refresh:
+        try:
+            return channel_label in [ x['label'] for x in rhn.session.channel.listSoftwareChannels(rhn.key) ]
+        except Exception, E:
+            return rhn.fail(E, 'check channel existence')
+    tree = channelTree(rhn)
+    if tree is False:
+        return False
+    return tree.exists(channel_label)
 
 
 # footer - do not edit below here
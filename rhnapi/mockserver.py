@@ -0,0 +1,893 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing a local stand-in satellite XMLRPC server
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.mockserver
+
+An in-process, threaded XMLRPC server that stands in for a satellite, so that
+rhnapi scripts can be exercised and benchmarked without a live server.
+
+It serves a synthetic (but deterministic, for a given seed) fleet of systems,
+channels, packages and errata through the 'auth', 'api', 'user', 'channel',
+'channel.software', 'system', 'errata' and 'packages' namespaces, plus
+system.multicall. Return values follow the shapes documented in the other rhnapi
+modules. Latency can be injected per HTTP request (network round trip) and
+per API call (server-side work).
+
+Typical use:
+
+from rhnapi import mockserver, system
+server = mockserver.start(systems=10000, latency=0.002)
+rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=server.transport)
+print len(system.listSystems(rhn))
+server.stop()
+
+It can also be run standalone, for scripts in another process:
+python -m rhnapi.mockserver --port 8080 --systems 1000
+and reached with transport=lambda: mockserver.mockTransport(('localhost', 8080))
+"""
+
+__author__ = "Stuart Sears"
+
+import xmlrpclib
+import httplib
+import threading
+import socket
+import random
+import time
+import inspect
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from SocketServer import ThreadingMixIn
+
+from rhnapi import keepaliveTransport, rhnException
+
+# fault codes, as the satellite uses them
+FAULT_SESSION = rhnException.expiry_faults[0]
+FAULT_LOGIN = 2950
+FAULT_NO_CHANNEL = -210
+FAULT_NO_SYSTEM = -208
+FAULT_NO_ERRATUM = -208
+FAULT_NO_PACKAGE = -208
+FAULT_INVALID = -1
+FAULT_UNKNOWN_METHOD = -1
+
+# base channel arches, cycled through as base channels are generated
+ARCHES = [ 'x86_64', 'i386', 'ppc', 's390x' ]
+PKG_ARCHES = { 'x86_64' : ('x86_64', 'noarch', 'i686'),
+               'i386' : ('i686', 'noarch', 'i386'),
+               'ppc' : ('ppc64', 'noarch', 'ppc'),
+               's390x' : ('s390x', 'noarch', 's390'), }
+CHILD_TYPES = [ 'optional', 'supplementary', 'rhn-tools', 'extras', 'fastrack' ]
+ERRATA_TYPES = [ ('RHSA', 'Security Advisory', 'CLA'),
+                 ('RHBA', 'Bug Fix Advisory', 'CLB'),
+                 ('RHEA', 'Product Enhancement Advisory', 'CLE') ]
+
+# --------------------------------------------------------------------------------- #
+
+def _timestamp(n):
+    """
+    a deterministic 'YYYY-MM-DD HH:MM:SS' string derived from an integer
+    """
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1262304000 + (n * 7919) % 157680000))
+
+def _datetime(n):
+    """
+    a deterministic xmlrpclib.DateTime derived from an integer
+    """
+    return xmlrpclib.DateTime(time.gmtime(1262304000 + (n * 7919) % 157680000))
+
+# --------------------------------------------------------------------------------- #
+
+class mockSatellite(object):
+    """
+    The synthetic satellite: generates the data and implements the API methods.
+    API method 'a.b.c' is implemented by the method named 'a_b_c'.
+
+    counters:
+    calls       - dict { methodname : number of calls }
+    """
+    def __init__(self, systems=1000, base_channels=4, child_channels=3, packages=2000,
+                 packages_per_system=200, errata=500, seed=0, login='admin', password='password',
+                 session_lifetime=None, call_latency=0.0):
+        """
+        parameters (all optional):
+        systems(int)            - number of registered systems [1000]
+        base_channels(int)      - number of base channels [4]
+        child_channels(int)     - number of child channels per base channel [3]
+        packages(int)           - packages per base channel (child channels get a tenth) [2000]
+        packages_per_system(int)- installed packages per system [200]
+        errata(int)             - number of errata, spread over the base channels [500]
+        seed(int)               - random seed. The same seed always produces the same data [0]
+        login(str)              - the only valid login ['admin']
+        password(str)           - its password ['password']
+        session_lifetime(float) - seconds before a session key expires. None means never [None]
+        call_latency(float)     - seconds of simulated server-side work per API call [0.0]
+        """
+        self.seed = seed
+        self.login = login
+        self.password = password
+        self.session_lifetime = session_lifetime
+        self.call_latency = call_latency
+        self.packages_per_system = packages_per_system
+        self.calls = {}
+        self._lock = threading.Lock()
+        # _newId is also called with _lock held, so has a lock of its own
+        self._idlock = threading.Lock()
+        self._sessions = {}
+        self._nextid = 100
+
+        # label -> channel details, id -> label
+        self.channels = {}
+        self.channel_ids = {}
+        # package id -> package (listAllPackages format)
+        self.packages = {}
+        # channel label -> [ package id ]
+        self.channel_packages = {}
+        # advisory -> erratum (getDetails format, plus 'packages' and 'channels')
+        self.errata = {}
+        # system id -> system record
+        self.systems = {}
+        self.system_order = []
+
+        rng = random.Random(seed)
+        self._makeChannels(rng, base_channels, child_channels, packages)
+        self._makeErrata(rng, errata)
+        self._makeSystems(rng, systems)
+    # ---------------------------------------------------------------------------- #
+
+    def _newId(self):
+        self._idlock.acquire()
+        try:
+            self._nextid += 1
+            return self._nextid
+        finally:
+            self._idlock.release()
+
+    def _addChannel(self, label, name, arch, parent=''):
+        chanid = self._newId()
+        self.channels[label] = {
+            'id' : chanid,
+            'label' : label,
+            'name' : name,
+            'summary' : name,
+            'description' : 'synthetic channel %s' % label,
+            'arch_name' : arch,
+            'arch_label' : 'channel-%s' % arch,
+            'parent_channel_label' : parent,
+            'checksum_label' : 'sha256',
+            'maintainer_name' : '',
+            'maintainer_email' : '',
+            'maintainer_phone' : '',
+            'support_policy' : '',
+            'gpg_key_url' : '',
+            'gpg_key_id' : '',
+            'gpg_key_fp' : '',
+            'end_of_life' : '',
+            'last_modified' : _datetime(chanid),
+        }
+        self.channel_ids[chanid] = label
+        self.channel_packages[label] = []
+        return self.channels[label]
+
+    def _makePackages(self, rng, label, arch, count):
+        names = max(1, count / 2)
+        arches = PKG_ARCHES[arch]
+        for i in xrange(count):
+            pkgid = self._newId()
+            self.packages[pkgid] = {
+                'id' : pkgid,
+                'name' : '%s-pkg%05d' % (label.split('-')[0], i % names),
+                'version' : '%d.%d.%d' % (rng.randint(0, 9), rng.randint(0, 20), rng.randint(0, 99)),
+                'release' : '%d.el%d' % (rng.randint(1, 40), rng.randint(5, 7)),
+                'epoch' : rng.random() < 0.1 and str(rng.randint(1, 3)) or '',
+                'arch_label' : arches[i % len(arches)],
+                'checksum' : '%064x' % rng.getrandbits(256),
+                'checksum_type' : 'sha256',
+                'last_modified' : _timestamp(pkgid),
+            }
+            self.channel_packages[label].append(pkgid)
+
+    def _makeChannels(self, rng, base_channels, child_channels, packages):
+        for b in range(base_channels):
+            arch = ARCHES[b % len(ARCHES)]
+            base = 'rhel-%s-server-%d' % (arch, 5 + b / len(ARCHES))
+            self._addChannel(base, 'Red Hat Enterprise Linux Server (%s) %d' % (arch, 5 + b / len(ARCHES)), arch)
+            self._makePackages(rng, base, arch, packages)
+            for c in range(child_channels):
+                ctype = CHILD_TYPES[c % len(CHILD_TYPES)]
+                if c >= len(CHILD_TYPES):
+                    ctype = '%s%d' % (ctype, c / len(CHILD_TYPES))
+                child = '%s-%s' % (ctype, base)
+                self._addChannel(child, '%s for %s' % (ctype, base), arch, base)
+                self._makePackages(rng, child, arch, max(1, packages / 10))
+
+    def _makeErrata(self, rng, count):
+        bases = sorted([ x for x, v in self.channels.items() if v['parent_channel_label'] == '' ])
+        if len(bases) == 0:
+            return
+        for i in xrange(count):
+            prefix, errtype, cloneprefix = ERRATA_TYPES[i % len(ERRATA_TYPES)]
+            advisory = '%s-%d:%04d' % (prefix, 2010 + i % 5, i)
+            channel = bases[i % len(bases)]
+            pkgids = self.channel_packages[channel]
+            self.errata[advisory] = {
+                'id' : self._newId(),
+                'advisory' : advisory,
+                'synopsis' : 'synthetic update %d' % i,
+                'type' : errtype,
+                'issue_date' : _timestamp(i),
+                'update_date' : _timestamp(i + 1),
+                'last_modified_date' : _timestamp(i + 2),
+                'release' : 1,
+                'product' : 'Red Hat Enterprise Linux',
+                'errataFrom' : 'security@redhat.com',
+                'topic' : 'topic %d' % i,
+                'description' : 'description of erratum %d' % i,
+                'references' : '',
+                'notes' : '',
+                'solution' : 'apply the update',
+                'packages' : rng.sample(pkgids, min(len(pkgids), rng.randint(1, 5))),
+                'channels' : [ channel ],
+            }
+
+    def _makeSystems(self, rng, count):
+        bases = sorted([ x for x, v in self.channels.items() if v['parent_channel_label'] == '' ])
+        children = {}
+        for label, chan in self.channels.items():
+            if chan['parent_channel_label']:
+                children.setdefault(chan['parent_channel_label'], []).append(label)
+        for i in xrange(count):
+            sysid = 1000010000 + i
+            base = len(bases) and bases[i % len(bases)] or ''
+            kids = sorted(children.get(base, []))
+            self.systems[sysid] = {
+                'id' : sysid,
+                'name' : 'host%05d.example.com' % i,
+                'base' : base,
+                'children' : rng.sample(kids, rng.randint(0, len(kids))),
+                'last_checkin' : _datetime(sysid),
+            }
+            self.system_order.append(sysid)
+    # ---------------------------------------------------------------------------- #
+
+    def _dispatch(self, method, params):
+        """
+        called by SimpleXMLRPCServer for every API call (including those inside a multicall)
+        """
+        self._lock.acquire()
+        try:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        finally:
+            self._lock.release()
+        fn = getattr(self, method.replace('.', '_'), None)
+        if method.startswith('_') or fn is None:
+            raise xmlrpclib.Fault(FAULT_UNKNOWN_METHOD, 'Could not find method %s' % method)
+        if not self._accepts(fn, len(params)):
+            raise xmlrpclib.Fault(FAULT_INVALID, 'Could not find method %s with %d parameters' % (method, len(params)))
+        if self.call_latency:
+            time.sleep(self.call_latency)
+        return fn(*params)
+
+    def _accepts(self, fn, nparams):
+        """
+        can API method fn be called with nparams parameters?
+        (checked up front, so a TypeError from inside a method is reported as the bug it is,
+        not as a client error)
+        """
+        args, varargs, keywords, defaults = inspect.getargspec(fn)
+        maxargs = len(args)
+        if inspect.ismethod(fn):
+            # less 'self'
+            maxargs -= 1
+        minargs = maxargs - len(defaults or ())
+        return minargs <= nparams and (nparams <= maxargs or varargs is not None)
+
+    def _check(self, key):
+        """
+        raises the expiry fault unless key is a valid session key
+        """
+        created = self._sessions.get(key)
+        if created is None:
+            raise xmlrpclib.Fault(FAULT_SESSION, 'Could not find session')
+        if self.session_lifetime is not None and time.time() - created > self.session_lifetime:
+            raise xmlrpclib.Fault(FAULT_SESSION, 'Could not find session')
+
+    def expireSessions(self):
+        """
+        invalidates every session key issued so far (for testing session renewal)
+        """
+        self._lock.acquire()
+        try:
+            self._sessions.clear()
+        finally:
+            self._lock.release()
+
+    def _channel(self, chanspec):
+        if isinstance(chanspec, int):
+            chanspec = self.channel_ids.get(chanspec)
+        chan = self.channels.get(chanspec)
+        if chan is None:
+            raise xmlrpclib.Fault(FAULT_NO_CHANNEL, 'No such channel: %s' % chanspec)
+        return chan
+
+    def _system(self, sysid):
+        system = self.systems.get(sysid)
+        if system is None:
+            raise xmlrpclib.Fault(FAULT_NO_SYSTEM, 'No such system - sid = %s' % sysid)
+        return system
+
+    def _erratum(self, advisory):
+        erratum = self.errata.get(advisory)
+        if erratum is None:
+            raise xmlrpclib.Fault(FAULT_NO_ERRATUM, 'The erratum %s cannot be found.' % advisory)
+        return erratum
+
+    def _package(self, pkgid):
+        pkg = self.packages.get(pkgid)
+        if pkg is None:
+            raise xmlrpclib.Fault(FAULT_NO_PACKAGE, 'No such package: %s' % pkgid)
+        return pkg
+
+    def _children(self, label):
+        return sorted([ x for x, v in self.channels.items() if v['parent_channel_label'] == label ])
+
+    def _installed(self, system):
+        """
+        the (deterministic) list of package ids installed on a system
+        """
+        pkgids = self.channel_packages.get(system['base'], [])
+        rng = random.Random(self.seed * 1000003 + system['id'])
+        return rng.sample(pkgids, min(len(pkgids), self.packages_per_system))
+    # ---------------------------------------------------------------------------- #
+    # auth, api, user
+
+    def auth_login(self, login, password, duration=None):
+        if login != self.login or password != self.password:
+            raise xmlrpclib.Fault(FAULT_LOGIN, 'Either the password or username is incorrect.')
+        key = '%dx%032x' % (self._newId(), random.getrandbits(128))
+        self._lock.acquire()
+        try:
+            self._sessions[key] = time.time()
+        finally:
+            self._lock.release()
+        return key
+
+    def auth_logout(self, key):
+        self._lock.acquire()
+        try:
+            self._sessions.pop(key, None)
+        finally:
+            self._lock.release()
+        return 1
+
+    def api_systemVersion(self):
+        return '5.6.0'
+
+    def api_getVersion(self):
+        return '13.0'
+
+    def user_getDetails(self, key, login):
+        self._check(key)
+        return { 'org_id' : 1, 'org_name' : 'Mock Org', 'login' : login,
+                 'first_name' : 'Mock', 'last_name' : 'Admin', 'email' : 'root@localhost',
+                 'enabled' : True, 'last_login_date' : xmlrpclib.DateTime(), 'created_date' : _datetime(1) }
+    # ---------------------------------------------------------------------------- #
+    # channel
+
+    def channel_listAllChannels(self, key):
+        self._check(key)
+        return [ { 'id' : c['id'], 'label' : c['label'], 'name' : c['name'],
+                   'provider_name' : 'Red Hat, Inc.',
+                   'packages' : len(self.channel_packages[c['label']]),
+                   'systems' : 0 }
+                 for l, c in sorted(self.channels.items()) ]
+
+    channel_listMyChannels = channel_listAllChannels
+
+    def channel_listSoftwareChannels(self, key):
+        self._check(key)
+        return [ { 'label' : c['label'], 'name' : c['name'], 'parent_label' : c['parent_channel_label'],
+                   'end_of_life' : '', 'arch' : c['arch_name'] }
+                 for l, c in sorted(self.channels.items()) ]
+    # ---------------------------------------------------------------------------- #
+    # channel.software
+
+    def channel_software_getDetails(self, key, chanspec):
+        self._check(key)
+        return self._channel(chanspec)
+
+    def channel_software_listChildren(self, key, label):
+        self._check(key)
+        self._channel(label)
+        return [ self.channels[x] for x in self._children(label) ]
+
+    def channel_software_listAllPackages(self, key, label, start_date=None, end_date=None):
+        self._check(key)
+        self._channel(label)
+        return [ self.packages[x] for x in self.channel_packages[label] ]
+
+    def channel_software_listLatestPackages(self, key, label):
+        self._check(key)
+        self._channel(label)
+        latest = {}
+        for pkgid in self.channel_packages[label]:
+            pkg = self.packages[pkgid]
+            latest[(pkg['name'], pkg['arch_label'])] = pkg
+        return [ latest[x] for x in sorted(latest) ]
+
+    def channel_software_listErrata(self, key, label, start_date=None, end_date=None):
+        self._check(key)
+        self._channel(label)
+        return [ { 'id' : e['id'], 'advisory' : e['advisory'], 'synopsis' : e['synopsis'],
+                   'advisory_type' : e['type'], 'issue_date' : e['issue_date'],
+                   'update_date' : e['update_date'], 'last_modified_date' : e['last_modified_date'] }
+                 for a, e in sorted(self.errata.items()) if label in e['channels'] ]
+
+    def channel_software_listSubscribedSystems(self, key, label):
+        self._check(key)
+        self._channel(label)
+        return [ { 'id' : s['id'], 'name' : s['name'] } for s in
+                 [ self.systems[x] for x in self.system_order ]
+                 if s['base'] == label or label in s['children'] ]
+
+    def channel_software_listSystemChannels(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        return [ { 'id' : self.channels[x]['id'], 'label' : x, 'name' : self.channels[x]['name'] }
+                 for x in [ system['base'] ] + system['children'] if x ]
+
+    def channel_software_create(self, key, label, name, summary, archlabel, parentlabel, checksum=None, gpgkey=None):
+        self._check(key)
+        self._lock.acquire()
+        try:
+            if label in self.channels:
+                raise xmlrpclib.Fault(1200, 'channel label already in use: %s' % label)
+            if parentlabel:
+                self._channel(parentlabel)
+            self._addChannel(label, name, archlabel.replace('channel-', ''), parentlabel)
+        finally:
+            self._lock.release()
+        return 1
+
+    def channel_software_clone(self, key, original, details, original_state=False):
+        self._check(key)
+        self._lock.acquire()
+        try:
+            source = self._channel(original)
+            label = details['label']
+            if label in self.channels:
+                raise xmlrpclib.Fault(1200, 'channel label already in use: %s' % label)
+            parent = details.get('parent_label', '')
+            if parent:
+                self._channel(parent)
+            chan = self._addChannel(label, details.get('name', label), source['arch_name'], parent)
+            self.channel_packages[label] = list(self.channel_packages[original])
+        finally:
+            self._lock.release()
+        return chan['id']
+
+    def channel_software_delete(self, key, label):
+        self._check(key)
+        self._lock.acquire()
+        try:
+            chan = self._channel(label)
+            if len(self._children(label)) != 0:
+                raise xmlrpclib.Fault(1201, 'Cannot delete channel %s: it has child channels' % label)
+            del self.channels[label]
+            del self.channel_ids[chan['id']]
+            del self.channel_packages[label]
+        finally:
+            self._lock.release()
+        return 1
+
+    def channel_software_addPackages(self, key, label, pkgids):
+        self._check(key)
+        self._channel(label)
+        for pkgid in pkgids:
+            self._package(pkgid)
+        self._lock.acquire()
+        try:
+            existing = set(self.channel_packages[label])
+            self.channel_packages[label].extend([ x for x in pkgids if x not in existing ])
+        finally:
+            self._lock.release()
+        return 1
+
+    def channel_software_removePackages(self, key, label, pkgids):
+        self._check(key)
+        self._channel(label)
+        self._lock.acquire()
+        try:
+            remove = set(pkgids)
+            self.channel_packages[label] = [ x for x in self.channel_packages[label] if x not in remove ]
+        finally:
+            self._lock.release()
+        return 1
+    # ---------------------------------------------------------------------------- #
+    # system
+
+    def system_listSystems(self, key):
+        self._check(key)
+        return [ { 'id' : s['id'], 'name' : s['name'], 'last_checkin' : s['last_checkin'] }
+                 for s in [ self.systems[x] for x in self.system_order ] ]
+
+    def system_listUserSystems(self, key, login=None):
+        return self.system_listSystems(key)
+
+    def system_getName(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        return { 'id' : sysid, 'name' : system['name'], 'last_checkin' : system['last_checkin'] }
+
+    def system_getDetails(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        return { 'id' : sysid, 'profile_name' : system['name'], 'hostname' : system['name'],
+                 'release' : system['base'] and system['base'].split('-')[-1] or '',
+                 'base_entitlement' : 'enterprise_entitled', 'addon_entitlements' : [],
+                 'auto_update' : False, 'description' : '', 'address1' : '', 'address2' : '',
+                 'city' : '', 'state' : '', 'country' : '', 'building' : '', 'room' : '', 'rack' : '',
+                 'lock_status' : False, 'osa_status' : 'unknown', 'last_boot' : system['last_checkin'] }
+
+    def system_getSubscribedBaseChannel(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        if not system['base']:
+            return {}
+        return self.channels[system['base']]
+
+    def system_listSubscribedChildChannels(self, key, sysid):
+        self._check(key)
+        return [ self.channels[x] for x in self._system(sysid)['children'] ]
+
+    def system_listPackages(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        result = []
+        for pkgid in self._installed(system):
+            pkg = self.packages[pkgid]
+            result.append({ 'name' : pkg['name'], 'version' : pkg['version'],
+                            'release' : pkg['release'], 'epoch' : pkg['epoch'],
+                            'arch' : pkg['arch_label'], 'installtime' : _datetime(pkgid) })
+        return result
+
+    def system_getRelevantErrata(self, key, sysid):
+        self._check(key)
+        system = self._system(sysid)
+        installed = set(self._installed(system))
+        return [ { 'id' : e['id'], 'advisory_name' : e['advisory'], 'advisory_type' : e['type'],
+                   'advisory_synopsis' : e['synopsis'], 'date' : e['issue_date'],
+                   'update_date' : e['update_date'] }
+                 for a, e in sorted(self.errata.items())
+                 if system['base'] in e['channels'] and installed.intersection(e['packages']) ]
+    # ---------------------------------------------------------------------------- #
+    # errata
+
+    def errata_getDetails(self, key, advisory):
+        self._check(key)
+        erratum = self._erratum(advisory)
+        return dict([ (k, v) for k, v in erratum.items() if k not in ('packages', 'channels', 'advisory') ])
+
+    def errata_listPackages(self, key, advisory):
+        self._check(key)
+        erratum = self._erratum(advisory)
+        result = []
+        for pkgid in erratum['packages']:
+            pkg = dict(self.packages[pkgid])
+            pkg['providing_channels'] = [ x for x, v in self.channel_packages.items() if pkgid in v ]
+            result.append(pkg)
+        return result
+
+    def errata_applicableToChannels(self, key, advisory):
+        self._check(key)
+        erratum = self._erratum(advisory)
+        return [ { 'channel_id' : self.channels[x]['id'], 'label' : x, 'name' : self.channels[x]['name'],
+                   'parent_channel_label' : self.channels[x]['parent_channel_label'] }
+                 for x in erratum['channels'] if x in self.channels ]
+
+    def errata_listAffectedSystems(self, key, advisory):
+        self._check(key)
+        erratum = self._erratum(advisory)
+        pkgs = set(erratum['packages'])
+        return [ { 'id' : s['id'], 'name' : s['name'], 'last_checkin' : s['last_checkin'] }
+                 for s in [ self.systems[x] for x in self.system_order ]
+                 if s['base'] in erratum['channels'] and pkgs.intersection(self._installed(s)) ]
+
+    def errata_clone(self, key, label, advisories):
+        self._check(key)
+        self._channel(label)
+        result = []
+        self._lock.acquire()
+        try:
+            for advisory in advisories:
+                erratum = self._erratum(advisory)
+                prefix = advisory.split('-')[0]
+                cloneprefix = dict([ (x[0], x[2]) for x in ERRATA_TYPES ]).get(prefix, 'CL')
+                clonename = advisory.replace(prefix, cloneprefix, 1)
+                clone = dict(erratum)
+                clone.update({ 'id' : self._newId(), 'advisory' : clonename,
+                               'channels' : [ label ], 'packages' : list(erratum['packages']) })
+                if clonename in self.errata:
+                    clone['channels'] = sorted(set(self.errata[clonename]['channels'] + [ label ]))
+                self.errata[clonename] = clone
+                existing = set(self.channel_packages[label])
+                self.channel_packages[label].extend([ x for x in clone['packages'] if x not in existing ])
+                result.append({ 'id' : clone['id'], 'advisory_name' : clonename,
+                                'advisory_type' : clone['type'], 'advisory_synopsis' : clone['synopsis'],
+                                'date' : clone['issue_date'] })
+        finally:
+            self._lock.release()
+        return result
+
+    def errata_cloneAsync(self, key, label, advisories):
+        self.errata_clone(key, label, advisories)
+        return 1
+    # ---------------------------------------------------------------------------- #
+    # packages
+
+    def packages_getDetails(self, key, pkgid):
+        self._check(key)
+        pkg = self._package(pkgid)
+        details = dict(pkg)
+        details.update({ 'summary' : 'synthetic package %s' % pkg['name'],
+                         'description' : 'synthetic package %s, for testing' % pkg['name'],
+                         'license' : 'GPLv2+', 'vendor' : 'Red Hat, Inc.',
+                         'build_host' : 'builder.example.com', 'build_date' : pkg['last_modified'],
+                         'last_modified_date' : pkg['last_modified'], 'cookie' : 'None',
+                         'size' : str(1024 * (pkgid % 4096 + 1)), 'payload_size' : str(1000 * (pkgid % 4096 + 1)),
+                         'file' : '%s-%s-%s.%s.rpm' % (pkg['name'], pkg['version'], pkg['release'], pkg['arch_label']),
+                         'path' : 'redhat/1/%s/%s' % (pkg['name'], pkg['checksum'][:8]),
+                         'providing_channels' : [ x for x, v in self.channel_packages.items() if pkgid in v ] })
+        return details
+
+    def packages_listFiles(self, key, pkgid):
+        self._check(key)
+        pkg = self._package(pkgid)
+        return [ { 'path' : '/usr/share/%s/file%02d' % (pkg['name'], i), 'type' : 'file',
+                   'last_modified_date' : pkg['last_modified'], 'checksum' : pkg['checksum'],
+                   'checksum_type' : 'sha256', 'size' : 1024 * i, 'linkto' : '' }
+                 for i in range(pkgid % 20 + 1) ]
+
+    def packages_listDependencies(self, key, pkgid):
+        self._check(key)
+        pkg = self._package(pkgid)
+        deps = [ { 'dependency' : pkg['name'], 'dependency_type' : 'provides',
+                   'dependency_modifier' : '= %s-%s' % (pkg['version'], pkg['release']) } ]
+        deps.extend([ { 'dependency' : 'lib%02d.so' % i, 'dependency_type' : 'requires',
+                        'dependency_modifier' : '' } for i in range(pkgid % 8) ])
+        return deps
+
+    def packages_listChangelog(self, key, pkgid):
+        self._check(key)
+        pkg = self._package(pkgid)
+        return [ { 'author' : 'Packager <packager@example.com> - %s-%s' % (pkg['version'], pkg['release']),
+                   'date' : _timestamp(pkgid - i), 'text' : '- change number %d' % i }
+                 for i in range(pkgid % 10 + 1) ]
+
+    def packages_listProvidingChannels(self, key, pkgid):
+        self._check(key)
+        self._package(pkgid)
+        return [ { 'label' : x, 'name' : self.channels[x]['name'],
+                   'parent_label' : self.channels[x]['parent_channel_label'] }
+                 for x, v in sorted(self.channel_packages.items()) if pkgid in v ]
+
+    def packages_listProvidingErrata(self, key, pkgid):
+        self._check(key)
+        self._package(pkgid)
+        return [ { 'advisory' : a, 'issue_date' : e['issue_date'], 'last_modified_date' : e['last_modified_date'],
+                   'update_date' : e['update_date'], 'synopsis' : e['synopsis'], 'type' : e['type'] }
+                 for a, e in sorted(self.errata.items()) if pkgid in e['packages'] ]
+
+    def packages_findByNvrea(self, key, name, version, release, epoch, arch):
+        self._check(key)
+        return [ p for p in self.packages.values()
+                 if (p['name'], p['version'], p['release'], p['epoch'], p['arch_label'])
+                    == (name, version, release, epoch, arch) ]
+
+# --------------------------------------------------------------------------------- #
+
+class mockRequestHandler(SimpleXMLRPCRequestHandler):
+    """
+    serves /rpc/api over HTTP/1.1 keep-alive connections, adding the server's
+    per-request latency and counting requests and bytes.
+    """
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ('/rpc/api',)
+
+    def do_POST(self):
+        server = self.server
+        server.count(int(self.headers.get('content-length', 0)))
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.random() * server.jitter)
+        SimpleXMLRPCRequestHandler.do_POST(self)
+
+    def log_message(self, format, *args):
+        pass
+
+# --------------------------------------------------------------------------------- #
+
+class mockServer(ThreadingMixIn, SimpleXMLRPCServer):
+    """
+    threaded XMLRPC server for a mockSatellite.
+
+    counters:
+    requests        - HTTP requests served (i.e. round trips)
+    bytes_received  - request body bytes received
+    (the satellite's 'calls' attribute counts individual API calls)
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, satellite, address=('127.0.0.1', 0), latency=0.0, jitter=0.0):
+        """
+        parameters:
+        satellite           - mockSatellite instance to serve
+        *address(tuple)     - (host, port) to listen on. Port 0 picks a free port [('127.0.0.1', 0)]
+        *latency(float)     - seconds of delay added to every HTTP request [0.0]
+        *jitter(float)      - up to this many more seconds of random delay per request [0.0]
+        """
+        SimpleXMLRPCServer.__init__(self, address, requestHandler=mockRequestHandler,
+                                    logRequests=False, allow_none=True)
+        self.satellite = satellite
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.bytes_received = 0
+        self._countlock = threading.Lock()
+        self._thread = None
+        # client connections currently being served
+        self._open = set()
+        self.register_instance(satellite)
+        self.register_multicall_functions()
+
+    def count(self, nbytes):
+        self._countlock.acquire()
+        try:
+            self.requests += 1
+            self.bytes_received += nbytes
+        finally:
+            self._countlock.release()
+
+    def process_request(self, request, client_address):
+        self._countlock.acquire()
+        try:
+            self._open.add(request)
+        finally:
+            self._countlock.release()
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        self._countlock.acquire()
+        try:
+            self._open.discard(request)
+        finally:
+            self._countlock.release()
+        SimpleXMLRPCServer.shutdown_request(self, request)
+
+    def resetCounters(self):
+        """
+        zero the request and call counters
+        """
+        self.requests = 0
+        self.bytes_received = 0
+        self.satellite.calls.clear()
+    # ---------------------------------------------------------------------------- #
+
+    def start(self):
+        """
+        serve requests on a background thread. Returns self.
+        """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        stop serving, disconnect any keep-alive clients and close the listening socket
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._countlock.acquire()
+        try:
+            clients = list(self._open)
+        finally:
+            self._countlock.release()
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        # give the handler threads a moment to notice and finish
+        deadline = time.time() + 2
+        while len(self._open) != 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.server_close()
+
+    def transport(self):
+        """
+        returns a new transport that connects to this server.
+        Pass the method itself (not its result) to rhnSession as transport=server.transport
+        """
+        return mockTransport(self.server_address)
+
+    @property
+    def url(self):
+        return 'http://%s:%d/rpc/api' % self.server_address
+
+# --------------------------------------------------------------------------------- #
+
+class mockTransport(keepaliveTransport):
+    """
+    keep-alive transport that sends every request to a mock server over plain HTTP,
+    whatever host the session URL names.
+    """
+    def __init__(self, address, use_datetime=0):
+        keepaliveTransport.__init__(self, use_datetime=use_datetime)
+        self.address = address
+
+    def new_connection(self, host):
+        return httplib.HTTPConnection(*self.address)
+
+# --------------------------------------------------------------------------------- #
+
+def start(address=('127.0.0.1', 0), latency=0.0, jitter=0.0, **kwargs):
+    """
+    usage:
+    start(address=('127.0.0.1', 0), latency=0.0, jitter=0.0, **satellite_options)
+
+    description:
+    creates a mockSatellite (see its __init__ for the options) and serves it
+    on a background thread.
+
+    returns:
+    mockServer instance. Use server.transport as the rhnSession transport, and
+    server.stop() when done.
+    """
+    return mockServer(mockSatellite(**kwargs), address, latency, jitter).start()
+
+def main(argv):
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options]', description='serve a synthetic satellite for testing rhnapi scripts')
+    parser.add_option('--host', default='127.0.0.1', help='address to listen on [%default]')
+    parser.add_option('--port', type='int', default=8080, help='port to listen on [%default]')
+    parser.add_option('--systems', type='int', default=1000, help='number of systems [%default]')
+    parser.add_option('--packages', type='int', default=2000, help='packages per base channel [%default]')
+    parser.add_option('--errata', type='int', default=500, help='number of errata [%default]')
+    parser.add_option('--latency', type='float', default=0.0, help='seconds of latency per request [%default]')
+    parser.add_option('--seed', type='int', default=0, help='random seed [%default]')
+    opts, args = parser.parse_args(argv)
+    server = mockServer(mockSatellite(systems=opts.systems, packages=opts.packages, errata=opts.errata,
+                                      seed=opts.seed), (opts.host, opts.port), opts.latency)
+    print "serving %s (login 'admin', password 'password')" % server.url
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -46,6 +46,8 @@ searchNameAndSummary -> packages.search.nameAndSummary
 """
 __author__ = "Stuart Sears"
 
+from rhnapi.cache import packageCall, forgetPackageData
+
 # ---------------------------------------------------------------------------- #
 
 def findByNvrea(rhn, pkgname, pkgver, pkgrel, pkgarch, pkgepoch=''):
@@ -97,6 +99,8 @@ def getDetails(rhn, pkgid):
 
     description:
 	Retrieves package information based on a package ID
+	Served from the session's package cache (rhn.pkgcache) if it has one, in which case
+	'providing_channels' is as it was when the package was first cached.
 
 	returns:
     dict
@@ -128,7 +132,7 @@ def getDetails(rhn, pkgid):
 	pkgid(int)               - Package ID number
 	"""
 	try:
-		return rhn.session.packages.getDetails(rhn.key, pkgid)
+		return packageCall(rhn, 'packages.getDetails', pkgid)
 	except Exception, E:
 		return rhn.fail(E, 'find package with ID %d' % pkgid)
 
@@ -207,7 +211,7 @@ def listChangelog(rhn, pkgid):
 	pkgid(int)               - Package ID number
 	"""
 	try:
-		return rhn.session.packages.listChangelog(rhn.key, pkgid)
+		return packageCall(rhn, 'packages.listChangelog', pkgid)
 	except Exception, E:
 		return rhn.fail(E, 'get changelog for package ID %d' % pkgid)
 
@@ -236,7 +240,7 @@ def listDependencies(rhn, pkgid):
 	pkgid(int)               - Package ID number
 	"""
 	try:
-		return rhn.session.packages.listDependencies(rhn.key, pkgid)
+		return packageCall(rhn, 'packages.listDependencies', pkgid)
 	except Exception, E:
 		return rhn.fail(E, 'get changelog for package ID %d' % pkgid)
 
@@ -269,7 +273,7 @@ def listFiles(rhn, pkgid):
 	pkgid(int)               - Package ID number
 	"""
 	try:
-		return rhn.session.packages.listFiles(rhn.key, pkgid)
+		return packageCall(rhn, 'packages.listFiles', pkgid)
 	except Exception, E:
 		return rhn.fail(E, 'get file list for package ID %d' % pkgid)
 
@@ -349,6 +353,7 @@ def removePackage(rhn, pkgid):
 	pkgid(int)               - Package ID number
 	"""
 	try:
+		forgetPackageData(rhn, pkgid)
 		return rhn.session.packages.removePackage(rhn.key, pkgid) == 1
 	except Exception, E:
 		return rhn.fail(E, 'remove Package ID %d' % pkgid)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing thread-pool helpers for running API calls in parallel
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.parallel
+
+Helpers for fanning out API calls over a pool of worker threads, instead of
+looping over them one at a time.
+
+An rhnSession gives each thread its own transport (and so its own keep-alive
+connection), so a single session can be shared by all the workers.
+
+Typical use:
+
+from rhnapi import system, parallel
+ids = [ x['id'] for x in system.listSystems(rhn) ]
+details, faults = parallel.map_servers(rhn, system.getDetails, ids, workers=8)
+
+For callers that must not block on each call (e.g. a service handling many
+concurrent requests), AsyncRhnSession wraps an rhnSession so that every API call,
+or any rhnapi wrapper method, returns an rhnFuture straight away while the work
+runs on a persistent, bounded pool of worker threads:
+
+arhn = parallel.AsyncRhnSession(rhn, workers=8)
+asys = arhn.wrap(system)
+futures = [ asys.getDetails(x) for x in ids ]
+details = arhn.gather(futures)
+"""
+
+__author__ = "Stuart Sears"
+
+import threading
+import Queue
+
+from rhnapi import rhnCallProxy, rhnFuture
+
+# default number of worker threads
+DEFAULT_WORKERS = 4
+# never run more than this many concurrent calls against the satellite,
+# whatever the caller asks for.
+MAX_WORKERS = 16
+
+# --------------------------------------------------------------------------------- #
+
+def pmap(rhn, fn, items, workers=DEFAULT_WORKERS, *args, **kwargs):
+    """
+    usage:
+    pmap(rhn, fn, items, workers=4, *args, **kwargs)
+
+    description:
+    calls fn(rhn, item, *args, **kwargs) for every entry in items, using the session's
+    pool of worker threads (see sessionPool). Exceptions raised by fn are collected
+    rather than aborting the run.
+
+    returns:
+    tuple (results, faults)
+    results - list of return values, in the same order as items.
+              None where the call raised an exception
+    faults  - dict { index : exception } for every call that raised one, where index
+              is the item's position in items (so repeated items each keep their own)
+
+    parameters:
+    rhn                 - an authenticated RHN session
+    fn(function)        - function to call. Must take an rhn session as its first
+                          argument and an item as its second (as most rhnapi methods do)
+    items(iterable)     - the values to call fn with
+    *workers(int)       - number of worker threads [4]. Capped at MAX_WORKERS
+    any further arguments are passed through to fn
+    """
+    items = list(items)
+    results = [ None ] * len(items)
+    faults = {}
+    workers = max(1, min(workers, MAX_WORKERS, len(items)))
+
+    queue = Queue.Queue()
+    for entry in enumerate(items):
+        queue.put(entry)
+
+    def worker():
+        """
+        takes (index, item) pairs off the queue until it is empty
+        """
+        while True:
+            try:
+                idx, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[idx] = fn(rhn, item, *args, **kwargs)
+            except Exception, E:
+                # dict assignment is atomic, so no locking required
+                faults[idx] = E
+                rhn.logDebug("parallel call %s(%s) failed: %s" % (getattr(fn, '__name__', fn), item, E))
+
+    pool = sessionPool(rhn, workers)
+    if pool.isWorker():
+        # fn is itself running on the pool (a nested pmap): queueing more work behind
+        # it could deadlock, so just work through the items in this thread
+        worker()
+    else:
+        for future in [ pool.submit(worker) for i in range(workers) ]:
+            future.result()
+
+    return results, faults
+
+_poollock = threading.Lock()
+
+def sessionPool(rhn, workers=DEFAULT_WORKERS):
+    """
+    usage:
+    sessionPool(rhn, workers=4)
+
+    description:
+    returns the workerPool shared by every pmap/map_servers call on an rhn session,
+    creating it (or adding threads to it, up to workers) as needed.
+
+    Each worker thread keeps its own transport, and so its own keep-alive connection,
+    for as long as the session lives, so repeated parallel calls reuse the same few
+    connections instead of opening new ones every time.
+
+    returns:
+    workerPool
+    """
+    _poollock.acquire()
+    try:
+        pool = getattr(rhn, '_workerpool', None)
+        if pool is None:
+            pool = rhn._workerpool = workerPool(workers)
+        else:
+            pool.grow(workers)
+        return pool
+    finally:
+        _poollock.release()
+
+def stopSessionPool(rhn):
+    """
+    usage:
+    stopSessionPool(rhn)
+
+    description:
+    stops the worker threads of an rhn session's shared pool (see sessionPool), once
+    any work already queued on it is done. rhnSession.logout and close call this.
+    A later pmap (etc) on the same session starts a new pool.
+    """
+    _poollock.acquire()
+    try:
+        pool = getattr(rhn, '_workerpool', None)
+        rhn._workerpool = None
+    finally:
+        _poollock.release()
+    if pool is not None:
+        pool.shutdown()
+
+# --------------------------------------------------------------------------------- #
+
+def map_servers(rhn, fn, serverids, workers=DEFAULT_WORKERS, *args, **kwargs):
+    """
+    usage:
+    map_servers(rhn, fn, serverids, workers=4, *args, **kwargs)
+
+    description:
+    Runs a per-server method (system.getDetails, system.listPackages etc) for a list
+    of server IDs in parallel. See pmap for details.
+
+    returns:
+    tuple (results, faults)
+    results - list of return values, in the same order as serverids
+    faults  - dict { index : exception } for any calls that raised one, where index
+              is the position of the server ID in serverids
+
+    parameters:
+    rhn                 - an authenticated RHN session
+    fn(function)        - per-server method, called as fn(rhn, serverid, *args, **kwargs)
+    serverids(list)     - list of system IDs (int)
+    *workers(int)       - number of worker threads [4]. Capped at MAX_WORKERS
+    """
+    return pmap(rhn, fn, [ int(x) for x in serverids ], workers, *args, **kwargs)
+
+# --------------------------------------------------------------------------------- #
+
+class workerPool(object):
+    """
+    A fixed-size pool of worker threads, started on first use.
+    submit() queues a function call and returns an rhnFuture for its result.
+    """
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(1, min(workers, MAX_WORKERS))
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+    # ---------------------------------------------------------------------------- #
+
+    def grow(self, workers):
+        """
+        raises the number of worker threads to workers (capped at MAX_WORKERS),
+        if it is not that high already
+        """
+        self.workers = max(self.workers, min(workers, MAX_WORKERS))
+
+    def isWorker(self):
+        """
+        is the calling thread one of this pool's workers?
+        """
+        return threading.currentThread() in self._threads
+
+    def _start(self):
+        self._lock.acquire()
+        try:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work)
+                t.setDaemon(True)
+                t.start()
+                self._threads.append(t)
+        finally:
+            self._lock.release()
+    # ---------------------------------------------------------------------------- #
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            future, fn, args, kwargs = job
+            try:
+                result = fn(*args, **kwargs)
+            except Exception, E:
+                future.set_error(E)
+                continue
+            future.set_result(result)
+    # ---------------------------------------------------------------------------- #
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        queue fn(*args, **kwargs) to run on the pool.
+
+        returns:
+        rhnFuture
+        """
+        if len(self._threads) < self.workers:
+            self._start()
+        future = rhnFuture(None, getattr(fn, '__name__', str(fn)))
+        self._queue.put((future, fn, args, kwargs))
+        return future
+    # ---------------------------------------------------------------------------- #
+
+    def shutdown(self, wait=True):
+        """
+        stop the worker threads once the queued work is done.
+        (called from one of the workers, this never waits for that worker itself)
+        """
+        self._lock.acquire()
+        try:
+            threads, self._threads = self._threads, []
+        finally:
+            self._lock.release()
+        for t in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                if t is not threading.currentThread():
+                    t.join()
+
+# --------------------------------------------------------------------------------- #
+
+class _asyncModule(object):
+    """
+    async adapter for an rhnapi wrapper module (see AsyncRhnSession.wrap)
+    """
+    def __init__(self, arhn, module):
+        self._arhn = arhn
+        self._module = module
+
+    def __getattr__(self, name):
+        fn = getattr(self._module, name)
+        if not callable(fn):
+            return fn
+        def submit(*args, **kwargs):
+            return self._arhn.call(fn, *args, **kwargs)
+        submit.__name__ = name
+        submit.__doc__ = fn.__doc__
+        return submit
+
+# --------------------------------------------------------------------------------- #
+
+class AsyncRhnSession(object):
+    """
+    Non-blocking front end to an rhnSession.
+
+    API calls made via self.session (same syntax as rhnSession.session) and rhnapi
+    wrapper methods run via self.call or self.wrap(module) return an rhnFuture at once.
+    The calls themselves run on the session's shared pool of worker threads (see
+    sessionPool), each with its own keep-alive connection to the satellite, so async
+    calls and pmap/map_servers together never exceed MAX_WORKERS concurrent calls. Use future.result() to wait for a value,
+    future.add_done_callback(fn) to be notified, or self.gather(futures).
+
+    This uses threads rather than asyncio, which is not available to python 2.
+    """
+    def __init__(self, rhn, workers=DEFAULT_WORKERS):
+        """
+        parameters:
+        rhn                 - an rhnSession instance
+        *workers(int)       - make sure the session's pool has at least this many worker
+                              threads [4]. Capped at MAX_WORKERS
+        """
+        self.rhn = rhn
+        self.workers = workers
+        self.session = rhnCallProxy(self._submitCall)
+
+    @property
+    def pool(self):
+        """
+        the session's shared workerPool (a new one if the session has been logged out meanwhile)
+        """
+        return sessionPool(self.rhn, self.workers)
+    # ---------------------------------------------------------------------------- #
+
+    def _submitCall(self, methodname, params):
+        future = self.pool.submit(self.rhn._dispatch, methodname, params)
+        future.methodname = methodname
+        return future
+
+    @property
+    def key(self):
+        """
+        the session key of the underlying rhnSession
+        """
+        return self.rhn.key
+    # ---------------------------------------------------------------------------- #
+
+    def _login(self):
+        self.rhn.renewSession()
+        return self.rhn.key
+
+    def login(self):
+        """
+        (re-)authenticates the underlying session via auth.login.
+
+        returns:
+        rhnFuture, whose result is the new session key
+        """
+        return self.pool.submit(self._login)
+    # ---------------------------------------------------------------------------- #
+
+    def call(self, fn, *args, **kwargs):
+        """
+        runs an rhnapi wrapper method, fn(rhn, *args, **kwargs), on the worker pool.
+
+        returns:
+        rhnFuture
+
+        parameters:
+        fn(function)        - any rhnapi method taking an rhnSession as its first argument
+        further arguments are passed through to fn
+        """
+        return self.pool.submit(fn, self.rhn, *args, **kwargs)
+
+    def wrap(self, module):
+        """
+        returns an async version of an rhnapi module, e.g.
+        asystem = arhn.wrap(rhnapi.system)
+        future = asystem.getDetails(serverid)
+
+        every method in it takes the same arguments as the original, minus the
+        leading rhn session, and returns an rhnFuture.
+        """
+        return _asyncModule(self, module)
+    # ---------------------------------------------------------------------------- #
+
+    def gather(self, futures, timeout=None):
+        """
+        waits for a list of futures and returns their results, in order.
+        raises the first exception found, as future.result() would.
+        """
+        return [ f.result(timeout) for f in futures ]
+
+    def close(self):
+        """
+        stops the session's worker threads (once queued calls are complete),
+        as rhnSession.logout and close do
+        """
+        stopSessionPool(self.rhn)
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing a compact in-memory package list
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.pkglist
+
+A compact, column-oriented stand-in for the lists of package dicts returned by
+channel.software.listAllPackages, system.listPackages and friends.
+
+A list of dicts repeats every key in every package and holds a separate copy of
+each name, version, release, epoch and arch string. A packageList instead keeps one
+list per field, with repeated string values stored once and integer fields such as
+'id' held in arrays of machine integers. Plain (ascii) strings in those fields are
+intern()ed, so the same package in 50 cloned channels shares one set of strings;
+fields that hardly repeat (checksums, timestamps) are left alone, as sharing them
+would cost more than it saves.
+
+Individual packages are read through lightweight packageRecord views, which
+behave like read-only dicts, so most code written for lists of package dicts
+(utils.get_pkgstr, utils.index_dictlist, utils.csvReportStream, json encoding
+with utils.RhnJSONEncoder etc) works unchanged:
+
+from rhnapi import channel
+pkgs = channel.listAllPackages(rhn, 'rhel-x86_64-server-6', compact=True)
+for pkg in pkgs:
+    print pkg['name'], pkg.get('epoch', '')
+names = pkgs.column('name')
+"""
+
+__author__ = "Stuart Sears"
+
+from array import array
+
+# stands in for fields a package doesn't have
+_MISSING = object()
+# fields whose values (nearly) never repeat, so are not worth sharing
+UNSHARED = ('checksum', 'md5sum', 'last_modified', 'installtime', 'build_date', 'file', 'path')
+# how often (in packages) to check whether each other string field is worth sharing...
+SHARE_CHECK = 8192
+# ...giving up on it once more than this fraction of its values are distinct
+SHARE_RATIO = 0.9
+
+# --------------------------------------------------------------------------------- #
+
+class packageRecord(object):
+    """
+    A read-only, dict-like view of one package in a packageList.
+    Use dict(record) or record.copy() for a real (modifiable) dict.
+    """
+    __slots__ = ('_pkglist', '_row')
+
+    def __init__(self, pkglist, row):
+        self._pkglist = pkglist
+        self._row = row
+
+    def __getitem__(self, key):
+        column = self._pkglist._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        value = column[self._row]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def has_key(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    __contains__ = has_key
+
+    def keys(self):
+        return [ k for k in self._pkglist.fields if self._pkglist._columns[k][self._row] is not _MISSING ]
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    __iter__ = iterkeys
+
+    def values(self):
+        return [ self[k] for k in self.keys() ]
+
+    def items(self):
+        return [ (k, self[k]) for k in self.keys() ]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, packageRecord)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return '<packageRecord %r>' % self.copy()
+
+# --------------------------------------------------------------------------------- #
+
+class packageList(object):
+    """
+    A compact list of packages. See the module documentation.
+
+    Behaves like a (read-only) list of packageRecord objects: len(), iteration,
+    indexing (including slices, which return a new packageList) and 'in'.
+    """
+    def __init__(self, packages=None, fields=None):
+        """
+        parameters:
+        *packages(iterable)     - package dicts (or packageRecords) to add
+        *fields(list)           - only keep these keys from each package. By default
+                                  every key seen is kept.
+        """
+        self.fields = []
+        self._columns = {}
+        # field -> { value : value } of the distinct string values seen, so each is
+        # stored once. None for fields found not to repeat enough to be worth it
+        self._shared = {}
+        self._length = 0
+        self._only = fields is not None and frozenset(fields) or None
+        if fields is not None:
+            for f in fields:
+                self._addColumn(f)
+        if packages is not None:
+            self.extend(packages)
+    # ---------------------------------------------------------------------------- #
+
+    def _addColumn(self, field):
+        self.fields.append(field)
+        self._columns[field] = [ _MISSING ] * self._length
+
+    def _store(self, field, value):
+        column = self._columns[field]
+        if isinstance(column, array):
+            if type(value) in (int, long) and -2**31 <= value < 2**31:
+                column.append(value)
+                return
+            # not an integer after all: fall back to a plain list
+            column = self._columns[field] = list(column)
+        elif len(column) == 0 and type(value) is int and -2**31 <= value < 2**31:
+            # integer fields ('id' etc) go in a C array, 4 bytes per package
+            column = self._columns[field] = array('i')
+            column.append(value)
+            return
+        if isinstance(value, basestring):
+            value = self._share(field, value)
+        column.append(value)
+
+    def _share(self, field, value):
+        """
+        returns the shared copy of a string value in a field
+        """
+        shared = self._shared.get(field, _MISSING)
+        if shared is None:
+            return value
+        if shared is _MISSING:
+            if field in UNSHARED:
+                self._shared[field] = None
+                return value
+            shared = self._shared[field] = {}
+        if type(value) is str:
+            # interned strings are shared with other lists too (and freed once unused)
+            value = intern(value)
+        value = shared.setdefault(value, value)
+        if self._length % SHARE_CHECK == 0 and self._length != 0 and len(shared) > self._length * SHARE_RATIO:
+            # (nearly) every value is different, e.g. checksums: stop tracking them
+            self._shared[field] = None
+        return value
+
+    def append(self, pkg):
+        """
+        adds a package (a dict, or anything with iteritems())
+        """
+        seen = 0
+        for k, v in pkg.iteritems():
+            if self._only is not None and k not in self._only:
+                continue
+            if k not in self._columns:
+                self._addColumn(k)
+            self._store(k, v)
+            seen += 1
+        self._length += 1
+        if seen != len(self.fields):
+            # pad the fields this package doesn't have
+            for field in self.fields:
+                column = self._columns[field]
+                if len(column) < self._length:
+                    if isinstance(column, array):
+                        column = self._columns[field] = list(column)
+                    column.append(_MISSING)
+
+    def extend(self, packages):
+        """
+        adds a sequence of packages
+        """
+        for pkg in packages:
+            self.append(pkg)
+    # ---------------------------------------------------------------------------- #
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return packageList(self[x] for x in xrange(*idx.indices(self._length)))
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError('packageList index out of range')
+        return packageRecord(self, idx)
+
+    def __iter__(self):
+        for idx in xrange(self._length):
+            yield packageRecord(self, idx)
+
+    def __contains__(self, pkg):
+        for record in self:
+            if record == pkg:
+                return True
+        return False
+
+    def __repr__(self):
+        return '<packageList of %d packages, fields %s>' % (self._length, ', '.join(self.fields))
+    # ---------------------------------------------------------------------------- #
+
+    def column(self, field):
+        """
+        returns a list of the values of one field, for every package (None where a
+        package doesn't have it)
+        """
+        column = self._columns.get(field)
+        if column is None:
+            return [ None ] * self._length
+        return [ (x is not _MISSING and [x] or [None])[0] for x in column ]
+
+    def toDicts(self):
+        """
+        returns the packages as an ordinary list of dict
+        """
+        return [ x.copy() for x in self ]
+
+# --------------------------------------------------------------------------------- #
+
+def compact(packages, fields=None):
+    """
+    usage:
+    compact(packages, fields=None)
+
+    description:
+    converts a list of package dicts (e.g. from channel.listAllPackages) into a packageList.
+    Returns anything that isn't a list (e.g. False from a failed call) unchanged.
+
+    returns:
+    packageList
+
+    parameters:
+    packages(list of dict)  - the packages
+    *fields(list)           - only keep these keys from each package [all of them]
+    """
+    if not isinstance(packages, (list, tuple)):
+        return packages
+    return packageList(packages, fields)
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
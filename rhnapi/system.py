@@ -22,6 +22,8 @@
 
 __author__ = "Stuart Sears"
 
+from rhnapi.pkglist import compact as compactPackages
+
 ent_names = { 'monitoring_entitled'              : 'monitoring',
               'provisioning_entitled'            : 'provisioning',
               'management_entitled'              : 'management',
@@ -1996,13 +1998,13 @@ def listPackageProfiles(rhn):
 
 # ---------------------------------------------------------------------------- #
 
-def listPackages(rhn, serverid):
+def listPackages(rhn, serverid, compact=False):
     """
     API:
     system.listPackages
 
     usage:
-    listPackages(rhn, serverid)
+    listPackages(rhn, serverid, compact=False)
 
     description:
     List the installed packages for a given system    
@@ -2017,12 +2019,16 @@ def listPackages(rhn, serverid):
         "arch"
         "installtime" - returned only if known
         }
+    or with compact=True, an rhnapi.pkglist.packageList (a far smaller, read-only equivalent)
 
     parameters:
     rhn                      - an authenticated RHN session
     serverid(int)            - server ID number
+    *compact(bool)           - return a packageList instead of a list of dict [False]
     """
     try:
+        if compact:
+            return compactPackages(rhn.session.system.listPackages(rhn.key, serverid))
         return rhn.session.system.listPackages(rhn.key, serverid)
     except Exception, E:
         return rhn.fail(E, "Get a list of installed packages for server %d" % (serverid))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# RHN/Spacewalk API Module providing a faster XMLRPC response unmarshaller
+#
+# Copyright (c) 2009-2014 Stuart Sears
+#
+# This file is part of python-rhnapi
+#
+# python-rhnapi is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# python-rhnapi is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with python-rhnapi. If not, see http://www.gnu.org/licenses/.
+
+__doc__ = """
+rhnapi.unmarshal
+
+A drop-in replacement for the xmlrpclib parser/unmarshaller pair, for decoding
+large API responses (channel.software.listAllPackages, system.listPackages etc)
+with less CPU time.
+
+The standard xmlrpclib.Unmarshaller pushes every value onto a flat stack and
+rebuilds structs and arrays by slicing that stack when they close. fastUnmarshaller
+hooks expat's callbacks straight up to small closures that insert each value
+into its enclosing struct or array as soon as it is complete, and has expat
+buffer character data so most values arrive in a single callback.
+
+Results are identical to xmlrpclib's: ASCII strings come back as str, anything
+else as unicode, dates as xmlrpclib.DateTime (or datetime, with use_datetime).
+
+To use it:
+rhn = rhnapi.rhnSession(server, ..., unmarshaller=rhnapi.unmarshal.getparser)
+
+Running this module compares it with xmlrpclib on saved response payloads
+(or on a generated package list if none are given):
+python -m rhnapi.unmarshal [payload.xml ...]
+"""
+
+__author__ = "Stuart Sears"
+
+import xmlrpclib
+from xml.parsers import expat
+
+# --------------------------------------------------------------------------------- #
+
+class fastUnmarshaller(object):
+    """
+    Parses an XMLRPC response (or request) fed to it in chunks.
+    Acts as both halves of the (parser, unmarshaller) pair that xmlrpclib
+    transports expect: feed() data, then close() returns the response tuple
+    (raising xmlrpclib.Fault for fault responses).
+    """
+    def __init__(self, use_datetime=0):
+        self._parser = parser = expat.ParserCreate(None, None)
+        parser.buffer_text = True
+        parser.buffer_size = 65536
+        self._result = None
+        self._methodname = None
+        self._fault = False
+
+        # top-level values. The innermost open struct or array is always stack[-1]
+        params = []
+        stack = [ params ]
+        # pending member names, one per open struct member
+        names = []
+        # character data for the current element
+        text = []
+        # [ most recently completed typed value, did the current <value> contain a type element? ]
+        cur = [ None, False ]
+        self._params = params
+
+        def stringify(value):
+            # as xmlrpclib: 7-bit strings are returned as str
+            try:
+                return value.encode('ascii')
+            except UnicodeError:
+                return value
+
+        def start(tag, attrs):
+            del text[:]
+            if tag == 'struct':
+                stack.append({})
+            elif tag == 'array':
+                stack.append([])
+            elif tag == 'value':
+                cur[1] = False
+
+        def end_value():
+            if cur[1]:
+                value = cur[0]
+            else:
+                # no type element: a string
+                value = stringify(u''.join(text))
+            top = stack[-1]
+            if top.__class__ is dict:
+                top[names.pop()] = value
+            else:
+                top.append(value)
+
+        def typed(value):
+            cur[0] = value
+            cur[1] = True
+
+        def end_string():
+            cur[0] = stringify(u''.join(text))
+            cur[1] = True
+
+        def end_int():
+            cur[0] = int(u''.join(text))
+            cur[1] = True
+
+        def end_boolean():
+            data = u''.join(text)
+            if data == '0':
+                typed(False)
+            elif data == '1':
+                typed(True)
+            else:
+                raise TypeError, "bad boolean value"
+
+        def end_double():
+            typed(float(u''.join(text)))
+
+        def end_nil():
+            typed(None)
+
+        def end_container():
+            typed(stack.pop())
+
+        def end_name():
+            names.append(stringify(u''.join(text)))
+
+        def end_base64():
+            value = xmlrpclib.Binary()
+            value.decode(u''.join(text))
+            typed(value)
+
+        def end_datetime():
+            data = u''.join(text)
+            value = xmlrpclib.DateTime()
+            value.decode(data)
+            if use_datetime:
+                value = xmlrpclib._datetime_type(data)
+            typed(value)
+
+        def end_fault():
+            self._fault = True
+
+        def end_methodname():
+            self._methodname = u''.join(text)
+
+        handlers = {
+            'value' : end_value,
+            'string' : end_string,
+            'int' : end_int,
+            'i4' : end_int,
+            'i8' : end_int,
+            'boolean' : end_boolean,
+            'double' : end_double,
+            'nil' : end_nil,
+            'struct' : end_container,
+            'array' : end_container,
+            'name' : end_name,
+            'base64' : end_base64,
+            'dateTime.iso8601' : end_datetime,
+            'fault' : end_fault,
+            'methodName' : end_methodname,
+        }
+        get_handler = handlers.get
+
+        def end(tag):
+            handler = get_handler(tag)
+            if handler is not None:
+                handler()
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = text.append
+    # ---------------------------------------------------------------------------- #
+
+    def feed(self, data):
+        self._parser.Parse(data, 0)
+
+    def close(self):
+        """
+        finishes parsing (on the first call) and returns the response tuple
+        """
+        if self._parser is not None:
+            parser, self._parser = self._parser, None
+            parser.Parse("", 1)
+            # drop the handlers, which refer back to us
+            parser.StartElementHandler = parser.EndElementHandler = parser.CharacterDataHandler = None
+            self._result = tuple(self._params)
+        if self._fault:
+            raise xmlrpclib.Fault(**self._result[0])
+        return self._result
+
+    def getmethodname(self):
+        return self._methodname
+
+# --------------------------------------------------------------------------------- #
+
+def getparser(use_datetime=0):
+    """
+    returns a (parser, unmarshaller) pair, as xmlrpclib.getparser does.
+    Both are the same fastUnmarshaller object.
+    """
+    target = fastUnmarshaller(use_datetime)
+    return target, target
+
+# --------------------------------------------------------------------------------- #
+
+def parse(data, parserfactory=getparser, chunksize=1024):
+    """
+    decodes a complete XMLRPC response string, feeding it in chunks as a transport would.
+
+    returns:
+    tuple of response values
+    """
+    p, u = parserfactory()
+    for offset in xrange(0, len(data), chunksize):
+        p.feed(data[offset:offset+chunksize])
+    p.close()
+    return u.close()
+
+# --------------------------------------------------------------------------------- #
+
+def samplePayload(count=60000):
+    """
+    generates a channel.software.listAllPackages-shaped response with 'count' packages,
+    for benchmarking when no recorded payloads are available.
+    """
+    pkgs = [ { 'name' : 'package-%d' % (i % 5000),
+               'version' : '%d.%d.%d' % (i % 7, i % 13, i % 29),
+               'release' : '%d.el6' % (i % 40),
+               'epoch' : (i % 3) and '' or '1',
+               'id' : 100000 + i,
+               'arch_label' : ('x86_64', 'i686', 'noarch')[i % 3],
+               'last_modified' : xmlrpclib.DateTime('20140527T10:%02d:%02d' % (i % 60, i % 60)),
+               'checksum' : '%040x' % (i * 7919),
+               'checksum_type' : 'sha1',
+             } for i in xrange(count) ]
+    return xmlrpclib.dumps((pkgs,), methodresponse=True)
+
+# --------------------------------------------------------------------------------- #
+
+def benchmark(payloads, repeat=3):
+    """
+    times xmlrpclib.getparser against getparser (above) on a list of payloads
+
+    returns:
+    list of dict, one per payload:
+    { 'size' : bytes, 'xmlrpclib' : best time (s), 'fast' : best time (s), 'identical' : bool }
+    """
+    import time
+    results = []
+    for data in payloads:
+        timings = {}
+        decoded = {}
+        for label, factory in (('xmlrpclib', xmlrpclib.getparser), ('fast', getparser)):
+            best = None
+            for i in range(repeat):
+                start = time.time()
+                decoded[label] = parse(data, factory, 8192)
+                elapsed = time.time() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            timings[label] = best
+        timings['size'] = len(data)
+        timings['identical'] = decoded['xmlrpclib'] == decoded['fast']
+        results.append(timings)
+    return results
+
+def main(argv):
+    if len(argv) > 0:
+        names = argv
+        payloads = [ open(x, 'rb').read() for x in argv ]
+    else:
+        names = [ 'generated listAllPackages (60000 packages)' ]
+        payloads = [ samplePayload() ]
+    for name, res in zip(names, benchmark(payloads)):
+        print "%s: %d bytes" % (name, res['size'])
+        print "  xmlrpclib : %8.3fs" % res['xmlrpclib']
+        print "  fast      : %8.3fs (%.2fx)" % (res['fast'], res['xmlrpclib'] / res['fast'])
+        print "  identical results: %s" % res['identical']
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
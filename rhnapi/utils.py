@@ -40,13 +40,30 @@ except ImportError:
 
 from operator import itemgetter
 import time
+import xmlrpclib
 from xmlrpclib import DateTime as xmlrpcDateTime
 import csv
 import sys
+import re
+import itertools
+import functools
+
+# rpm's own version comparison, if the rpm python bindings are installed
+try:
+    from rpm import labelCompare as rpmLabelCompare
+except ImportError:
+    rpmLabelCompare = None
 
 # presumes the existence of the rhnapi module on your PYTHONPATH
+from rhnapi import parallel
 from rhnapi.satellite import listEntitlements
 from rhnapi.system import listSystems, getBaseChannel
+from rhnapi.channel import listBaseChannels
+from rhnapi.pkglist import packageList, packageRecord
+
+# channel.software.listSubscribedSystems calls per system.multicall in showChannelUsage.
+# Each response lists every system in the channel, so keep this modest.
+USAGE_BATCH = 20
 
 # --------------------------------------------------------------------------------- #
 
@@ -92,43 +109,80 @@ def showEntitlements(rhn):
         
 # --------------------------------------------------------------------------------- #
 
-def showChannelUsage(rhn):
-	"""
+def _countSubscribers(rhn, chanlabels):
+    """
+    returns { label : number of subscribed systems } for a list of channels,
+    using batched channel.software.listSubscribedSystems calls (or parallel ones
+    if the server does not support system.multicall)
+    """
+    def subscribers(rhn, label):
+        return len(rhn.session.channel.software.listSubscribedSystems(rhn.key, label))
+
+    counts = {}
+    try:
+        with rhn.batch(USAGE_BATCH):
+            futures = [ (x, rhn.session.channel.software.listSubscribedSystems(rhn.key, x)) for x in chanlabels ]
+    except xmlrpclib.Fault, E:
+        rhn.logDebug("system.multicall failed (%s), counting channel subscribers in parallel" % E)
+        results, faults = parallel.pmap(rhn, subscribers, chanlabels)
+        for idx, (label, res) in enumerate(zip(chanlabels, results)):
+            if idx in faults:
+                rhn.logWarn("unable to list systems subscribed to %s: %s" % (label, faults[idx]))
+            else:
+                counts[label] = res
+        return counts
+    for label, future in futures:
+        try:
+            counts[label] = len(future.result())
+        except xmlrpclib.Fault, E:
+            rhn.logWarn("unable to list systems subscribed to %s: %s" % (label, E))
+    return counts
+
+def showChannelUsage(rhn, quiet=False):
+    """
     usage:
-    showChannelUsage(rhn)
+    showChannelUsage(rhn, quiet=False)
 
     description:
-	pull system list from RHN/Satellite, look up base channels 
-	count of systems subscribed to each.
-	This can take a long time!
+    counts the systems subscribed to each base channel on your RHN/Satellite, and
+    prints a table of them (busiest first).
+    Uses one channel.software.listSubscribedSystems call per base channel (sent in
+    system.multicall batches) plus a single listSystems call, so the time taken depends
+    on the number of base channels rather than the number of systems.
 
     returns:
-    text to stdout
+    dict
+    {
+        'channels'      - { base channel label : number of subscribed systems }
+                          for every base channel with at least one system
+        'unsubscribed'  - number of systems with no base channel
+        'systems'       - total number of systems
+    }
 
     parameters:
-	rhn - an authenticated RHN session
-	"""
-	# from rhnapi.channel import getEntitlements
-	try:
-		syslist = listSystems(rhn)
-		systemcount = len(syslist)
-		chanusage = {}
-		for s in syslist:
-			id = int(s["id"])
-			basechan = getBaseChannel(rhn, id)
-			if chanusage.has_key(basechan):
-				chanusage[basechan] += 1
-			else:
-				chanusage[basechan] = 1
-		print "count\tchannel label"
-		print "=====\t============="
-		for k in chanusage.keys():
-			print "%d\t%s" %( chanusage[k], k )
-		print "-----------------------"
-		print 'system count: %d' % len(syslist)
-	except Exception, E:
-		return rhn.fail(E, "list channel subscriptions and usage" )
-        
+    rhn                 - an authenticated RHN session
+    *quiet(bool)        - don't print the table [False]
+    """
+    try:
+        systemcount = len(listSystems(rhn))
+        counts = _countSubscribers(rhn, listBaseChannels(rhn))
+        chanusage = dict([ (k, v) for k, v in counts.iteritems() if v != 0 ])
+        usage = { 'channels' : chanusage,
+                  'unsubscribed' : max(systemcount - sum(chanusage.values()), 0),
+                  'systems' : systemcount }
+        if not quiet:
+            print "count\tchannel label"
+            print "=====\t============="
+            for k in sorted(chanusage, key = lambda x: (-chanusage[x], x)):
+                print "%d\t%s" %( chanusage[k], k )
+            if usage['unsubscribed'] != 0:
+                print "%d\t(no base channel)" % usage['unsubscribed']
+            print "-----------------------"
+            print 'system count: %d' % systemcount
+        return usage
+    except Exception, E:
+        return rhn.fail(E, "list channel subscriptions and usage" )
+
 # --------------------------------------------------------------------------------- #
 
 class RhnJSONEncoder(json.JSONEncoder):
@@ -143,6 +197,8 @@ class RhnJSONEncoder(json.JSONEncoder):
     (which handily returns the quoted string above)
 
     * python sets                : converted to lists - list(obj)
+
+    * rhnapi.pkglist objects     : packageRecords as dicts, packageLists as lists of dict
     """
     def default(self, obj):
         """
@@ -154,6 +210,12 @@ class RhnJSONEncoder(json.JSONEncoder):
         if isinstance(obj, set):
             return list(obj)
 
+        if isinstance(obj, packageRecord):
+            return obj.copy()
+
+        if isinstance(obj, packageList):
+            return obj.toDicts()
+
         return json.JSONEncoder.default(self, obj)
         
 # --------------------------------------------------------------------------------- #
@@ -190,13 +252,79 @@ def dumpJSON(obj, outputfile, indent = 2, verbose = False, customenc = RhnJSONEn
             print "Could not open file %s for writing. Check permissions"
             print E.strerror
         return False
-        
+
+# --------------------------------------------------------------------------------- #
+
+def _openOutput(outputfile):
+    """
+    returns (file object, whether we opened it) for a filename or an open file
+    """
+    if isinstance(outputfile, basestring):
+        return open(outputfile, 'wb'), True
+    return outputfile, False
+
+def dumpJSONStream(records, outputfile, indent = None, lines = False, customenc = RhnJSONEncoder):
+    """
+    Serialises a sequence of objects as JSON, one at a time, so that only the
+    current record is ever held in memory. records can be any iterable, e.g. a
+    generator yielding the results of paged or parallel API calls as they arrive.
+
+    By default writes a single JSON array (readable by loadJSON).
+    With lines=True writes JSON Lines instead: one compact JSON object per line,
+    which can be appended to, and read back without parsing the whole file.
+
+    returns:
+    int - number of records written. Raises any exceptions.
+
+    parameters:
+    records(iterable)   - the objects to serialise (usually dicts)
+    outputfile          - path to output file, or an open file object
+    indent(int)         - number of spaces to indent elements in output (ignored for JSON Lines)
+    lines(bool)         - write JSON Lines instead of a JSON array [False]
+    customenc           - custom JSON encoding class (here defaulting to our
+                          locally-defined RhnJSONEncoder class)
+    """
+    if lines:
+        indent = None
+    encoder = customenc(indent = indent)
+    fd, opened = _openOutput(outputfile)
+    count = 0
+    try:
+        if lines:
+            for record in records:
+                for chunk in encoder.iterencode(record):
+                    fd.write(chunk)
+                fd.write('\n')
+                count += 1
+        else:
+            fd.write('[')
+            for record in records:
+                if count != 0:
+                    fd.write(indent is None and ', ' or ',')
+                if indent is not None:
+                    fd.write('\n' + ' ' * indent)
+                for chunk in encoder.iterencode(record):
+                    if indent is not None:
+                        chunk = chunk.replace('\n', '\n' + ' ' * indent)
+                    fd.write(chunk)
+                count += 1
+            if indent is not None and count != 0:
+                fd.write('\n')
+            fd.write(']\n')
+    finally:
+        if opened:
+            fd.close()
+        else:
+            fd.flush()
+    return count
+
 # --------------------------------------------------------------------------------- #
 
 def loadJSON(inputfile, verbose = False, logger = None):
     """
     Loads data from a JSON file (probably but not necessarily 
     exported with dumpJSON above) and returns it.
+    This reads the whole file into memory: for large exports, see iterJSON.
 
     returns dataobject, or None
 
@@ -218,6 +346,128 @@ def loadJSON(inputfile, verbose = False, logger = None):
             logger.exception("could not open file %s for reading. Check permissions?" % inputfile)
         return None
         
+# how RhnJSONEncoder writes xmlrpclib.DateTime values, so iterJSON can restore them
+JSON_DATETIME = re.compile(r'^\d{8}T\d{2}:\d{2}:\d{2}$')
+# bytes read at a time by iterJSON
+JSON_CHUNK = 65536
+
+def _restoreDateTimes(obj):
+    """
+    object_hook for json decoding: turns 'YYYYMMDDTHH:MM:SS' strings back into
+    xmlrpclib.DateTime objects
+    """
+    for k, v in obj.iteritems():
+        if isinstance(v, basestring) and JSON_DATETIME.match(v):
+            obj[k] = xmlrpcDateTime(str(v))
+    return obj
+
+def iterJSON(inputfile, datetimes = True, lines = None):
+    """
+    Reads records one at a time from a JSON file containing a top-level array (as
+    written by dumpJSON or dumpJSONStream), or from a JSON Lines file (one JSON value
+    per line, as written by dumpJSONStream with lines=True).
+
+    Only the current record (plus a small read buffer) is held in memory, so memory
+    use stays flat however big the file is.
+
+    returns:
+    generator, yielding each record in turn. Raises ValueError for malformed input,
+    including anything but whitespace after the closing ']' of an array.
+
+    parameters:
+    inputfile               - path to JSON file, or an open file object
+    datetimes(bool)         - turn 'YYYYMMDDTHH:MM:SS' strings (how RhnJSONEncoder writes
+                              xmlrpclib.DateTime objects) back into xmlrpclib.DateTime [True]
+    lines(bool)             - True for JSON Lines, False for a JSON array. By default
+                              files starting with '[' are read as an array, so give
+                              lines=True for JSON Lines files whose records are arrays.
+    """
+    if datetimes:
+        decoder = json.JSONDecoder(object_hook = _restoreDateTimes)
+    else:
+        decoder = json.JSONDecoder()
+    if isinstance(inputfile, basestring):
+        fd = open(inputfile, 'rb')
+    else:
+        fd = inputfile
+    name = getattr(fd, 'name', fd)
+
+    try:
+        buf = fd.read(JSON_CHUNK).lstrip()
+        if lines is None:
+            lines = not buf.startswith('[')
+        if lines:
+            pending = ''
+            for line in itertools.chain(buf.splitlines(True), fd):
+                # the first chunk may have split a line in two
+                if not line.endswith('\n'):
+                    pending += line
+                    continue
+                line, pending = pending + line, ''
+                if len(line.strip()) != 0:
+                    yield decoder.decode(line)
+            if len(pending.strip()) != 0:
+                yield decoder.decode(pending)
+            return
+
+        if not buf.startswith('['):
+            raise ValueError('%s does not contain a JSON array' % name)
+        pos = 1
+        eof = False
+        # what may come next: 'value' (or the closing ']', straight after the '['),
+        # 'separator' (',' or ']') and, once the array is closed, 'end' (whitespace only)
+        expect = 'first'
+        while True:
+            # skip whitespace, reading more as need be
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos == len(buf):
+                if eof:
+                    if expect == 'end':
+                        return
+                    raise ValueError('truncated JSON array in %s' % name)
+                buf, pos = fd.read(JSON_CHUNK), 0
+                eof = len(buf) == 0
+                continue
+            char = buf[pos]
+            if expect == 'end':
+                raise ValueError('unexpected data after the end of the JSON array in %s '
+                                 '(for JSON Lines, use lines=True)' % name)
+            if expect == 'separator' or (expect == 'first' and char == ']'):
+                if char == ']':
+                    expect = 'end'
+                elif char == ',' and expect == 'separator':
+                    expect = 'value'
+                else:
+                    raise ValueError('expected , or ] in the JSON array in %s, found %r' % (name, char))
+                pos += 1
+                continue
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+                # a number cut off by the end of the buffer (e.g. '1.' of '1.5') may still
+                # decode, so unless it is followed by something that can come after a value,
+                # assume there is more of it still to read
+                if not eof and (end == len(buf) or buf[end] not in ' \t\r\n,]'):
+                    raise ValueError('incomplete')
+            except ValueError:
+                if eof:
+                    raise ValueError('malformed or truncated JSON array in %s' % name)
+                # discard what we have already decoded, then read more (at least doubling
+                # the buffer, so a single huge record doesn't get re-parsed too often)
+                buf = buf[pos:]
+                pos = 0
+                data = fd.read(max(JSON_CHUNK, len(buf)))
+                if len(data) == 0:
+                    eof = True
+                buf += data
+                continue
+            yield record
+            pos = end
+            expect = 'separator'
+    finally:
+        if fd is not inputfile:
+            fd.close()
+
 # --------------------------------------------------------------------------------- #
 
 def promptMissing(promptstr):
@@ -296,6 +546,59 @@ def csvReport(objectlist, outputfile,  fields = None):
     except:
         raise
 
+def csvReportStream(records, outputfile, fields = None):
+    """
+    Streaming version of csvReport: writes each record as it is read from records,
+    which can be any iterable (e.g. a generator yielding API results as they arrive),
+    so memory use does not grow with the size of the report.
+
+    If fields is not given, the keys of the first record are used (in sorted order).
+    xmlrpclib.DateTime values are written as 'YYYYMMDDTHH:MM:SS' strings.
+
+    returns:
+    int - number of rows written (not counting the header line). Raises any exceptions.
+
+    parameters:
+    records(iterable)   - dict (or dict-like) objects, one per row
+    outputfile          - a filename/path (overwritten if it exists) or an open file object
+    fields              - the list of dictionary keys (in order) to put in each row. This can be
+                          a subset of the keys in each object.
+    """
+    records = iter(records)
+    if fields is None:
+        try:
+            first = records.next()
+        except StopIteration:
+            first = None
+        fields = first is not None and sorted(first.keys()) or []
+        if first is not None:
+            records = itertools.chain([ first ], records)
+
+    fd, opened = _openOutput(outputfile)
+    count = 0
+    try:
+        mywriter = csv.writer(fd)
+        mywriter.writerow(fields)
+        for record in records:
+            mywriter.writerow([ _csvValue(record.get(f, '')) for f in fields ])
+            count += 1
+    finally:
+        if opened:
+            fd.close()
+        else:
+            fd.flush()
+    return count
+
+def _csvValue(value):
+    """
+    flattens a value for the csv module, which only copes with strings and numbers
+    """
+    if isinstance(value, xmlrpcDateTime):
+        return value.value
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
 # ---------------------------------------------------------------------------- #
 
 def getMaxLen(dictlist):
@@ -338,6 +641,7 @@ def get_pkgstr(pkgobj):
     parameters:
         pkgobj(dict): a dict representing a package in RHN, usually from
                       channel.list(AllPackages) or a similar API call.
+                      (or a packageRecord from an rhnapi.pkglist.packageList)
 
     returns:
         string:  E:NVR.A or NVR.A, depending on the presence of an epoch
@@ -382,6 +686,7 @@ def index_dictlist(dictlist, keyfunc):
 
     parameters:
         dictlist(list of dict): list of dictionary objects (packages, errata etc)
+            or an rhnapi.pkglist.packageList
         keyfunc(function): a function that extracts data from a dict.
             must take a dict as an argument.
     """
@@ -422,6 +727,285 @@ def batch_iterate(iterable, batchsize):
     while True:
        yield tuple(itertools.islice(it, batchsize)) or it.next()
 
+# ---------------------------------------------------------------------------- #
+
+def get_nevra(pkgobj):
+    """
+    returns a (name, epoch, version, release, arch) tuple for a given package object.
+    The epoch is '' for packages without one (RHN reports those as '', ' ' or '0'),
+    so the same package from different API calls always gives the same tuple.
+
+    parameters:
+        pkgobj(dict): a dict representing a package in RHN, from channel.listAllPackages,
+                      system.listPackages or similar (or a pkglist.packageRecord)
+
+    returns:
+        tuple of 5 strings
+    """
+    epoch = (pkgobj.get('epoch') or '').strip()
+    if epoch == '0':
+        epoch = ''
+    # arch or arch_label? (thanks, RHN!)
+    return (pkgobj['name'], epoch, pkgobj['version'], pkgobj['release'],
+            pkgobj.get('arch_label') or pkgobj.get('arch'))
+
+def nevra_str(nevra):
+    """
+    returns E:NVR.A or NVR.A for a NEVRA tuple, as get_pkgstr does for a package dict
+    """
+    name, epoch, version, release, arch = nevra
+    if epoch:
+        return '%s:%s-%s-%s.%s' % (epoch, name, version, release, arch)
+    return '%s-%s-%s.%s' % (name, version, release, arch)
+
+# ---------------------------------------------------------------------------- #
+
+_alnum = re.compile(r'([0-9]+|[a-zA-Z]+|~|\^)')
+
+def rpmvercmp(first, second):
+    """
+    compares two version (or release) strings the way rpm does: digit and letter
+    segments are compared in turn (numerically for digits, which beat letters),
+    other characters just separate segments, and '~' sorts before anything
+    (even the end of the string), '^' after the end of the string but before anything else.
+
+    returns:
+        int: 1 if first is newer, -1 if second is, 0 if they are equivalent
+    """
+    if first == second:
+        return 0
+    one = _alnum.findall(first)
+    two = _alnum.findall(second)
+    for idx in xrange(max(len(one), len(two))):
+        a = idx < len(one) and one[idx] or None
+        b = idx < len(two) and two[idx] or None
+        if a == '~' or b == '~':
+            if a != '~':
+                return 1
+            if b != '~':
+                return -1
+            continue
+        if a == '^' or b == '^':
+            if a is None:
+                return -1
+            if b is None:
+                return 1
+            if a != '^':
+                return 1
+            if b != '^':
+                return -1
+            continue
+        if a is None or b is None:
+            break
+        if a.isdigit():
+            if not b.isdigit():
+                return 1
+            a = a.lstrip('0')
+            b = b.lstrip('0')
+            if len(a) != len(b):
+                return cmp(len(a), len(b))
+        elif b.isdigit():
+            return -1
+        if a != b:
+            return cmp(a, b)
+    if len(one) == len(two):
+        return 0
+    return len(one) > len(two) and 1 or -1
+
+def labelCompare(evr1, evr2):
+    """
+    compares two (epoch, version, release) tuples as rpm does, using the rpm python
+    module if it is installed and rpmvercmp otherwise. Empty epochs count as 0.
+
+    returns:
+        int: 1 if evr1 is newer, -1 if evr2 is, 0 if they are the same
+    """
+    if rpmLabelCompare is not None:
+        return rpmLabelCompare((evr1[0] or '0', evr1[1], evr1[2]), (evr2[0] or '0', evr2[1], evr2[2]))
+    rc = cmp(int(evr1[0] or 0), int(evr2[0] or 0))
+    if rc == 0:
+        rc = rpmvercmp(evr1[1], evr2[1])
+        if rc == 0:
+            rc = rpmvercmp(evr1[2], evr2[2])
+    return rc
+
+def _compareNevras():
+    """
+    returns a function comparing the EVRs of two NEVRA tuples, which remembers its
+    results: the same pairs of versions turn up over and over across package names.
+    """
+    cache = {}
+    def compare(a, b):
+        pair = (a[1:4], b[1:4])
+        rc = cache.get(pair)
+        if rc is None:
+            rc = cache[pair] = labelCompare(pair[0], pair[1])
+        return rc
+    return compare
+
+# ---------------------------------------------------------------------------- #
+
+class PackageIndex(object):
+    """
+    An index of packages keyed by NEVRA tuple (see get_nevra), for fast comparison
+    of channels and systems. Each NEVRA is computed once, when the package is added.
+
+    Set operations (difference, intersection, union, or the -, & and | operators)
+    work on the NEVRA keys in bulk and return new PackageIndex objects, holding the
+    package objects from the left-hand index:
+
+    chan = PackageIndex(channel.listAllPackages(rhn, 'rhel-x86_64-server-6'))
+    installed = PackageIndex(system.listPackages(rhn, serverid))
+    notfromchannel = installed - chan
+    updates = chan.latest().newerThan(installed)
+
+    Iterating over an index gives its NEVRA tuples, in sorted order.
+    """
+    def __init__(self, packages=None):
+        """
+        parameters:
+        *packages(iterable)     - package dicts (or pkglist.packageRecords) to index
+        """
+        self._index = {}
+        if packages is not None:
+            self.update(packages)
+    # ---------------------------------------------------------------------------- #
+
+    @classmethod
+    def _fromdict(cls, index):
+        new = cls()
+        new._index = index
+        return new
+
+    def add(self, pkgobj):
+        """
+        adds a package to the index (replacing any other package with the same NEVRA)
+        """
+        self._index[get_nevra(pkgobj)] = pkgobj
+
+    def update(self, packages):
+        """
+        adds a sequence of packages to the index
+        """
+        self._index.update((get_nevra(x), x) for x in packages)
+    # ---------------------------------------------------------------------------- #
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(sorted(self._index))
+
+    def __contains__(self, item):
+        """
+        item can be a NEVRA tuple or a package dict
+        """
+        if not isinstance(item, tuple):
+            item = get_nevra(item)
+        return item in self._index
+
+    def __getitem__(self, nevra):
+        return self._index[nevra]
+
+    def get(self, nevra, default=None):
+        return self._index.get(nevra, default)
+
+    def packages(self):
+        """
+        returns the indexed package objects, sorted by NEVRA
+        """
+        return [ self._index[x] for x in sorted(self._index) ]
+
+    def labels(self):
+        """
+        returns the E:NVR.A / NVR.A strings for the indexed packages, sorted by NEVRA
+        """
+        return [ nevra_str(x) for x in sorted(self._index) ]
+
+    def names(self):
+        """
+        returns the set of package names in the index
+        """
+        return set(x[0] for x in self._index)
+    # ---------------------------------------------------------------------------- #
+
+    def difference(self, other):
+        """
+        packages in this index whose NEVRA is not in other (a PackageIndex)
+        """
+        keys = self._index.viewkeys() - other._index.viewkeys()
+        return self._fromdict(dict((k, self._index[k]) for k in keys))
+
+    def intersection(self, other):
+        """
+        packages in this index whose NEVRA is also in other (a PackageIndex)
+        """
+        keys = self._index.viewkeys() & other._index.viewkeys()
+        return self._fromdict(dict((k, self._index[k]) for k in keys))
+
+    def union(self, other):
+        """
+        packages in either index (this one's package object wins where both have a NEVRA)
+        """
+        index = dict(other._index)
+        index.update(self._index)
+        return self._fromdict(index)
+
+    def symmetric_difference(self, other):
+        """
+        packages in exactly one of the two indexes
+        """
+        return self.difference(other).union(other.difference(self))
+
+    __sub__ = difference
+    __and__ = intersection
+    __or__ = union
+    __xor__ = symmetric_difference
+    # ---------------------------------------------------------------------------- #
+
+    def _newest(self, byarch):
+        """
+        returns { name or (name, arch) : newest NEVRA }
+        """
+        groups = {}
+        for nevra in self._index:
+            groups.setdefault(byarch and (nevra[0], nevra[4]) or nevra[0], []).append(nevra)
+        # only packages with more than one version need comparing
+        compare = _compareNevras()
+        key = functools.cmp_to_key(compare)
+        newest = {}
+        for group, nevras in groups.iteritems():
+            if len(nevras) == 1:
+                newest[group] = nevras[0]
+            else:
+                newest[group] = max(nevras, key = key)
+        return newest
+
+    def latest(self, byarch=True):
+        """
+        returns a PackageIndex holding only the newest version of each package name
+        (per architecture, unless byarch is False), using rpm version comparison.
+        """
+        return self._fromdict(dict((x, self._index[x]) for x in self._newest(byarch).itervalues()))
+
+    def newerThan(self, other, byarch=True):
+        """
+        returns a PackageIndex of the packages in this index that are newer than the
+        newest version of the same package (name and arch, unless byarch is False) in
+        other. Packages other doesn't have at all are not included.
+
+        e.g. the updates available to a system from a channel:
+        chanindex.newerThan(systemindex)
+        """
+        theirs = other._newest(byarch)
+        compare = _compareNevras()
+        index = {}
+        for nevra, pkgobj in self._index.iteritems():
+            current = theirs.get(byarch and (nevra[0], nevra[4]) or nevra[0])
+            if current is not None and compare(nevra, current) > 0:
+                index[nevra] = pkgobj
+        return self._fromdict(index)
+
 
 # footer - do not edit below here
 # vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
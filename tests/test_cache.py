@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for rhnapi.cache, on its own and with rhnSession against the synthetic
+# satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, cache, system, packages, errata
+
+# --------------------------------------------------------------------------------- #
+
+class responseCacheTest(unittest.TestCase):
+    def test_readonly(self):
+        store = cache.responseCache()
+        for method in ('system.listSystems', 'channel.software.getDetails', 'api.systemVersion',
+                       'errata.applicableToChannels', 'packages.search.name'):
+            self.assertTrue(store.readonly(method), method)
+        for method in ('system.deleteSystems', 'channel.software.create', 'errata.clone'):
+            self.assertFalse(store.readonly(method), method)
+        self.assertTrue(store.ignored('auth.login'))
+        self.assertTrue(store.ignored('system.multicall'))
+
+    def test_lifetime(self):
+        store = cache.responseCache(ttl=10, ttls={ 'system.listSystems' : 0, 'channel' : 20 })
+        self.assertEqual(store.lifetime('system.getDetails'), 10)
+        self.assertEqual(store.lifetime('system.listSystems'), 0)
+        self.assertEqual(store.lifetime('channel.software.listAllPackages'), 20)
+        self.assertEqual(store.lifetime('channel.listAllChannels'), cache.TTLS['channel.listAllChannels'])
+        self.assertEqual(store.lifetime('system.deleteSystems'), 0)
+
+    def test_expiry(self):
+        store = cache.responseCache(ttl=0.05)
+        store.put('system.getDetails', (1,), { 'id' : 1 })
+        self.assertEqual(store.get('system.getDetails', (1,)), (True, { 'id' : 1 }))
+        self.assertEqual(store.get('system.getDetails', (2,)), (False, None))
+        time.sleep(0.1)
+        self.assertEqual(store.get('system.getDetails', (1,)), (False, None))
+        self.assertEqual((store.hits, store.misses), (1, 2))
+
+    def test_not_cached(self):
+        store = cache.responseCache(ttls={ 'system.listSystems' : 0 })
+        store.put('system.listSystems', (), [ 1 ])
+        store.put('system.deleteSystems', ([ 1 ],), 1)
+        self.assertEqual(store.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        store = cache.responseCache(maxsize=3)
+        for i in range(3):
+            store.put('system.getDetails', (i,), i)
+        # 0 is now the most recently used, so 1 goes first
+        store.get('system.getDetails', (0,))
+        store.put('system.getDetails', (3,), 3)
+        self.assertEqual([ store.get('system.getDetails', (i,))[0] for i in range(4) ], [ True, False, True, True ])
+        self.assertEqual(store.evictions, 1)
+
+    def test_related_invalidation(self):
+        store = cache.responseCache()
+        store.put('channel.software.listAllPackages', ('base',), [])
+        store.put('errata.getDetails', ('RHSA-1',), {})
+        store.put('system.listSystems', (), [])
+        store.put('kickstart.listKickstarts', (), [])
+        store.put('user.listUsers', (), [])
+        store.invalidate('channel.software.create')
+        self.assertFalse(store.get('channel.software.listAllPackages', ('base',))[0])
+        self.assertFalse(store.get('errata.getDetails', ('RHSA-1',))[0])
+        self.assertFalse(store.get('system.listSystems', ())[0])
+        self.assertTrue(store.get('kickstart.listKickstarts', ())[0])
+        self.assertTrue(store.get('user.listUsers', ())[0])
+        self.assertEqual(store.invalidations, 3)
+
+    def test_keys_include_parameters(self):
+        store = cache.responseCache()
+        dt = xmlrpclib.DateTime('20140101T00:00:00')
+        store.put('channel.software.listErrata', ('base', dt), [ 1 ])
+        store.put('channel.software.listErrata', ('base', { 'b' : 1, 'a' : [ 2 ] }), [ 2 ])
+        self.assertEqual(store.get('channel.software.listErrata', ('base', xmlrpclib.DateTime('20140101T00:00:00'))), (True, [ 1 ]))
+        self.assertEqual(store.get('channel.software.listErrata', ('base', { 'a' : [ 2 ], 'b' : 1 })), (True, [ 2 ]))
+        self.assertFalse(store.get('channel.software.listErrata', ('other', dt))[0])
+
+    def test_callers_get_their_own_copy(self):
+        store = cache.responseCache()
+        value = [ { 'id' : 1, 'channels' : [ 'a' ] } ]
+        store.put('system.listSystems', (), value)
+        value[0]['id'] = 2
+        first = store.get('system.listSystems', ())[1]
+        first[0]['channels'].append('b')
+        del first[0]['id']
+        first.append({})
+        self.assertEqual(store.get('system.listSystems', ())[1], [ { 'id' : 1, 'channels' : [ 'a' ] } ])
+
+# --------------------------------------------------------------------------------- #
+
+class sessionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=10, base_channels=1, child_channels=1, packages=20, errata=5)
+        self.cache = cache.responseCache()
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False, cache=self.cache)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+
+    def calls(self, method):
+        return self.server.satellite.calls.get(method, 0)
+
+    def test_repeated_calls_hit_cache(self):
+        for i in range(5):
+            self.assertEqual(len(system.listSystems(self.rhn)), 10)
+        self.assertEqual(self.calls('system.listUserSystems'), 1)
+        self.assertEqual(self.cache.hits, 4)
+
+    def test_write_invalidates(self):
+        label = 'rhel-x86_64-server-5'
+        pkgs = self.rhn.session.channel.software.listAllPackages(self.rhn.key, label)
+        self.rhn.session.channel.software.removePackages(self.rhn.key, label, [ pkgs[0]['id'] ])
+        after = self.rhn.session.channel.software.listAllPackages(self.rhn.key, label)
+        self.assertEqual(len(after), len(pkgs) - 1)
+        self.assertEqual(self.calls('channel.software.listAllPackages'), 2)
+
+    def test_zero_ttl_is_not_a_write(self):
+        self.cache.ttls['system.getName'] = 0
+        self.rhn.session.channel.software.getDetails(self.rhn.key, 'rhel-x86_64-server-5')
+        self.rhn.session.system.getName(self.rhn.key, 1000010000)
+        self.rhn.session.system.getName(self.rhn.key, 1000010000)
+        self.rhn.session.channel.software.getDetails(self.rhn.key, 'rhel-x86_64-server-5')
+        self.assertEqual(self.calls('system.getName'), 2)
+        self.assertEqual(self.calls('channel.software.getDetails'), 1)
+        self.assertEqual(self.cache.invalidations, 0)
+
+    def test_renewal_keeps_cache(self):
+        system.listSystems(self.rhn)
+        self.server.satellite.expireSessions()
+        self.rhn.renewSession()
+        system.listSystems(self.rhn)
+        self.assertEqual(self.calls('system.listUserSystems'), 1)
+
+    def test_batched_calls(self):
+        self.rhn.session.system.getName(self.rhn.key, 1000010000)
+        with self.rhn.batch():
+            futures = [ self.rhn.session.system.getName(self.rhn.key, 1000010000 + i) for i in range(3) ]
+        self.assertEqual([ x.result()['name'] for x in futures ],
+                         [ 'host%05d.example.com' % i for i in range(3) ])
+        self.assertEqual(self.calls('system.getName'), 3)
+        # and the batched results were cached as they arrived
+        self.rhn.session.system.getName(self.rhn.key, 1000010002)
+        self.assertEqual(self.calls('system.getName'), 3)
+
+    def test_wrappers_cannot_alter_cached_results(self):
+        first = self.rhn.session.system.listSystems(self.rhn.key)
+        for entry in first:
+            del entry['last_checkin']
+        self.assertTrue('last_checkin' in self.rhn.session.system.listSystems(self.rhn.key)[0])
+
+# --------------------------------------------------------------------------------- #
+
+class packageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'packages.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def committed(self):
+        """
+        number of rows another connection can see
+        """
+        db = sqlite3.connect(self.filename)
+        try:
+            return db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        finally:
+            db.close()
+
+    def test_persistent(self):
+        value = { 'id' : 1, 'name' : 'bash', 'build_date' : xmlrpclib.DateTime('20140101T10:00:00'),
+                  'files' : [ u'/bin/bash', '/usr/share/doc' ] }
+        store = cache.packageCache(self.filename)
+        store.put('sat1', 'packages.getDetails', 1, value)
+        store.close()
+        store = cache.packageCache(self.filename)
+        self.assertEqual(store.get('sat1', 'packages.getDetails', 1), (True, value))
+        self.assertEqual(store.get('sat2', 'packages.getDetails', 1), (False, None))
+        self.assertEqual(store.get('sat1', 'packages.listFiles', 1), (False, None))
+        self.assertEqual(store.stats(), { 'size' : 1, 'hits' : 1, 'misses' : 2 })
+        store.close()
+
+    def test_commit_every(self):
+        store = cache.packageCache(self.filename, commit_every=3, commit_interval=None)
+        for i in range(5):
+            store.put('sat1', 'packages.getDetails', i, {})
+        self.assertEqual(self.committed(), 3)
+        store.flush()
+        self.assertEqual(self.committed(), 5)
+        store.close()
+
+    def test_commit_interval(self):
+        store = cache.packageCache(self.filename, commit_every=1000, commit_interval=0.1)
+        store.put('sat1', 'packages.getDetails', 1, {})
+        self.assertEqual(self.committed(), 0)
+        # committed by the timer, with no further puts
+        deadline = time.time() + 5
+        while self.committed() == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.committed(), 1)
+        store.close()
+
+    def test_forget(self):
+        store = cache.packageCache(self.filename)
+        for method in cache.IMMUTABLE:
+            store.put('sat1', method, 1, [])
+        store.put('sat1', 'packages.getDetails', 2, {})
+        store.put('sat2', 'packages.getDetails', 2, {})
+        store.forget('sat1', 1)
+        self.assertEqual(store.stats()['size'], 2)
+        store.forget('sat1')
+        self.assertEqual(store.get('sat2', 'packages.getDetails', 2), (True, {}))
+        self.assertEqual(store.stats()['size'], 1)
+        store.close()
+
+    def test_closed(self):
+        store = cache.packageCache(self.filename)
+        store.put('sat1', 'packages.getDetails', 1, {})
+        store.close()
+        self.assertEqual(self.committed(), 1)
+        self.assertEqual(store.get('sat1', 'packages.getDetails', 1), (False, None))
+        store.put('sat1', 'packages.getDetails', 2, {})
+        store.forget('sat1')
+        store.flush()
+        store.close()
+        self.assertEqual(self.committed(), 1)
+
+class sessionPackageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'packages.db')
+        self.server = mockserver.start(systems=5, base_channels=1, child_channels=1, packages=20, errata=5)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def session(self):
+        return rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                 logenable=False, pkgcache=cache.packageCache(self.filename))
+
+    def calls(self, method):
+        return self.server.satellite.calls.get(method, 0)
+
+    def test_package_details_cached(self):
+        rhn = self.session()
+        pkgid = rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5')[0]['id']
+        details = packages.getDetails(rhn, pkgid)
+        self.assertEqual(packages.getDetails(rhn, pkgid), details)
+        self.assertEqual(self.calls('packages.getDetails'), 1)
+        # the call went through the session, so it was recorded like any other
+        self.assertEqual(rhn.stats()['packages.getDetails']['calls'], 1)
+        rhn.logout()
+        # a later session (e.g. the next run of the script) finds it on disk
+        rhn = self.session()
+        self.assertEqual(packages.getDetails(rhn, pkgid), details)
+        self.assertEqual(self.calls('packages.getDetails'), 1)
+        rhn.logout()
+
+    def test_batched(self):
+        rhn = self.session()
+        pkgids = [ x['id'] for x in rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5')[:3] ]
+        packages.listFiles(rhn, pkgids[0])
+        with rhn.batch():
+            futures = [ packages.listFiles(rhn, x) for x in pkgids ]
+        self.assertEqual([ len(x.result()) for x in futures ], [ x % 20 + 1 for x in pkgids ])
+        self.assertEqual(self.calls('packages.listFiles'), 3)
+        self.assertEqual(rhn.pkgcache.stats()['size'], 3)
+        rhn.logout()
+
+    def test_errata_packages_not_cached(self):
+        rhn = self.session()
+        advisory = sorted(self.server.satellite.errata)[0]
+        errata.listPackages(rhn, advisory)
+        errata.listPackages(rhn, advisory)
+        self.assertEqual(self.calls('errata.listPackages'), 2)
+        self.assertEqual(rhn.pkgcache.stats()['size'], 0)
+        rhn.logout()
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
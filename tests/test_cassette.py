@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for rhnapi.cassette record/replay, recording from the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import zlib
+import shutil
+import tempfile
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, cassette, system
+
+# --------------------------------------------------------------------------------- #
+
+class cassetteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.rhnc')
+        self.server = mockserver.start(systems=10, base_channels=1, child_channels=1, packages=20, errata=5)
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def session(self, cas, password='password'):
+        transport = None
+        if self.server is not None:
+            transport = self.server.transport
+        return rhnapi.rhnSession('mock', 'admin', password, transport=transport,
+                                 logenable=False, cassette=cas)
+
+    def record(self):
+        """
+        records a short script, returning what it saw
+        """
+        cas = cassette.cassette(self.filename, 'record')
+        rhn = self.session(cas)
+        seen = { 'systems' : system.listSystems(rhn),
+                 'details' : rhn.session.channel.software.getDetails(rhn.key, 'rhel-x86_64-server-5') }
+        try:
+            rhn.session.channel.software.getDetails(rhn.key, 'nope')
+        except xmlrpclib.Fault, E:
+            seen['fault'] = (E.faultCode, E.faultString)
+        rhn.logout(expire=True)
+        cas.close()
+        return seen
+
+    def replay(self):
+        cas = cassette.cassette(self.filename)
+        # (the password is not recorded, so any will do)
+        rhn = self.session(cas, password='wrong')
+        return cas, rhn
+
+    def stopServer(self):
+        self.server.stop()
+        self.server = None
+    # ---------------------------------------------------------------------------- #
+
+    def test_replay_without_server(self):
+        seen = self.record()
+        self.stopServer()
+        cas, rhn = self.replay()
+        self.assertEqual(system.listSystems(rhn), seen['systems'])
+        self.assertEqual(rhn.session.channel.software.getDetails(rhn.key, 'rhel-x86_64-server-5'),
+                         seen['details'])
+        try:
+            rhn.session.channel.software.getDetails(rhn.key, 'nope')
+        except xmlrpclib.Fault, E:
+            self.assertEqual((E.faultCode, E.faultString), seen['fault'])
+        else:
+            self.fail('recorded fault was not replayed')
+        self.assertEqual(cas.replayed, 4)
+        self.assertEqual(rhn.connectionStats()['requests'], 4)
+
+    def test_unrecorded_call(self):
+        self.record()
+        cas, rhn = self.replay()
+        self.assertRaises(rhnapi.rhnException, rhn.session.system.getDetails, rhn.key, 1000010000)
+        self.assertRaises(rhnapi.rhnException, cassette.cassette, os.path.join(self.tmpdir, 'none.rhnc'))
+
+    def test_password_not_recorded(self):
+        self.record()
+        self.assertFalse('password' in open(self.filename, 'rb').read())
+
+    def test_repeated_calls_replay_in_turn(self):
+        cas = cassette.cassette(self.filename, 'record')
+        rhn = self.session(cas)
+        first = rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5')
+        rhn.session.channel.software.removePackages(rhn.key, 'rhel-x86_64-server-5', [ first[0]['id'] ])
+        second = rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5')
+        cas.close()
+        cas, rhn = self.replay()
+        self.assertEqual(rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5'), first)
+        self.assertEqual(rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5'), second)
+        # and then the last one again
+        self.assertEqual(rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5'), second)
+        cas.rewind()
+        self.assertEqual(rhn.session.channel.software.listAllPackages(rhn.key, 'rhel-x86_64-server-5'), first)
+
+    def test_batches(self):
+        cas = cassette.cassette(self.filename, 'record')
+        rhn = self.session(cas)
+        with rhn.batch():
+            futures = [ rhn.session.system.getName(rhn.key, 1000010000 + i) for i in range(5) ]
+        names = [ x.result() for x in futures ]
+        cas.close()
+        cas, rhn = self.replay()
+        with rhn.batch():
+            futures = [ rhn.session.system.getName(rhn.key, 1000010000 + i) for i in range(5) ]
+        self.assertEqual([ x.result() for x in futures ], names)
+    # ---------------------------------------------------------------------------- #
+
+    def test_index_format(self):
+        self.record()
+        data = open(self.filename, 'rb').read()
+        lines = open(self.filename + '.idx').read().splitlines()
+        # auth.login, listSystems, getDetails twice, auth.logout
+        self.assertEqual([ x.split()[3] for x in lines ],
+                         [ 'auth.login', 'system.listUserSystems', 'channel.software.getDetails',
+                           'channel.software.getDetails', 'auth.logout' ])
+        offset = 0
+        for line in lines:
+            digest, start, length, method = line.split()
+            start, length = int(start), int(length)
+            magic, hdigest, methodlen, hlength = cassette.HEADER.unpack(data[offset:offset + cassette.HEADER.size])
+            self.assertEqual((magic, hdigest.encode('hex'), hlength), (cassette.MAGIC, digest, length))
+            self.assertEqual(data[offset + cassette.HEADER.size:start], method)
+            # each response is a zlib-compressed XMLRPC response
+            self.assertTrue(zlib.decompress(data[start:start + length]).startswith('<?xml'))
+            offset = start + length
+        self.assertEqual(offset, len(data))
+
+    def test_index_rebuilt(self):
+        self.record()
+        index = open(self.filename + '.idx').read()
+        os.unlink(self.filename + '.idx')
+        cas = cassette.cassette(self.filename)
+        self.assertEqual(open(self.filename + '.idx').read(), index)
+        self.assertEqual(cas.summary()['channel.software.getDetails'], 2)
+        cas.close()
+
+    def test_truncated_recording(self):
+        self.record()
+        size = os.path.getsize(self.filename)
+        fd = open(self.filename, 'r+b')
+        fd.truncate(size - 10)
+        fd.close()
+        cas = cassette.cassette(self.filename)
+        # the final (auth.logout) response is lost, the rest replay
+        self.assertFalse('auth.logout' in cas.summary())
+        self.assertEqual(sum(cas.summary().values()), 4)
+        cas.close()
+
+    def test_append(self):
+        self.record()
+        cas = cassette.cassette(self.filename, 'append')
+        rhn = self.session(cas)
+        name = rhn.session.system.getName(rhn.key, 1000010000)
+        cas.close()
+        self.stopServer()
+        cas, rhn = self.replay()
+        self.assertEqual(rhn.session.system.getName(rhn.key, 1000010000), name)
+        self.assertEqual(len(system.listSystems(rhn)), 10)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
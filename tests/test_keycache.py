@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for the session key cache (rhnapi.fetchSessionKey, saveSessionKey and
+# rhnSession's keycache option), run against the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import stat
+import time
+import shutil
+import tempfile
+import unittest
+from ConfigParser import SafeConfigParser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, system
+
+# --------------------------------------------------------------------------------- #
+
+class keyFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.keyfile = os.path.join(self.tmpdir, 'rhnsession')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_created_private(self):
+        self.assertTrue(rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1'))
+        self.assertEqual(stat.S_IMODE(os.stat(self.keyfile).st_mode), 0600)
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), 'KEY1')
+
+    def test_replaced_atomically(self):
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1')
+        inode = os.stat(self.keyfile).st_ino
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'other', 'KEY2')
+        # a new file renamed over the old one, with no temporary file left behind
+        self.assertNotEqual(os.stat(self.keyfile).st_ino, inode)
+        self.assertEqual(os.listdir(self.tmpdir), [ 'rhnsession' ])
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), 'KEY1')
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'other'), 'KEY2')
+
+    def test_remove_key(self):
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1')
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', None)
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), None)
+
+    def test_max_age(self):
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1')
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin', maxage=60), 'KEY1')
+        cfg = SafeConfigParser()
+        cfg.read(self.keyfile)
+        cfg.set('sat:admin', 'saved', '%.0f' % (time.time() - 120))
+        fd = open(self.keyfile, 'w')
+        cfg.write(fd)
+        fd.close()
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin', maxage=60), None)
+
+    def test_ignored_if_readable_by_others(self):
+        rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1')
+        os.chmod(self.keyfile, 0644)
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), None)
+
+    def test_missing_or_damaged(self):
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), None)
+        fd = os.fdopen(os.open(self.keyfile, os.O_WRONLY | os.O_CREAT, 0600), 'w')
+        fd.write('not an ini file\n')
+        fd.close()
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), None)
+        self.assertTrue(rhnapi.saveSessionKey(self.keyfile, 'sat', 'admin', 'KEY1'))
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'sat', 'admin'), 'KEY1')
+
+# --------------------------------------------------------------------------------- #
+
+class keyCacheSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.keyfile = os.path.join(self.tmpdir, 'rhnsession')
+        self.server = mockserver.start(systems=5, base_channels=1, child_channels=1, packages=20, errata=5)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def session(self):
+        return rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                 logenable=False, keycache=self.keyfile)
+
+    def logins(self):
+        return self.server.satellite.calls.get('auth.login', 0)
+
+    def test_logout_keeps_shared_session(self):
+        first = self.session()
+        second = self.session()
+        self.assertEqual(len(system.listSystems(first)), 5)
+        self.assertEqual(len(system.listSystems(second)), 5)
+        self.assertTrue(first.logout())
+        # the still-running session, and the next one, carry on with the cached key
+        self.assertEqual(len(system.listSystems(second)), 5)
+        third = self.session()
+        self.assertEqual(len(system.listSystems(third)), 5)
+        self.assertEqual(third.key, first.key)
+        self.assertEqual(self.logins(), 1)
+        self.assertEqual(self.server.satellite.calls.get('auth.logout', 0), 0)
+        second.close()
+        third.logout()
+
+    def test_logout_expire(self):
+        first = self.session()
+        self.assertEqual(len(system.listSystems(first)), 5)
+        self.assertTrue(first.logout(expire=True))
+        self.assertEqual(self.server.satellite.calls.get('auth.logout', 0), 1)
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'mock', 'admin'), None)
+        second = self.session()
+        self.assertEqual(len(system.listSystems(second)), 5)
+        self.assertEqual(self.logins(), 2)
+        second.logout(expire=True)
+
+    def test_expired_cached_key_is_replaced(self):
+        first = self.session()
+        oldkey = first.key
+        self.server.satellite.expireSessions()
+        second = self.session()
+        self.assertEqual(len(system.listSystems(second)), 5)
+        self.assertNotEqual(second.key, oldkey)
+        self.assertEqual(rhnapi.fetchSessionKey(self.keyfile, 'mock', 'admin'), second.key)
+        second.logout(expire=True)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# offline regression tests for rhnSession and the wrapper modules, run against
+# the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, channel, system, parallel, utils
+
+# --------------------------------------------------------------------------------- #
+
+class mockSatelliteTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=20, packages_per_system=5, base_channels=2,
+                                       child_channels=2, packages=50, errata=10)
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+
+    def logins(self):
+        return self.server.satellite.calls.get('auth.login', 0)
+    # ---------------------------------------------------------------------------- #
+
+    def test_login_and_list(self):
+        self.assertEqual(len(system.listSystems(self.rhn)), 20)
+        self.assertEqual(self.logins(), 1)
+
+    def test_faults(self):
+        self.assertRaises(xmlrpclib.Fault, self.rhn.session.channel.software.getDetails, self.rhn.key, 'nope')
+        try:
+            self.rhn.session.channel.software.getDetails(self.rhn.key, 'nope')
+        except xmlrpclib.Fault, E:
+            self.assertEqual(E.faultCode, mockserver.FAULT_NO_CHANNEL)
+
+    def test_expired_session_is_renewed(self):
+        key = self.rhn.key
+        self.server.satellite.expireSessions()
+        self.assertEqual(len(system.listSystems(self.rhn)), 20)
+        self.assertNotEqual(self.rhn.key, key)
+        self.assertEqual(self.logins(), 2)
+
+    def test_expired_session_is_renewed_in_batch(self):
+        self.rhn.key
+        self.server.satellite.expireSessions()
+        with self.rhn.batch():
+            future = self.rhn.session.system.listSystems(self.rhn.key)
+        self.assertEqual(len(future.result()), 20)
+        self.assertEqual(self.logins(), 2)
+
+    def test_unknown_method_keeps_session(self):
+        key = self.rhn.key
+        self.assertRaises(xmlrpclib.Fault, self.rhn.session.system.noSuchMethod, key, 1)
+        self.assertRaises(xmlrpclib.Fault, self.rhn.session.system.getDetails, key)
+        self.assertEqual(self.rhn.key, key)
+        self.assertEqual(self.logins(), 1)
+
+    def test_bad_parameters(self):
+        try:
+            self.rhn.session.system.getDetails(self.rhn.key)
+        except xmlrpclib.Fault, E:
+            self.assertEqual(E.faultCode, mockserver.FAULT_INVALID)
+        else:
+            self.fail('system.getDetails accepted too few parameters')
+        # optional parameters are optional
+        self.assertEqual(len(self.rhn.session.channel.software.listAllPackages(self.rhn.key,
+                             'rhel-x86_64-server-5', '2010-01-01 00:00:00')), 50)
+
+    def test_errors_in_methods_are_not_client_errors(self):
+        def api_broken(key):
+            return len(None)
+        self.server.satellite.api_broken = api_broken
+        try:
+            self.rhn.session.api.broken(self.rhn.key)
+        except xmlrpclib.Fault, E:
+            self.assertNotEqual(E.faultCode, mockserver.FAULT_INVALID)
+            self.assertTrue('TypeError' in E.faultString)
+        else:
+            self.fail('api.broken did not fail')
+
+    def test_concurrent_logins(self):
+        keys = parallel.pmap(self.rhn, lambda rhn, x: rhn.session.auth.login('admin', 'password'),
+                             range(200), 8)[0]
+        self.assertEqual(len(set(keys)), 200)
+        self.assertEqual(len(self.server.satellite._sessions), 200)
+    # ---------------------------------------------------------------------------- #
+
+    def test_parallel_reuses_connections(self):
+        ids = [ x['id'] for x in system.listSystems(self.rhn) ]
+        for i in range(5):
+            results, faults = parallel.map_servers(self.rhn, system.listPackages, ids, 4)
+            self.assertEqual(faults, {})
+        # the calling thread's transport plus one per worker
+        self.assertTrue(len(self.rhn._transports) <= 5)
+
+    def test_channel_tree(self):
+        tree = channel.channelTree(self.rhn)
+        bases = tree.baseChannels()
+        self.assertEqual(len(bases), 2)
+        self.assertEqual(channel.listBaseChannels(self.rhn), bases)
+        self.assertEqual(len(tree.children(bases[0])), 2)
+        self.assertTrue(channel.hasChildren(self.rhn, bases[0]))
+
+    def test_children_not_cached(self):
+        base = channel.listBaseChannels(self.rhn)[0]
+        before = channel.listChildChannels(self.rhn, base)
+        self.rhn.session.channel.software.create(self.rhn.key, 'newchild', 'new', 'new', 'channel-x86_64', base)
+        self.assertEqual(channel.listChildChannels(self.rhn, base), sorted(before + [ 'newchild' ]))
+        self.rhn.session.channel.software.create(self.rhn.key, 'newbase', 'new', 'new', 'channel-x86_64', '')
+        self.assertFalse(channel.hasChildren(self.rhn, 'newbase'))
+        self.rhn.session.channel.software.create(self.rhn.key, 'newbase-child', 'new', 'new', 'channel-x86_64', 'newbase')
+        self.assertTrue(channel.hasChildren(self.rhn, 'newbase'))
+
+    def test_channel_tree_failure(self):
+        errors = []
+        self.rhn.logErr = errors.append
+        def broken(key):
+            raise xmlrpclib.Fault(mockserver.FAULT_INVALID, 'broken')
+        self.server.satellite.channel_listAllChannels = broken
+        self.assertTrue(channel.listBaseChannels(self.rhn) is False)
+        self.assertTrue(channel.channelsByArch(self.rhn, 'x86_64') is False)
+        # reported once each, by channelTree
+        self.assertEqual(len([ x for x in errors if x.startswith('Failed to') ]), 2)
+
+    def test_channelExists_uses_channel_tree(self):
+        base = channel.listBaseChannels(self.rhn)[0]
+        calls = dict(self.server.satellite.calls)
+        for label in [ base, 'nope', channel.channelTree(self.rhn).channels[base]['id'] ]:
+            channel.channelExists(self.rhn, label)
+        self.assertEqual(self.server.satellite.calls, calls)
+        self.assertTrue(channel.channelExists(self.rhn, base))
+        self.assertFalse(channel.channelExists(self.rhn, 'nope'))
+
+    def test_channelExists_sees_new_channels(self):
+        self.assertFalse(channel.channelExists(self.rhn, 'newchan'))
+        # created via this module, which drops the cached tree
+        channel.create(self.rhn, 'newchan', 'new', 'new', 'channel-x86_64')
+        self.assertTrue(channel.channelExists(self.rhn, 'newchan'))
+        # created behind its back, so only seen on asking the satellite
+        self.rhn.session.channel.software.create(self.rhn.key, 'otherchan', 'other', 'other', 'channel-x86_64', '')
+        self.assertFalse(channel.channelExists(self.rhn, 'otherchan'))
+        self.assertTrue(channel.channelExists(self.rhn, 'otherchan', refresh=True))
+        self.assertFalse(channel.channelExists(self.rhn, 'nope', refresh=True))
+
+    def test_clone_and_delete_recursive(self):
+        base = channel.listBaseChannels(self.rhn)[0]
+        cloned = channel.cloneRecursive(self.rhn, base, suffix='-test')
+        self.assertTrue(cloned)
+        self.assertEqual([ x['status'] for x in cloned ], [ 'cloned' ] * 3)
+        again = channel.cloneRecursive(self.rhn, base, suffix='-test', resume=True)
+        self.assertEqual([ x['status'] for x in again ], [ 'skipped' ] * 3)
+
+        plan = channel.deleteRecursive(self.rhn, base + '-test', dryrun=True)
+        self.assertEqual([ x['status'] for x in plan ], [ 'planned' ] * 3)
+        self.assertTrue(channel.deleteRecursive(self.rhn, base + '-test'))
+        self.assertFalse(channel.channelExists(self.rhn, base + '-test'))
+        self.assertFalse(channel.deleteRecursive(self.rhn, base + '-test'))
+
+    def test_delete_recursive_checks_result(self):
+        base = channel.listBaseChannels(self.rhn)[0]
+        child = channel.listChildChannels(self.rhn, base)[0]
+        delete = self.server.satellite.channel_software_delete
+        def refuse(key, label):
+            if label == child:
+                return 0
+            return delete(key, label)
+        self.server.satellite.channel_software_delete = refuse
+        results = channel.deleteRecursive(self.rhn, base)
+        self.assertFalse(results)
+        status = dict([ (x['label'], x['status']) for x in results ])
+        self.assertEqual(status.pop(child), 'failed')
+        # the parent is left alone while it still has children
+        self.assertEqual(status.pop(base), 'not attempted')
+        self.assertEqual(status.values(), [ 'deleted' ])
+        self.assertEqual([ x['label'] for x in results.failures() ], [ child, base ])
+        self.assertTrue(channel.channelExists(self.rhn, child, refresh=True))
+
+    def test_channel_usage(self):
+        usage = utils.showChannelUsage(self.rhn, quiet=True)
+        self.assertEqual(usage['systems'], 20)
+        self.assertEqual(sum(usage['channels'].values()) + usage['unsubscribed'], 20)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
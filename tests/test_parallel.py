@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for rhnapi.parallel, run against the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, system, parallel
+
+# --------------------------------------------------------------------------------- #
+
+class mockSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=10, base_channels=1, child_channels=1, packages=20, errata=5)
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+
+    def getName(self, rhn, serverid):
+        return rhn.session.system.getName(rhn.key, serverid)['name']
+
+class pmapTest(mockSessionTest):
+    def test_results_in_order(self):
+        ids = [ x['id'] for x in system.listSystems(self.rhn) ]
+        results, faults = parallel.map_servers(self.rhn, self.getName, ids, 4)
+        self.assertEqual(faults, {})
+        self.assertEqual(results, [ 'host%05d.example.com' % i for i in range(10) ])
+
+    def test_faults_keyed_by_index(self):
+        ids = [ 1000010000, 42, 1000010001, 42, 42 ]
+        results, faults = parallel.map_servers(self.rhn, self.getName, ids, 3)
+        self.assertEqual(sorted(faults), [ 1, 3, 4 ])
+        for fault in faults.values():
+            self.assertTrue(isinstance(fault, xmlrpclib.Fault))
+        self.assertEqual(results, [ 'host00000.example.com', None, 'host00001.example.com', None, None ])
+
+    def test_nested_pmap(self):
+        def names(rhn, serverids):
+            return parallel.map_servers(rhn, self.getName, serverids, 2)[0]
+        results, faults = parallel.pmap(self.rhn, names, [ [ 1000010000, 1000010001 ], [ 1000010002 ] ], 2)
+        self.assertEqual(faults, {})
+        self.assertEqual(results, [ [ 'host00000.example.com', 'host00001.example.com' ], [ 'host00002.example.com' ] ])
+
+    def test_logout_stops_workers(self):
+        parallel.map_servers(self.rhn, self.getName, [ 1000010000, 1000010001, 1000010002 ], 3)
+        threads = list(self.rhn._workerpool._threads)
+        self.assertEqual(len(threads), 3)
+        self.rhn.logout()
+        self.assertTrue(self.rhn._workerpool is None)
+        self.assertEqual([ t for t in threads if t.isAlive() ], [])
+        # and the session can still run parallel calls afterwards
+        results, faults = parallel.map_servers(self.rhn, self.getName, [ 1000010000 ], 2)
+        self.assertEqual(results, [ 'host00000.example.com' ])
+
+# --------------------------------------------------------------------------------- #
+
+class asyncTest(mockSessionTest):
+    def test_shares_session_pool(self):
+        arhn = parallel.AsyncRhnSession(self.rhn, workers=parallel.MAX_WORKERS)
+        asys = arhn.wrap(system)
+        futures = [ asys.getName(1000010000 + i) for i in range(10) ]
+        parallel.map_servers(self.rhn, self.getName, [ 1000010000 + i for i in range(10) ], parallel.MAX_WORKERS)
+        self.assertEqual([ x['name'] for x in arhn.gather(futures) ],
+                         [ 'host%05d.example.com' % i for i in range(10) ])
+        self.assertTrue(arhn.pool is self.rhn._workerpool)
+        self.assertTrue(len(self.rhn._workerpool._threads) <= parallel.MAX_WORKERS)
+
+    def test_raw_calls(self):
+        arhn = parallel.AsyncRhnSession(self.rhn)
+        future = arhn.session.system.listSystems(arhn.key)
+        self.assertEqual(len(future.result()), 10)
+        self.assertRaises(xmlrpclib.Fault, arhn.session.system.getName(arhn.key, 42).result)
+        arhn.close()
+        self.assertTrue(self.rhn._workerpool is None)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for rhnapi.pkglist, using package lists from the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import json
+import unittest
+from array import array
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, pkglist, channel, utils
+
+# --------------------------------------------------------------------------------- #
+
+class packageListTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=5, base_channels=1, child_channels=1, packages=200, errata=5)
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False)
+        self.packages = channel.listAllPackages(self.rhn, 'rhel-x86_64-server-5')
+        self.pkgs = pkglist.compact(self.packages)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+    # ---------------------------------------------------------------------------- #
+
+    def test_same_packages(self):
+        self.assertEqual(len(self.pkgs), 200)
+        self.assertEqual(sorted(self.pkgs.fields), sorted(self.packages[0].keys()))
+        self.assertEqual(self.pkgs.toDicts(), self.packages)
+        for record, pkg in zip(self.pkgs, self.packages):
+            self.assertEqual(record, pkg)
+            self.assertEqual(dict(record), pkg)
+            self.assertEqual(utils.get_pkgstr(record), utils.get_pkgstr(pkg))
+        self.assertTrue(self.packages[10] in self.pkgs)
+        self.assertEqual(self.pkgs.column('name'), [ x['name'] for x in self.packages ])
+
+    def test_records_are_read_only_views(self):
+        record = self.pkgs[0]
+        def assign():
+            record['name'] = 'other'
+        self.assertRaises(TypeError, assign)
+        copied = record.copy()
+        copied['name'] = 'other'
+        self.assertEqual(record['name'], self.packages[0]['name'])
+
+    def test_integer_fields_in_arrays(self):
+        self.assertTrue(isinstance(self.pkgs._columns['id'], array))
+        self.assertEqual(self.pkgs.column('id'), [ x['id'] for x in self.packages ])
+        # values that don't fit fall back to a plain list
+        pkgs = pkglist.packageList([ { 'id' : 1 }, { 'id' : 2**40 }, { 'id' : 'three' } ])
+        self.assertEqual(pkgs.column('id'), [ 1, 2**40, 'three' ])
+        self.assertFalse(isinstance(pkgs._columns['id'], array))
+
+    def test_missing_fields(self):
+        pkgs = pkglist.packageList([ { 'id' : 1, 'name' : 'bash' }, { 'id' : 2, 'epoch' : '1' },
+                                     { 'name' : 'zsh' } ])
+        self.assertEqual(pkgs.fields, [ 'id', 'name', 'epoch' ])
+        self.assertEqual(pkgs[1].keys(), [ 'id', 'epoch' ])
+        self.assertRaises(KeyError, pkgs[1].__getitem__, 'name')
+        self.assertRaises(KeyError, pkgs[1].__getitem__, 'nope')
+        self.assertEqual(pkgs[1].get('name', 'none'), 'none')
+        self.assertFalse('name' in pkgs[1])
+        self.assertEqual(pkgs.column('name'), [ 'bash', None, 'zsh' ])
+        self.assertEqual(pkgs.column('nope'), [ None ] * 3)
+        self.assertEqual(pkgs.toDicts(), [ { 'id' : 1, 'name' : 'bash' }, { 'id' : 2, 'epoch' : '1' },
+                                           { 'name' : 'zsh' } ])
+
+    def test_indexing_and_slicing(self):
+        self.assertEqual(self.pkgs[-1], self.packages[-1])
+        self.assertRaises(IndexError, self.pkgs.__getitem__, 200)
+        self.assertRaises(IndexError, self.pkgs.__getitem__, -201)
+        part = self.pkgs[10:50:3]
+        self.assertTrue(isinstance(part, pkglist.packageList))
+        self.assertEqual(part.toDicts(), self.packages[10:50:3])
+        self.assertEqual(len(self.pkgs[300:]), 0)
+
+    def test_selected_fields(self):
+        pkgs = pkglist.compact(self.packages, fields=[ 'id', 'name' ])
+        self.assertEqual(pkgs.fields, [ 'id', 'name' ])
+        self.assertEqual(pkgs.toDicts(), [ { 'id' : x['id'], 'name' : x['name'] } for x in self.packages ])
+
+    def test_compact(self):
+        self.assertTrue(pkglist.compact(False) is False)
+        pkgs = channel.listAllPackages(self.rhn, 'rhel-x86_64-server-5', compact=True)
+        self.assertTrue(isinstance(pkgs, pkglist.packageList))
+        self.assertEqual(pkgs.toDicts(), self.packages)
+
+    def test_json(self):
+        self.assertEqual(json.loads(json.dumps(self.pkgs, cls=utils.RhnJSONEncoder)),
+                         json.loads(json.dumps(self.packages, cls=utils.RhnJSONEncoder)))
+        self.assertEqual(json.loads(json.dumps(self.pkgs[0], cls=utils.RhnJSONEncoder)),
+                         json.loads(json.dumps(self.packages[0], cls=utils.RhnJSONEncoder)))
+
+    def test_strings_shared(self):
+        # each call parses its own copies of every string...
+        other = channel.listAllPackages(self.rhn, 'rhel-x86_64-server-5', compact=True)
+        # ...but the compact lists share them
+        for mine, theirs in zip(self.pkgs, other):
+            self.assertTrue(mine['name'] is theirs['name'])
+            self.assertTrue(mine['arch_label'] is theirs['arch_label'])
+        # and don't bother tracking fields that never repeat
+        self.assertTrue(self.pkgs._shared['checksum'] is None)
+        self.assertEqual(len(self.pkgs._shared['name']), len(set(self.pkgs.column('name'))))
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for the rpm version comparison and PackageIndex in rhnapi.utils
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rhnapi import utils
+
+# (first, second, expected result), from rpm's own rpmvercmp test suite
+RPMVERCMP_CASES = [
+    ("1.0", "1.0", 0), ("1.0", "2.0", -1), ("2.0", "1.0", 1),
+    ("2.0.1", "2.0.1", 0), ("2.0", "2.0.1", -1), ("2.0.1", "2.0", 1),
+    ("2.0.1a", "2.0.1a", 0), ("2.0.1a", "2.0.1", 1), ("2.0.1", "2.0.1a", -1),
+    ("5.5p1", "5.5p1", 0), ("5.5p1", "5.5p2", -1), ("5.5p2", "5.5p1", 1),
+    ("5.5p10", "5.5p10", 0), ("5.5p1", "5.5p10", -1), ("5.5p10", "5.5p1", 1),
+    ("10xyz", "10.1xyz", -1), ("10.1xyz", "10xyz", 1),
+    ("xyz10", "xyz10", 0), ("xyz10", "xyz10.1", -1), ("xyz10.1", "xyz10", 1),
+    ("xyz.4", "xyz.4", 0), ("xyz.4", "8", -1), ("8", "xyz.4", 1),
+    ("xyz.4", "2", -1), ("2", "xyz.4", 1),
+    ("5.5p2", "5.6p1", -1), ("5.6p1", "5.5p2", 1),
+    ("5.6p1", "6.5p1", -1), ("6.5p1", "5.6p1", 1),
+    ("6.0.rc1", "6.0", 1), ("6.0", "6.0.rc1", -1),
+    ("10b2", "10a1", 1), ("10a2", "10b2", -1),
+    ("1.0aa", "1.0aa", 0), ("1.0a", "1.0aa", -1), ("1.0aa", "1.0a", 1),
+    ("10.0001", "10.0001", 0), ("10.0001", "10.1", 0), ("10.1", "10.0001", 0),
+    ("10.0001", "10.0039", -1), ("10.0039", "10.0001", 1),
+    ("4.999.9", "5.0", -1), ("5.0", "4.999.9", 1),
+    ("20101121", "20101121", 0), ("20101121", "20101122", -1), ("20101122", "20101121", 1),
+    ("2_0", "2_0", 0), ("2.0", "2_0", 0), ("2_0", "2.0", 0),
+    ("a", "a", 0), ("a+", "a+", 0), ("a+", "a_", 0), ("a_", "a+", 0),
+    ("+a", "+a", 0), ("+a", "_a", 0), ("_a", "+a", 0),
+    ("+_", "+_", 0), ("_+", "+_", 0), ("_+", "_+", 0), ("+", "_", 0), ("_", "+", 0),
+    ("1.0~rc1", "1.0~rc1", 0), ("1.0~rc1", "1.0", -1), ("1.0", "1.0~rc1", 1),
+    ("1.0~rc1", "1.0~rc2", -1), ("1.0~rc2", "1.0~rc1", 1),
+    ("1.0~rc1~git123", "1.0~rc1~git123", 0), ("1.0~rc1~git123", "1.0~rc1", -1),
+    ("1.0~rc1", "1.0~rc1~git123", 1),
+    ("1.0^", "1.0^", 0), ("1.0^", "1.0", 1), ("1.0", "1.0^", -1),
+    ("1.0^git1", "1.0^git1", 0), ("1.0^git1", "1.0", 1), ("1.0", "1.0^git1", -1),
+    ("1.0^git1", "1.0^git2", -1), ("1.0^git2", "1.0^git1", 1),
+    ("1.0^git1", "1.01", -1), ("1.01", "1.0^git1", 1),
+    ("1.0^20160101", "1.0^20160101", 0), ("1.0^20160101", "1.0.1", -1),
+    ("1.0.1", "1.0^20160101", 1),
+    ("1.0^20160101^git1", "1.0^20160101^git1", 0),
+    ("1.0^20160102", "1.0^20160101^git1", 1), ("1.0^20160101^git1", "1.0^20160102", -1),
+    ("1.0~rc1^git1", "1.0~rc1^git1", 0), ("1.0~rc1^git1", "1.0~rc1", 1),
+    ("1.0~rc1", "1.0~rc1^git1", -1),
+    ("1.0^git1~pre", "1.0^git1~pre", 0), ("1.0^git1", "1.0^git1~pre", 1),
+    ("1.0^git1~pre", "1.0^git1", -1),
+]
+
+def pkg(name, epoch, version, release, arch='x86_64'):
+    return { 'name' : name, 'epoch' : epoch, 'version' : version, 'release' : release,
+             'arch_label' : arch }
+
+# --------------------------------------------------------------------------------- #
+
+class rpmvercmpTest(unittest.TestCase):
+    def test_rpm_cases(self):
+        failures = [ (a, b, expected, utils.rpmvercmp(a, b)) for a, b, expected in RPMVERCMP_CASES
+                     if utils.rpmvercmp(a, b) != expected ]
+        self.assertEqual(failures, [])
+
+    def test_labelCompare_epoch_wins(self):
+        self.assertEqual(utils.labelCompare(('1', '1.0', '1'), ('', '9.0', '9')), 1)
+        self.assertEqual(utils.labelCompare(('', '1.0', '1'), ('0', '1.0', '1')), 0)
+        self.assertEqual(utils.labelCompare(('', '1.0', '2.el6'), ('', '1.0', '10.el6')), -1)
+
+# --------------------------------------------------------------------------------- #
+
+class PackageIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.channel = utils.PackageIndex([
+            pkg('bash', '', '4.1.2', '15.el6'), pkg('bash', '', '4.1.2', '9.el6'),
+            pkg('kernel', ' ', '2.6.32', '10.el6'), pkg('kernel', '', '2.6.32', '9.el6'),
+            pkg('glibc', '', '2.12', '1.el6', 'i686') ])
+        # system.listPackages uses 'arch' and sometimes '0' for no epoch
+        self.system = utils.PackageIndex([
+            { 'name' : 'bash', 'epoch' : '0', 'version' : '4.1.2', 'release' : '9.el6', 'arch' : 'x86_64' },
+            { 'name' : 'foo', 'epoch' : '', 'version' : '1', 'release' : '1', 'arch' : 'noarch' } ])
+
+    def test_nevra_normalises_epoch(self):
+        self.assertEqual(utils.get_nevra(pkg('bash', '0', '1', '1')), utils.get_nevra(pkg('bash', ' ', '1', '1')))
+        self.assertEqual(utils.nevra_str(('bash', '1', '3', '1', 'x86_64')), '1:bash-3-1.x86_64')
+        self.assertEqual(utils.nevra_str(('bash', '1', '3', '1', 'x86_64')), utils.get_pkgstr(pkg('bash', '1', '3', '1')))
+
+    def test_set_operations(self):
+        self.assertEqual((self.system - self.channel).labels(), [ 'foo-1-1.noarch' ])
+        self.assertEqual((self.system & self.channel).labels(), [ 'bash-4.1.2-9.el6.x86_64' ])
+        self.assertEqual(len(self.system | self.channel), 6)
+        self.assertEqual(len(self.system ^ self.channel), 5)
+
+    def test_latest(self):
+        self.assertEqual(self.channel.latest().labels(),
+                         [ 'bash-4.1.2-15.el6.x86_64', 'glibc-2.12-1.el6.i686', 'kernel-2.6.32-10.el6.x86_64' ])
+
+    def test_newerThan(self):
+        self.assertEqual(self.channel.latest().newerThan(self.system).labels(), [ 'bash-4.1.2-15.el6.x86_64' ])
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
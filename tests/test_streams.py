@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for the streaming JSON and CSV writers and readers in rhnapi.utils, using
+# records from the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+import xmlrpclib
+from StringIO import StringIO
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, system, utils
+
+# --------------------------------------------------------------------------------- #
+
+class streamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'report')
+        self.server = mockserver.start(systems=50, base_channels=1, child_channels=1, packages=20, errata=5)
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False)
+        self.systems = system.listSystems(self.rhn)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def generate(self):
+        """
+        yields the systems one at a time, as a paged or parallel listing would
+        """
+        for record in self.systems:
+            yield record
+
+    def plain(self, records):
+        """
+        the records as they look once through json (DateTimes as strings)
+        """
+        return json.loads(json.dumps(records, cls=utils.RhnJSONEncoder))
+
+class writerTest(streamTest):
+    def test_json_array(self):
+        self.assertEqual(utils.dumpJSONStream(self.generate(), self.filename), 50)
+        self.assertEqual(utils.loadJSON(self.filename), self.plain(self.systems))
+        self.assertEqual(open(self.filename).read(),
+                         json.dumps(self.systems, cls=utils.RhnJSONEncoder) + '\n')
+
+    def test_json_array_indented(self):
+        self.assertEqual(utils.dumpJSONStream(self.generate(), self.filename, indent=2), 50)
+        self.assertEqual(utils.loadJSON(self.filename), self.plain(self.systems))
+        # laid out as json.dumps does it (less the trailing spaces python 2's json leaves)
+        expected = json.dumps(self.systems, cls=utils.RhnJSONEncoder, indent=2)
+        self.assertEqual([ x.rstrip() for x in open(self.filename).read().splitlines() ],
+                         [ x.rstrip() for x in expected.splitlines() ])
+
+    def test_json_empty(self):
+        self.assertEqual(utils.dumpJSONStream(iter([]), self.filename), 0)
+        self.assertEqual(utils.loadJSON(self.filename), [])
+        self.assertEqual(utils.dumpJSONStream(iter([]), self.filename, indent=2), 0)
+        self.assertEqual(utils.loadJSON(self.filename), [])
+
+    def test_json_lines(self):
+        self.assertEqual(utils.dumpJSONStream(self.generate(), self.filename, indent=2, lines=True), 50)
+        lines = open(self.filename).read().splitlines()
+        self.assertEqual([ json.loads(x) for x in lines ], self.plain(self.systems))
+
+    def test_json_open_file(self):
+        fd = open(self.filename, 'wb')
+        utils.dumpJSONStream(self.systems[:10], fd, lines=True)
+        utils.dumpJSONStream(self.systems[10:], fd, lines=True)
+        # appended to, and left open for the caller
+        self.assertFalse(fd.closed)
+        fd.close()
+        self.assertEqual(len(open(self.filename).readlines()), 50)
+
+    def test_csv(self):
+        self.assertEqual(utils.csvReportStream(self.generate(), self.filename), 50)
+        rows = list(csv.reader(open(self.filename, 'rb')))
+        self.assertEqual(rows[0], sorted(self.systems[0].keys()))
+        self.assertEqual(len(rows), 51)
+        record = dict(zip(rows[0], rows[1]))
+        self.assertEqual(record['name'], self.systems[0]['name'])
+        self.assertEqual(record['id'], str(self.systems[0]['id']))
+        self.assertEqual(record['last_checkin'], self.systems[0]['last_checkin'].value)
+
+    def test_csv_fields(self):
+        records = [ { 'name' : u'h\xf6st', 'id' : 1 }, { 'id' : 2, 'other' : 'x' } ]
+        out = StringIO()
+        self.assertEqual(utils.csvReportStream(records, out, fields=[ 'id', 'name' ]), 2)
+        self.assertEqual(out.getvalue(), 'id,name\r\n1,h\xc3\xb6st\r\n2,\r\n')
+
+    def test_csv_empty(self):
+        self.assertEqual(utils.csvReportStream(iter([]), self.filename), 0)
+        self.assertEqual(open(self.filename).read(), '\r\n')
+
+# --------------------------------------------------------------------------------- #
+
+class iterJSONTest(streamTest):
+    def setUp(self):
+        streamTest.setUp(self)
+        self.chunk = utils.JSON_CHUNK
+
+    def tearDown(self):
+        utils.JSON_CHUNK = self.chunk
+        streamTest.tearDown(self)
+
+    def write(self, data):
+        fd = open(self.filename, 'wb')
+        fd.write(data)
+        fd.close()
+
+    def read(self, **kwargs):
+        return list(utils.iterJSON(self.filename, **kwargs))
+
+    def test_array(self):
+        utils.dumpJSONStream(self.systems, self.filename, indent=2)
+        records = self.read()
+        self.assertEqual(records, self.systems)
+        self.assertTrue(isinstance(records[0]['last_checkin'], xmlrpclib.DateTime))
+        self.assertEqual(self.read(datetimes=False), self.plain(self.systems))
+
+    def test_lines(self):
+        utils.dumpJSONStream(self.systems, self.filename, lines=True)
+        self.assertEqual(self.read(), self.systems)
+        self.assertEqual(self.read(lines=True), self.systems)
+        # JSON Lines whose records are arrays
+        self.write('[1, 2]\n\n[3]\n[4]')
+        self.assertEqual(self.read(lines=True), [ [ 1, 2 ], [ 3 ], [ 4 ] ])
+
+    def test_chunk_boundaries(self):
+        utils.dumpJSONStream(self.systems, self.filename)
+        self.write(open(self.filename).read().replace(', ', ' ,\n ', 5))
+        for size in (1, 2, 7, 64):
+            utils.JSON_CHUNK = size
+            self.assertEqual(self.read(), self.systems)
+        # numbers and literals split across reads
+        self.write('[ 12345, true, null, 1.5e10, "a,]b" ]')
+        for size in (1, 3, 4):
+            utils.JSON_CHUNK = size
+            self.assertEqual(self.read(), [ 12345, True, None, 1.5e10, 'a,]b' ])
+        utils.dumpJSONStream(self.systems, self.filename, lines=True)
+        utils.JSON_CHUNK = 10
+        self.assertEqual(self.read(), self.systems)
+
+    def test_empty(self):
+        self.write(' \n[ ]\n')
+        self.assertEqual(self.read(), [])
+        self.write('')
+        self.assertEqual(self.read(), [])
+
+    def test_trailing_data(self):
+        self.write('[1, 2]\n[3]\n')
+        records = utils.iterJSON(self.filename)
+        self.assertEqual([ records.next(), records.next() ], [ 1, 2 ])
+        self.assertRaises(ValueError, records.next)
+        self.write('[1, 2]  \n\t\n')
+        self.assertEqual(self.read(), [ 1, 2 ])
+
+    def test_malformed(self):
+        for data in ('[1, 2', '[1, 2,', '[1 2]', '[1,, 2]', '[, 1]', '[{"a": }]', '[1, 2}'):
+            self.write(data)
+            self.assertRaises(ValueError, self.read)
+            utils.JSON_CHUNK = 2
+            self.assertRaises(ValueError, self.read)
+            utils.JSON_CHUNK = self.chunk
+        self.write('{"a": 1}\n{"a": \n')
+        self.assertRaises(ValueError, self.read)
+        self.assertRaises(ValueError, self.read, lines=False)
+
+    def test_open_file(self):
+        utils.dumpJSONStream(self.systems, self.filename)
+        fd = open(self.filename, 'rb')
+        self.assertEqual(list(utils.iterJSON(fd)), self.systems)
+        self.assertFalse(fd.closed)
+        fd.close()
+        self.assertEqual(list(utils.iterJSON(StringIO('[{"id": 1}]'))), [ { 'id' : 1 } ])
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
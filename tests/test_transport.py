@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for the rhnSession transports, run against the synthetic satellite in rhnapi.mockserver
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rhnapi
+from rhnapi import mockserver, system, unmarshal
+
+# --------------------------------------------------------------------------------- #
+
+class keepaliveTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=20, base_channels=1, child_channels=1, packages=20, errata=5)
+        self.rhn = rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                     logenable=False)
+
+    def tearDown(self):
+        self.rhn.logout()
+        self.server.stop()
+
+    def dropConnections(self):
+        """
+        have the server close every client connection, as an idle timeout would
+        """
+        for sock in list(self.server._open):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        deadline = time.time() + 2
+        while len(self.server._open) != 0 and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_connection_is_reused(self):
+        for i in range(10):
+            self.assertEqual(len(system.listSystems(self.rhn)), 20)
+        stats = self.rhn.connectionStats()
+        # auth.login plus 10 calls, all over a single connection
+        self.assertEqual(stats['requests'], 11)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['reused'], 10)
+        self.assertEqual(self.server.requests, 11)
+
+    def test_reconnect_after_server_drop(self):
+        self.assertEqual(len(system.listSystems(self.rhn)), 20)
+        self.dropConnections()
+        self.assertEqual(len(system.listSystems(self.rhn)), 20)
+        stats = self.rhn.connectionStats()
+        self.assertEqual(stats['opened'], 2)
+        self.assertTrue(stats['reconnects'] <= 1)
+
+    def test_one_transport_per_thread(self):
+        self.assertTrue(self.rhn.transport is self.rhn._getTransport())
+        self.assertEqual(len(self.rhn._transports), 1)
+
+# --------------------------------------------------------------------------------- #
+
+class compressionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.start(systems=500, base_channels=1, child_channels=1, packages=20, errata=5)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def session(self, **kwargs):
+        return rhnapi.rhnSession('mock', 'admin', 'password', transport=self.server.transport,
+                                 logenable=False, **kwargs)
+
+    def test_response_decompressed(self):
+        for unmarshaller in (None, unmarshal.getparser):
+            rhn = self.session(unmarshaller=unmarshaller)
+            systems = rhn.session.system.listSystems(rhn.key)
+            self.assertEqual(len(systems), 500)
+            plain = len(xmlrpclib.dumps((systems,), methodresponse=True))
+            # the body on the wire was gzipped, and counted before decompression
+            self.assertTrue(rhn.transport.last_received < plain / 4)
+            self.assertEqual(rhn.connectionStats()['bytes_received'], rhn.transport.bytes_received)
+            rhn.logout()
+
+    def test_small_response_not_compressed(self):
+        rhn = self.session()
+        self.assertEqual(rhn.session.api.getVersion(), '13.0')
+        self.assertEqual(rhn.transport.last_received,
+                         len(xmlrpclib.dumps(('13.0',), methodresponse=True)))
+        rhn.logout()
+
+    def test_request_compressed(self):
+        rhn = self.session(compress_threshold=1024)
+        label = 'rhel-x86_64-server-5'
+        pkgids = range(1, 5001)
+        self.assertEqual(rhn.session.channel.software.removePackages(rhn.key, label, pkgids), 1)
+        plain = len(xmlrpclib.dumps((rhn.key, label, pkgids), 'channel.software.removePackages'))
+        self.assertTrue(rhn.transport.last_sent < plain / 4)
+        self.assertEqual(self.server.bytes_received, rhn.transport.bytes_sent)
+        # and small requests are sent as they are
+        rhn.session.api.getVersion()
+        self.assertEqual(rhn.transport.last_sent, len(xmlrpclib.dumps((), 'api.getVersion')))
+        rhn.logout()
+
+    def test_request_compression_off_by_default(self):
+        rhn = self.session()
+        pkgids = range(1, 5001)
+        rhn.session.channel.software.removePackages(rhn.key, 'rhel-x86_64-server-5', pkgids)
+        self.assertEqual(rhn.transport.last_sent,
+            len(xmlrpclib.dumps((rhn.key, 'rhel-x86_64-server-5', pkgids), 'channel.software.removePackages')))
+        rhn.logout()
+
+# --------------------------------------------------------------------------------- #
+
+class fakeProxy(object):
+    """
+    accepts one connection, records the CONNECT request it receives, accepts it
+    and hangs up (so the TLS handshake that follows fails straight away)
+    """
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.request = ''
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def serve(self):
+        conn, addr = self.sock.accept()
+        try:
+            while '\r\n\r\n' not in self.request:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                self.request += data
+            conn.sendall('HTTP/1.0 200 Connection established\r\n\r\n')
+        finally:
+            conn.close()
+            self.sock.close()
+
+class proxiedTransportTest(unittest.TestCase):
+    def test_connect_tunnel(self):
+        proxy = fakeProxy()
+        transport = rhnapi.proxiedTransport()
+        transport.set_proxy('someone:s%%40cret@127.0.0.1:%d' % proxy.port)
+        conn = transport.make_connection('satellite.example.com')
+        self.assertRaises((socket.error, IOError), conn.connect)
+        proxy.thread.join(5)
+        lines = proxy.request.split('\r\n')
+        self.assertEqual(lines[0], 'CONNECT satellite.example.com:443 HTTP/1.0')
+        self.assertTrue('Proxy-Authorization: Basic %s' % 'someone:s@cret'.encode('base64').strip() in lines)
+
+    def test_default_proxy_port(self):
+        transport = rhnapi.proxiedTransport()
+        transport.set_proxy('proxy.example.com')
+        conn = transport.new_connection('satellite.example.com')
+        self.assertEqual((conn.host, conn.port), ('proxy.example.com', 80))
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# tests for rhnapi.unmarshal: the fast parser must decode exactly as xmlrpclib does
+#
+# run from the top of the source tree:
+# python -m unittest discover -s tests -p 'test_*.py'
+import os
+import sys
+import unittest
+import xmlrpclib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rhnapi import unmarshal
+
+def xmlrpcParse(data, use_datetime=0):
+    return unmarshal.parse(data, lambda: xmlrpclib.getparser(use_datetime))
+
+def fastParse(data, use_datetime=0, chunksize=1024):
+    return unmarshal.parse(data, lambda: unmarshal.getparser(use_datetime), chunksize)
+
+def typed(value):
+    """
+    value with the types of everything in it, so str vs unicode etc differences show up
+    """
+    if isinstance(value, dict):
+        return dict((k, typed(v)) for k, v in value.iteritems())
+    if isinstance(value, (list, tuple)):
+        return [ typed(x) for x in value ]
+    if isinstance(value, xmlrpclib.DateTime):
+        return ('DateTime', value.value)
+    if isinstance(value, xmlrpclib.Binary):
+        return ('Binary', value.data)
+    return (type(value).__name__, value)
+
+# --------------------------------------------------------------------------------- #
+
+class parityTest(unittest.TestCase):
+    def assertParity(self, data, **kwargs):
+        self.assertEqual(typed(fastParse(data, **kwargs)), typed(xmlrpcParse(data)))
+
+    def test_scalars(self):
+        values = (1, -42, 2**31 - 1, 3.5, True, False, 'ascii', u'unicod\xe9', '', u'',
+                  'a < b & c', '  padded  ', xmlrpclib.DateTime('20140527T10:11:12'),
+                  xmlrpclib.Binary('\x00\x01binary'))
+        for value in values:
+            self.assertParity(xmlrpclib.dumps((value,), methodresponse=True))
+
+    def test_nil(self):
+        self.assertParity(xmlrpclib.dumps((None,), methodresponse=True, allow_none=True))
+
+    def test_nested(self):
+        value = { 'list' : [ 1, 'two', [ 3, { 'four' : 4.0 } ], [] ],
+                  'struct' : { 'empty' : {}, 'date' : xmlrpclib.DateTime('20010101T00:00:00') },
+                  u'k\xe9y' : u'v\xe4lue' }
+        self.assertParity(xmlrpclib.dumps((value,), methodresponse=True))
+
+    def test_untyped_value(self):
+        # <value> with no type element is a string
+        data = ("<?xml version='1.0'?><methodResponse><params><param>"
+                "<value>plain text</value></param></params></methodResponse>")
+        self.assertParity(data)
+
+    def test_package_list_small_chunks(self):
+        data = unmarshal.samplePayload(500)
+        self.assertEqual(typed(fastParse(data, chunksize=7)), typed(xmlrpcParse(data)))
+
+    def test_use_datetime(self):
+        data = xmlrpclib.dumps((xmlrpclib.DateTime('20140527T10:11:12'),), methodresponse=True)
+        self.assertEqual(fastParse(data, use_datetime=1), xmlrpcParse(data, use_datetime=1))
+
+    def test_fault(self):
+        data = xmlrpclib.dumps(xmlrpclib.Fault(-210, 'No such channel'), methodresponse=True)
+        self.assertRaises(xmlrpclib.Fault, fastParse, data)
+        try:
+            fastParse(data)
+        except xmlrpclib.Fault, E:
+            self.assertEqual((E.faultCode, E.faultString), (-210, 'No such channel'))
+
+if __name__ == '__main__':
+    unittest.main()
+
+# footer - do not edit below here
+# vim: set et ai smartindent ts=4 sts=4 sw=4 ft=python: